@@ -0,0 +1,130 @@
+"""
+Adaptive evaluation: per-model early stopping on Wilson confidence intervals.
+
+With `--adaptive`, test cases run in a difficulty-stratified order, so every
+prefix of the suite is a proportional sample of the difficulty levels. Each
+scored row updates its model's Wilson interval for accuracy. Partial scores
+count fractionally. Skipped rows and generation errors (API failures) say
+nothing about the model's SQL, so they do not count. After ADAPTIVE_MIN_QUERIES
+rows a model stops as soon as either:
+
+- converged: its interval is at most ±ADAPTIVE_HALF_WIDTH accuracy points, or
+- separated: its interval overlaps no other model's, so more queries cannot
+  change its place in the ranking.
+
+A stopped model's remaining (query, model) pairs are never sent. With
+`--concurrent`, requests already in flight when it stops still complete, so a
+model may score up to its client's concurrency limit more rows. Its accuracy
+is the mean over the stratified subsample it ran. The intervals are
+recomputed after every row, so they are somewhat narrower than a fixed-size
+run's would be; use a full run for results that need a strict error rate.
+
+Convergence needs at least `queries_to_converge()` scored queries (16 for
+±10 at 95%, for a model at 0% or 100%; about 6x that at 50%). A smaller suite
+can only stop models by separation.
+"""
+import math
+from statistics import NormalDist
+
+from config import ADAPTIVE_CONFIDENCE, ADAPTIVE_HALF_WIDTH, ADAPTIVE_MIN_QUERIES
+from result_sink import TRANSIENT_CATEGORIES
+
+RUNNING, CONVERGED, SEPARATED = "running", "converged", "separated"
+
+
+def wilson_interval(successes: float, n: int, confidence: float = ADAPTIVE_CONFIDENCE) -> tuple:
+    """Wilson score interval (low, high) of a proportion, as fractions; (0, 1) without data."""
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def queries_to_converge(half_width: float = ADAPTIVE_HALF_WIDTH,
+                        confidence: float = ADAPTIVE_CONFIDENCE) -> int:
+    """Fewest scored queries after which any model (one at 0% or 100%) can converge."""
+    n = 1
+    while wilson_interval(0, n, confidence)[1] * 100 / 2 > half_width:
+        n += 1
+    return n
+
+
+def stratified_order(test_cases: list) -> list:
+    """
+    Interleaves the cases by `difficulty` in proportion to each level's share
+    of the suite (original order within a level). Cases without an id get
+    their positional id first, so reordering keeps ids stable.
+    """
+    strata = {}
+    for i, case in enumerate(test_cases):
+        case.setdefault("id", f"q_{i}")
+        strata.setdefault(case.get("difficulty"), []).append(case)
+    # Each level's k-th case is placed at its (k + 0.5) / size quantile of the run
+    slots = [((k + 0.5) / len(cases), level, k)
+             for level, (_, cases) in enumerate(strata.items()) for k in range(len(cases))]
+    ordered = list(strata.values())
+    return [ordered[level][k] for _, level, k in sorted(slots)]
+
+
+class AdaptiveStopper:
+    """Tracks each model's accuracy interval and decides which models still need queries."""
+
+    def __init__(self, model_names, half_width: float = ADAPTIVE_HALF_WIDTH,
+                 min_queries: int = ADAPTIVE_MIN_QUERIES, confidence: float = ADAPTIVE_CONFIDENCE):
+        self.half_width = half_width
+        self.min_queries = min_queries
+        self.confidence = confidence
+        self.models = {name: {"n": 0, "score": 0.0, "status": RUNNING, "stopped_after": None}
+                       for name in model_names}
+
+    def interval(self, model_name: str) -> tuple:
+        """The model's accuracy interval in percentage points."""
+        model = self.models[model_name]
+        low, high = wilson_interval(model["score"], model["n"], self.confidence)
+        return low * 100, high * 100
+
+    def record(self, row):
+        """Adds a scored row and stops its model if its interval allows."""
+        model = self.models.get(row["model"])
+        if model is None or row.get("error_category") in TRANSIENT_CATEGORIES:
+            # Never sent (circuit open) or no response: no evidence about the model
+            return
+        model["n"] += 1
+        model["score"] += row["match_percentage"] / 100
+        if model["status"] == RUNNING and model["n"] >= self.min_queries:
+            status = self._stop_reason(row["model"])
+            if status:
+                model["status"], model["stopped_after"] = status, model["n"]
+                low, high = self.interval(row["model"])
+                print(f"  🛑 {row['model']} stopped after {model['n']} queries ({status}): "
+                      f"{model['score'] / model['n'] * 100:.1f}% [{low:.1f}, {high:.1f}]")
+
+    def _stop_reason(self, model_name: str):
+        low, high = self.interval(model_name)
+        if (high - low) / 2 <= self.half_width:
+            return CONVERGED
+        others = [self.interval(name) for name in self.models if name != model_name]
+        if others and all(high < other_low or low > other_high for other_low, other_high in others):
+            return SEPARATED
+        return None
+
+    def active(self, model_name: str) -> bool:
+        """Whether the model still gets queries."""
+        return self.models[model_name]["status"] == RUNNING
+
+    def summary(self, model_name: str) -> dict:
+        """Interval and stopping state of one model, for the report."""
+        model = self.models[model_name]
+        low, high = self.interval(model_name)
+        return {"queries_scored": model["n"], "accuracy_interval": [round(low, 2), round(high, 2)],
+                "status": model["status"], "stopped_after": model["stopped_after"]}
+
+    def stats(self, planned_pairs: int, run_pairs: int) -> dict:
+        """Settings and savings of the run: `run_pairs` of the `planned_pairs` (query, model) pairs were run."""
+        return {"confidence": self.confidence, "half_width": self.half_width, "min_queries": self.min_queries,
+                "pairs_planned": planned_pairs, "pairs_saved": planned_pairs - run_pairs,
+                "models_stopped": sum(model["status"] != RUNNING for model in self.models.values())}
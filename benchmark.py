@@ -1,22 +1,66 @@
 import argparse
+import asyncio
 import json
 import time
 import sys
 import os
+from contextlib import nullcontext
 from functools import partial
 from datetime import datetime
 from pathlib import Path
 
 # Custom Modules
-from llm_connectors import get_sql_from_ai, clients
-from db_handler import DBHandler
+from llm_connectors import (
+    get_sql_with_metrics,
+    get_sql_samples,
+    clients,
+    set_response_cache,
+    preflight,
+    CircuitBreaker,
+    set_circuit_breaker,
+    check_circuit
+)
+from db_handler import DBHandler, SandboxedExecutor, QueryResult, ERR_NONE, db_fingerprint
+from ground_truth import GroundTruthStore, TestCase, drop_invalid_cases
+from result_compare import MATCH_MODES, prepare_expected, compare, order_keys
+from scale_db import ScaleProfiler
+from schema_linker import SchemaIndex
+from self_consistency import distinct_statements, majority_vote
+from adaptive import AdaptiveStopper, queries_to_converge, stratified_order
+from sql_memo import ExecutionMemo, MemoizedExecutor, MEMO_MODES, canonicalize_sql
+from response_cache import ResponseCache, CACHE_MODES
+from run_store import RunStore, cell_fingerprint, question_hash, text_hash
+from result_sink import (
+    ResultSink,
+    new_run_name,
+    resolve_run_path,
+    read_header,
+    iter_rows,
+    completed_pairs,
+    write_report_json,
+    GENERATION_ERROR,
+    SKIPPED,
+    TRANSIENT_CATEGORIES
+)
+from scheduler import Job, run_jobs
+from warehouse import store_run
+from tracing import Tracer, ProfileCapture, set_tracer, span, attributes, print_phase_table
 from config import (
     DB_PATH, 
     QUERIES_PATH, 
     RESULTS_DIR, 
+    RUNS_DIR,
+    TRACES_DIR,
     MODEL_REGISTRY, 
     VALID_GROUPS, 
-    FEW_SHOT_EXAMPLES
+    FEW_SHOT_EXAMPLES,
+    MAX_CONCURRENCY,
+    SCORING_VERSION,
+    SAMPLE_TEMPERATURE,
+    ADAPTIVE_HALF_WIDTH,
+    SQL_MAX_ROWS,
+    SQL_TIMEOUT_SECONDS,
+    SQL_MAX_VM_STEPS
 )
 
 # ==========================================
@@ -49,7 +93,7 @@ def build_system_prompt(schema: str, use_prompt: bool, reasoning: bool, techniqu
 # ==========================================
 # HELPER: MODEL FILTERING
 # ==========================================
-def get_active_models(group: str, registry: list, available_clients: dict):
+def get_active_models(group: str, registry: list, available_clients: dict, stream: bool = False):
     """Returns a dict of {model_name: partial_function} based on the selected group."""
     filtered_models = {}
     
@@ -70,137 +114,726 @@ def get_active_models(group: str, registry: list, available_clients: dict):
         # Check availability and group match
         if client_name in available_clients and is_in_group(m, group):
             filtered_models[m["name"]] = partial(
-                get_sql_from_ai, 
+                get_sql_with_metrics, 
                 model=m["id"], 
-                client_name=client_name
+                client_name=client_name,
+                stream=stream
             )
             
     return filtered_models
 
+def check_backends(llms: dict) -> tuple:
+    """
+    Probes every client used by `llms` and drops the models whose backend is
+    unreachable or does not serve their id. Returns (models kept, preflight report).
+    """
+    status = preflight({func.keywords["client_name"] for func in llms.values()})
+    for client_name, probe in sorted(status.items()):
+        if not probe["reachable"]:
+            print(f"❌ {client_name}: unreachable ({probe['error']})")
+        elif probe["models"] is None:
+            print(f"⚠️  {client_name}: reachable, but its models could not be listed ({probe['error']})")
+        else:
+            print(f"✅ {client_name}: {len(probe['models'])} models served ({probe['elapsed']:.2f}s)")
+
+    available, dropped = {}, {}
+    for name, func in llms.items():
+        client_name, model_id = func.keywords["client_name"], func.keywords["model"]
+        probe = status.get(client_name, {"reachable": True, "models": None})
+        if not probe["reachable"]:
+            dropped[name] = f"{client_name} unreachable"
+        elif probe["models"] is not None and model_id not in probe["models"]:
+            dropped[name] = f"'{model_id}' not served by {client_name}"
+        else:
+            available[name] = func
+            continue
+        print(f"   Skipping {name}: {dropped[name]}")
+
+    report = {
+        "clients": {name: {"reachable": p["reachable"], "error": p["error"]} for name, p in status.items()},
+        "dropped_models": dropped,
+    }
+    return available, report
+
 # ==========================================
-# HELPERS: METRICS (PRESERVED)
+# HELPERS: METRICS
 # ==========================================
-def normalize_row(row_dict):
-    """Converts a dict row into a hashable tuple for comparison."""
-    normalized_items = []
-    for k, v in row_dict.items():
-        val_str = str(v).strip()
-        normalized_items.append((k.lower(), val_str))
-    return tuple(sorted(normalized_items))
-
-def calculate_accuracy(expected_dicts, actual_rows, actual_headers):
-    """Calculates recall percentage of expected rows vs actual rows."""
-    if not expected_dicts:
-        return (100.0, 0, 0) if not actual_rows else (0.0, 0, 0)
-    if actual_rows is None: 
-        return (0.0, 0, len(expected_dicts))
-
-    expected_set = {normalize_row(d) for d in expected_dicts}
-    actual_set = set()
-    
-    for row in actual_rows:
-        if len(row) == len(actual_headers):
-            row_dict = dict(zip(actual_headers, row))
-            actual_set.add(normalize_row(row_dict))
-    
-    matches = expected_set.intersection(actual_set)
-    match_count = len(matches)
-    total_expected = len(expected_set)
-
-    return (match_count / total_expected) * 100.0, match_count, total_expected
+def calculate_accuracy(expected_dicts, actual_rows, actual_headers, match_mode="named", order_by=None):
+    """
+    Compares actual rows (any iterable) with the expected ones as multisets of row hashes.
+    `order_by` is the ground truth's result_compare.order_keys(); with it, exact_match also requires the order.
+    Returns the metrics dict of result_compare.compare, plus whether order was required.
+    """
+    expected = prepare_expected(expected_dicts, match_mode, order_by)
+    metrics = compare(expected, actual_rows, actual_headers)
+    metrics["order_required"] = order_by is not None
+    return metrics
 
-def load_test_cases(file_path):
+def load_test_cases(file_path, ground_truth: GroundTruthStore = None):
+    """Loads test cases; with a store, expected rows are compiled from `ground_truth_sql` on first use."""
     try:
         with open(file_path, 'r') as f:
-            return json.load(f)
+            cases = json.load(f)
+        if ground_truth is not None:
+            cases = [TestCase(case, ground_truth) for case in cases]
+        return cases
     except Exception as e:
         print(f"Error loading queries: {e}")
         return []
 
+def report_ground_truth_errors(errors: dict):
+    """Prints the cases dropped because their `ground_truth_sql` failed (see drop_invalid_cases)."""
+    for query_id, error in errors.items():
+        print(f"⚠️ Skipping {query_id}: its ground_truth_sql failed ({error})")
+
+# ==========================================
+# HELPERS: SINGLE RUN
+# ==========================================
+def generate_sql(model_func, sys_prompt: str, user_prompt: str, trace_attributes: dict = None):
+    """Asks the model for SQL and strips any markdown fences. Returns (sql, llm_metrics)."""
+    with attributes(**(trace_attributes or {})):
+        generated_sql, llm_metrics = model_func(sys_prompt=sys_prompt, prompt=user_prompt)
+    return generated_sql.replace('```sql', '').replace('```', '').strip(), llm_metrics
+
+# Per-row generation metrics copied from llm_connectors.get_sql_with_metrics
+LLM_METRIC_KEYS = ("ttft", "generation_time", "prompt_tokens", "completion_tokens", "tokens_per_second", "usage_source")
+
+# Error category for failures before any SQL ran (API errors, bad responses); never executed or stored
+ERR_GENERATION = GENERATION_ERROR
+# Error category for requests not sent because the model's or client's circuit was open
+ERR_SKIPPED = SKIPPED
+
+def report_error(result: QueryResult) -> str:
+    """Human-readable `error` value for a report row."""
+    if result.error_category == ERR_NONE:
+        return "None"
+    if result.rows is None and result.error_category in (ERR_GENERATION, "sql_error"):
+        return "SQL Execution Failed"
+    return result.error
+
+def score_result(case, query_id, model_name, expected_data, clean_sql, result: QueryResult, memo=None,
+                 match_mode="named") -> dict:
+    """Accuracy metrics of one executed statement (memoized per canonical statement)."""
+    order_by = order_keys(case.get("ground_truth_sql"))
+    compute = partial(calculate_accuracy, expected_data, result.rows, result.headers, match_mode, order_by)
+    with span("scoring", query_id=query_id, model=model_name):
+        # A score of truncated rows (row_limit) is not the statement's score: never memoized
+        if memo is not None and result.rows is not None and not result.truncated:
+            # The ground truth's ORDER BY gates exact_match, so it is part of the key
+            return memo.score(canonicalize_sql(clean_sql), f"{query_id}|{match_mode}|order={order_by}", expected_data,
+                              compute)
+        return compute()
+
+def build_report_row(case, query_id, model_name, expected_data, clean_sql, result: QueryResult, latency, memo=None,
+                     match_mode="named", llm_metrics=None, prompt_info=None):
+    """Scores one (query, model) result and returns its report row."""
+    metrics = score_result(case, query_id, model_name, expected_data, clean_sql, result, memo, match_mode)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "query_id": query_id,
+        "model": model_name,
+        "difficulty": case.get('difficulty'),
+        **metrics,
+        "latency": latency,
+        **{key: (llm_metrics or {}).get(key) for key in LLM_METRIC_KEYS},
+        **(prompt_info or {}),
+        "generated_sql": clean_sql,
+        "error": report_error(result),
+        "error_category": result.error_category
+    }
+
+def generate_samples(model_func, samples: int, sys_prompt: str, user_prompt: str, trace_attributes: dict = None):
+    """
+    Asks for the greedy answer, then for `samples` sampled ones (self-consistency).
+    Returns (greedy_sql, greedy_metrics, candidates, sample_metrics); both metrics carry
+    the wall-clock `request_time` of their call. A skipped or failed greedy request is not followed by sampling.
+    """
+    with attributes(**(trace_attributes or {})):
+        start_time = time.time()
+        greedy_sql, greedy_metrics = model_func(sys_prompt=sys_prompt, prompt=user_prompt)
+        greedy_metrics = {**greedy_metrics, "request_time": time.time() - start_time}
+        greedy_sql = greedy_sql.replace('```sql', '').replace('```', '').strip()
+        if greedy_metrics.get("skipped") or greedy_metrics.get("error"):
+            return greedy_sql, greedy_metrics, [greedy_sql], greedy_metrics
+
+        start_time = time.time()
+        candidates, sample_metrics = get_sql_samples(sys_prompt=sys_prompt, prompt=user_prompt, samples=samples,
+                                                     **model_func.keywords)
+        sample_metrics = {**sample_metrics, "request_time": time.time() - start_time}
+    candidates = [sql.replace('```sql', '').replace('```', '').strip() for sql in candidates]
+    return greedy_sql, greedy_metrics, candidates, sample_metrics
+
+def build_samples_row(case, query_id, model_name, expected_data, greedy_sql, greedy_metrics, candidates,
+                      sample_metrics, results: dict, samples: int, latency, memo=None, match_mode="named",
+                      prompt_info=None):
+    """
+    Votes on the executed candidates and returns the report row of the majority answer,
+    with pass@k, the per-sample accuracy and the greedy baseline.
+    `results` maps every canonical statement (greedy and sampled) to its QueryResult.
+    """
+    winner, votes, distinct_results = majority_vote(candidates, results, match_mode)
+    winner_sql = candidates[winner]
+    row = build_report_row(case, query_id, model_name, expected_data, winner_sql, results[canonicalize_sql(winner_sql)],
+                           latency, memo, match_mode, sample_metrics, prompt_info)
+
+    scores = {canonical: score_result(case, query_id, model_name, expected_data, sql, results[canonical], memo,
+                                      match_mode)
+              for canonical, sql in distinct_statements([greedy_sql, *candidates]).items()}
+    sample_scores = [scores[canonicalize_sql(sql)] for sql in candidates]
+    correct = sum(1 for score in sample_scores if score["exact_match"])
+    greedy_score = scores[canonicalize_sql(greedy_sql)]
+    row.update({
+        "samples": samples,
+        "samples_received": len(candidates),
+        "sampling": sample_metrics.get("sampling"),
+        "distinct_candidates": len(distinct_statements(candidates)),
+        "distinct_results": distinct_results,
+        "vote_share": votes / len(candidates),
+        "correct_samples": correct,
+        "pass_at_k": correct > 0,
+        "sample_accuracy": sum(score["match_percentage"] for score in sample_scores) / len(sample_scores),
+        "samples_request_time": sample_metrics.get("request_time"),
+        "greedy_sql": greedy_sql,
+        "greedy_match_percentage": greedy_score["match_percentage"],
+        "greedy_exact_match": greedy_score["exact_match"],
+        "greedy_request_time": greedy_metrics.get("request_time"),
+        "greedy_prompt_tokens": greedy_metrics.get("prompt_tokens"),
+        "greedy_completion_tokens": greedy_metrics.get("completion_tokens"),
+    })
+    return row
+
+def new_model_stats() -> dict:
+    return {"total_score": 0, "queries_run": 0, "queries_skipped": 0, "queries_failed": 0, "total_latency": 0.0,
+            "ttft_sum": 0.0, "ttft_count": 0, "tps_sum": 0.0, "tps_count": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            # Self-consistency (--samples) rows only
+            "sampled_rows": 0, "majority_exact": 0, "pass_at_k": 0, "sample_accuracy_sum": 0.0,
+            "greedy_score": 0.0, "greedy_exact": 0, "samples_time": 0.0, "greedy_time": 0.0,
+            "samples_tokens": 0, "greedy_tokens": 0}
+
+def record_row(row, model_stats):
+    """Adds a report row to the running per-model totals."""
+    stats = model_stats.setdefault(row["model"], new_model_stats())
+    if row.get("error_category") in TRANSIENT_CATEGORIES:
+        # Failed request or never sent: not part of the model's accuracy
+        stats["queries_skipped" if row["error_category"] == ERR_SKIPPED else "queries_failed"] += 1
+        return
+    stats["total_score"] += row["match_percentage"]
+    stats["queries_run"] += 1
+    stats["total_latency"] += row.get("latency") or 0.0
+    if row.get("ttft") is not None:
+        stats["ttft_sum"] += row["ttft"]
+        stats["ttft_count"] += 1
+    if row.get("tokens_per_second") is not None:
+        stats["tps_sum"] += row["tokens_per_second"]
+        stats["tps_count"] += 1
+    stats["prompt_tokens"] += row.get("prompt_tokens") or 0
+    stats["completion_tokens"] += row.get("completion_tokens") or 0
+    if row.get("samples"):
+        stats["sampled_rows"] += 1
+        stats["majority_exact"] += bool(row.get("exact_match"))
+        stats["pass_at_k"] += bool(row["pass_at_k"])
+        stats["sample_accuracy_sum"] += row["sample_accuracy"]
+        stats["greedy_score"] += row["greedy_match_percentage"]
+        stats["greedy_exact"] += bool(row["greedy_exact_match"])
+        stats["samples_time"] += row.get("samples_request_time") or 0.0
+        stats["greedy_time"] += row.get("greedy_request_time") or 0.0
+        stats["samples_tokens"] += (row.get("prompt_tokens") or 0) + (row.get("completion_tokens") or 0)
+        stats["greedy_tokens"] += (row.get("greedy_prompt_tokens") or 0) + (row.get("greedy_completion_tokens") or 0)
+
+def format_row_status(row) -> str:
+    if row.get("error_category") == ERR_SKIPPED:
+        return "⏭️  Skipped (circuit open)"
+    score = row["match_percentage"]
+    status_icon = "✅" if score == 100 else "⚠️" if score > 0 else "❌"
+    status = f"{status_icon} Score: {score:.1f}% ({row['rows_matched']}/{row['rows_expected']}) - {row['latency']:.2f}s"
+    if row.get("samples"):
+        votes = round(row["vote_share"] * row["samples_received"])
+        status += (f" | 🗳️ {votes}/{row['samples_received']} votes, pass@{row['samples']}: "
+                   f"{'✅' if row['pass_at_k'] else '❌'}, greedy: {row['greedy_match_percentage']:.1f}%")
+    return status
+
+def run_pair(executor, case, query_id, model_name, model_func, sys_prompt, prompt_info=None, memo=None,
+             match_mode="named", profiler=None, samples=1) -> dict:
+    """
+    Generates, executes and scores one (query, model) pair and returns its report row.
+    With `samples` > 1 the row describes the self-consistency (majority vote) answer.
+    """
+    if samples > 1:
+        return run_samples_pair(executor, case, query_id, model_name, model_func, sys_prompt, samples, prompt_info,
+                                memo, match_mode, profiler)
+    user_prompt = f"User Question: {case['question']}\n\n"
+    with attributes(query_id=query_id, model=model_name):
+        start_time = time.time()
+        llm_metrics = None
+        try:
+            clean_sql, llm_metrics = generate_sql(model_func, sys_prompt, user_prompt)
+
+            # Execute (a failed request returns an error message, not SQL)
+            if llm_metrics.get("skipped"):
+                result = QueryResult([], None, clean_sql, ERR_SKIPPED)
+            elif llm_metrics.get("error"):
+                result = QueryResult([], None, clean_sql, ERR_GENERATION)
+            else:
+                result = executor.run_query(clean_sql)
+        except Exception as e:
+            print(f" [Err: {e}]", end="")
+            clean_sql = ""
+            result = QueryResult([], None, str(e), ERR_GENERATION)
+
+        latency = time.time() - start_time
+
+        row = build_report_row(case, query_id, model_name, case.get("ground_truth_results", []), clean_sql, result,
+                               latency, memo, match_mode, llm_metrics, prompt_info)
+        if profiler and result.rows is not None:
+            row["scale_profile"] = profiler.profile(clean_sql)
+        return row
+
+def run_samples_pair(executor, case, query_id, model_name, model_func, sys_prompt, samples, prompt_info=None,
+                     memo=None, match_mode="named", profiler=None) -> dict:
+    """Greedy plus `samples` sampled answers for one pair; every distinct statement is executed once."""
+    user_prompt = f"User Question: {case['question']}\n\n"
+    expected_data = case.get("ground_truth_results", [])
+    with attributes(query_id=query_id, model=model_name):
+        try:
+            greedy_sql, greedy_metrics, candidates, sample_metrics = generate_samples(model_func, samples, sys_prompt,
+                                                                                    user_prompt)
+        except Exception as e:
+            print(f" [Err: {e}]", end="")
+            return build_report_row(case, query_id, model_name, expected_data, "",
+                                    QueryResult([], None, str(e), ERR_GENERATION), 0.0, memo, match_mode, None,
+                                    prompt_info)
+        if sample_metrics.get("skipped") or sample_metrics.get("error"):
+            category = ERR_SKIPPED if sample_metrics.get("skipped") else ERR_GENERATION
+            return build_report_row(case, query_id, model_name, expected_data, candidates[0],
+                                    QueryResult([], None, candidates[0], category), 0.0, memo, match_mode,
+                                    sample_metrics, prompt_info)
+
+        start_time = time.time()
+        statements = distinct_statements([greedy_sql, *candidates])
+        results = {canonical: executor.run_query(sql) for canonical, sql in statements.items()}
+        latency = sample_metrics["request_time"] + (time.time() - start_time)
+
+        row = build_samples_row(case, query_id, model_name, expected_data, greedy_sql, greedy_metrics, candidates,
+                                sample_metrics, results, samples, latency, memo, match_mode, prompt_info)
+        if profiler and results[canonicalize_sql(row["generated_sql"])].rows is not None:
+            row["scale_profile"] = profiler.profile(row["generated_sql"])
+        return row
+
+def make_prompt_for(db, use_system_prompt: bool, reasoning: bool, technique: str, schema_pruning: bool = False):
+    """Returns `prompt_for(case)` -> (system prompt, prompt info stored in the report row)."""
+    prompt_builder = partial(build_system_prompt, use_prompt=use_system_prompt, reasoning=reasoning, technique=technique)
+    if schema_pruning:
+        # Per-question prompt with only the linked tables (cached per table set)
+        schema_index = SchemaIndex.from_connection(db.connection)
+
+        def prompt_for(case):
+            prompt, tables = schema_index.pruned_prompt(case["question"], prompt_builder)
+            return prompt, {"system_prompt_chars": len(prompt), "schema_tables": tables}
+    else:
+        # Prepare system prompt once (it's constant for the schema/technique)
+        sys_prompt = prompt_builder(db.get_schema())
+
+        def prompt_for(case):
+            return sys_prompt, {"system_prompt_chars": len(sys_prompt), "schema_tables": None}
+    return prompt_for
+
+# ==========================================
+# EXECUTION MODES
+# ==========================================
+# Both modes hand every scored row to `emit` immediately (the run's JSONL sink)
+# and skip the (query_id, model) pairs listed in `done` (resumed runs).
+# `executor` is the DBHandler itself or a SandboxedExecutor (--sandbox), optionally
+# wrapped in a MemoizedExecutor; `memo` also deduplicates scoring.
+# `profiler` (a ScaleProfiler) re-runs successful SQL on the scaled databases.
+# `prompt_for(case)` returns (system prompt, prompt info stored in the report row).
+# `samples` > 1 adds k sampled answers per pair and reports the majority vote (self_consistency.py).
+# `stopper` (an AdaptiveStopper, --adaptive) drops the pairs of models it has stopped.
+def run_sequential(executor, test_cases, llms, prompt_for, emit, done=frozenset(), memo=None, match_mode="named",
+                   profiler=None, samples=1, stopper=None):
+    """Runs every (query, model) pair one at a time, pausing between calls."""
+    for i, case in enumerate(test_cases):
+        query_id = case.get('id', f'q_{i}')
+        pending = [name for name in llms
+                   if (query_id, name) not in done and (stopper is None or stopper.active(name))]
+        if not pending:
+            continue
+        print(f"{'='*10} Test Case {i+1}: {query_id} {'='*10}")
+        print(f"Q: {case['question']}")
+        
+        print(f"Expected Rows: {len(case.get('ground_truth_results', []))}")
+        
+        with span("prompt_build", query_id=query_id):
+            sys_prompt, prompt_info = prompt_for(case)
+
+        for model_name in pending:
+            model_func = llms[model_name]
+            print(f"  > Model: {model_name}...", end=" ", flush=True)
+
+            row = run_pair(executor, case, query_id, model_name, model_func, sys_prompt, prompt_info, memo, match_mode,
+                           profiler, samples)
+            print(format_row_status(row))
+            # print(f"    SQL: {row['generated_sql']}") # Optional debug
+
+            emit(row)
+            if row["error_category"] != ERR_SKIPPED:
+                time.sleep(5)
+
+def run_concurrent(executor, test_cases, llms, prompt_for, emit, done=frozenset(), max_concurrency=MAX_CONCURRENCY,
+                   memo=None, match_mode="named", profiler=None, samples=1, limits=None, stopper=None):
+    """
+    Sends requests to all clients concurrently, rate limited per client
+    (`limits` defaults to CLIENT_RATE_LIMITS).
+    Rows are emitted in completion order; the final report restores (query, model) order.
+    With a SandboxedExecutor, SQL runs on its worker pool so slow queries do not stall generation.
+    A model's queued jobs are dropped, without a row, once the stopper stops it.
+    """
+    stopped = object()
+
+    def shortcut(model_name, keywords):
+        if stopper and not stopper.active(model_name):
+            return stopped
+        return check_circuit(**keywords)
+
+    jobs = []
+    for i, case in enumerate(test_cases):
+        query_id = case.get('id', f'q_{i}')
+        user_prompt = f"User Question: {case['question']}\n\n"
+        with span("prompt_build", query_id=query_id):
+            sys_prompt, prompt_info = prompt_for(case)
+        for model_name, model_func in llms.items():
+            if (query_id, model_name) in done:
+                continue
+            generate = partial(generate_samples, model_func, samples) if samples > 1 else partial(generate_sql, model_func)
+            jobs.append(Job(
+                client_name=model_func.keywords["client_name"],
+                call=partial(generate, sys_prompt, user_prompt, {"query_id": query_id, "model": model_name}),
+                context=(case, query_id, model_name, prompt_info),
+                shortcut=partial(shortcut, model_name, model_func.keywords),
+            ))
+
+    def finish(job, clean_sql, result, latency, llm_metrics=None, scale_profile=None):
+        case, query_id, model_name, prompt_info = job.context
+        expected_data = case.get("ground_truth_results", [])
+        with attributes(query_id=query_id, model=model_name):
+            row = build_report_row(case, query_id, model_name, expected_data, clean_sql, result, latency, memo,
+                                   match_mode, llm_metrics, prompt_info)
+            if scale_profile:
+                row["scale_profile"] = scale_profile
+            print(f"  > {query_id} | {model_name}: {format_row_status(row)}")
+            emit(row)
+
+    async def execute(job, clean_sql, llm_metrics, elapsed):
+        start_time = time.time()
+        with attributes(query_id=job.context[1], model=job.context[2]):
+            if executor.pooled:
+                result = await asyncio.wrap_future(executor.submit(clean_sql))
+            else:
+                result = executor.run_query(clean_sql)
+        latency = elapsed + (time.time() - start_time)
+        scale_profile = None
+        if profiler and result.rows is not None:
+            scale_profile = await asyncio.to_thread(profiler.profile, clean_sql)
+        finish(job, clean_sql, result, latency, llm_metrics, scale_profile)
+
+    async def execute_samples(job, greedy_sql, greedy_metrics, candidates, sample_metrics):
+        case, query_id, model_name, prompt_info = job.context
+        start_time = time.time()
+        statements = distinct_statements([greedy_sql, *candidates])
+        with attributes(query_id=query_id, model=model_name):
+            if executor.pooled:
+                outcomes = await asyncio.gather(*(asyncio.wrap_future(executor.submit(sql))
+                                                  for sql in statements.values()))
+            else:
+                outcomes = [executor.run_query(sql) for sql in statements.values()]
+        results = dict(zip(statements, outcomes))
+        latency = sample_metrics["request_time"] + (time.time() - start_time)
+        with attributes(query_id=query_id, model=model_name):
+            row = build_samples_row(case, query_id, model_name, case.get("ground_truth_results", []), greedy_sql,
+                                    greedy_metrics, candidates, sample_metrics, results, samples, latency, memo,
+                                    match_mode, prompt_info)
+        if profiler and results[canonicalize_sql(row["generated_sql"])].rows is not None:
+            row["scale_profile"] = await asyncio.to_thread(profiler.profile, row["generated_sql"])
+        print(f"  > {query_id} | {model_name}: {format_row_status(row)}")
+        emit(row)
+
+    def on_result(job, generated, error, elapsed):
+        if generated is stopped:
+            return
+        if error is not None:
+            return finish(job, "", QueryResult([], None, str(error), ERR_GENERATION), elapsed)
+        if samples > 1:
+            if len(generated) == 2:
+                # Answered by the circuit-breaker shortcut
+                generated = (*generated, [generated[0]], generated[1])
+            greedy_sql, greedy_metrics, candidates, sample_metrics = generated
+            if not sample_metrics.get("skipped") and not sample_metrics.get("error"):
+                return execute_samples(job, *generated)
+            generated = (candidates[0], sample_metrics)
+        clean_sql, llm_metrics = generated
+        if llm_metrics.get("skipped"):
+            return finish(job, clean_sql, QueryResult([], None, clean_sql, ERR_SKIPPED), elapsed, llm_metrics)
+        if llm_metrics.get("error"):
+            # A failed request: the text is an error message, not SQL
+            return finish(job, clean_sql, QueryResult([], None, clean_sql, ERR_GENERATION), elapsed, llm_metrics)
+        return execute(job, clean_sql, llm_metrics, elapsed)
+
+    print(f"Running {len(jobs)} requests concurrently (max {max_concurrency} in flight).\n")
+    run_jobs(jobs, on_result, limits=limits, max_concurrency=max_concurrency)
+
+def plan_incremental(run_store, test_cases, llms, prompt_for, db_hash, match_mode, done, samples=1, sandbox=False):
+    """
+    Fingerprints every (query, model) cell of the sweep and looks them up in the run store.
+    The execution limits (row limit, and the sandbox's time and VM-step budgets) are part of
+    the fingerprint: a result truncated or interrupted under one setting is not reused under another.
+    Returns ({(query_id, model): (fingerprint, model keywords)}, {(query_id, model): stored row})
+    for the cells not already in `done`.
+    """
+    scoring_version = f"{SCORING_VERSION}/{match_mode}/rows={SQL_MAX_ROWS}"
+    if sandbox:
+        scoring_version += f"/sandbox={SQL_TIMEOUT_SECONDS}s,{SQL_MAX_VM_STEPS}"
+    if samples > 1:
+        # Self-consistency cells are a different measurement than greedy ones
+        scoring_version += f"/samples={samples}@{SAMPLE_TEMPERATURE}"
+    cells = {}
+    for i, case in enumerate(test_cases):
+        query_id = case.get('id', f'q_{i}')
+        if all((query_id, name) in done for name in llms):
+            continue
+        prompt_hash = text_hash(prompt_for(case)[0])
+        case_hash = question_hash(case)
+        for name, func in llms.items():
+            if (query_id, name) not in done:
+                client_name, model_id = func.keywords["client_name"], func.keywords["model"]
+                fingerprint = cell_fingerprint(model_id, client_name, prompt_hash, case_hash, db_hash, scoring_version)
+                cells[(query_id, name)] = (fingerprint, {"model_id": model_id, "client_name": client_name,
+                                                         "scoring_version": scoring_version})
+    reused = run_store.lookup({key: fingerprint for key, (fingerprint, _) in cells.items()})
+    return cells, reused
+
+def report_order_key(test_cases, llms):
+    """Sort key restoring the (query, model) order of a sequential run."""
+    case_pos = {case.get('id', f'q_{i}'): i for i, case in enumerate(test_cases)}
+    model_pos = {name: i for i, name in enumerate(llms)}
+    return lambda row: (case_pos.get(row["query_id"], len(case_pos)), model_pos.get(row["model"], len(model_pos)))
+
 # ==========================================
 # MAIN EXECUTION
 # ==========================================
-def main(group_name: str, use_system_prompt: bool, prompt_technique: str, reasoning: bool):
+def main(group_name: str, use_system_prompt: bool, prompt_technique: str, reasoning: bool,
+         concurrent: bool = False, max_concurrency: int = MAX_CONCURRENCY, cache_mode: str = "off",
+         resume: str = None, sandbox: bool = False, memo_mode: str = "run", match_mode: str = "named",
+         scale_factors: list = None, stream: bool = False, schema_pruning: bool = False, skip_preflight: bool = False,
+         registry: list = None, queries_path=None, trace: bool = False, profile_modes: list = None,
+         incremental: bool = False, samples: int = 1, warehouse: bool = True, adaptive: bool = False,
+         adaptive_half_width: float = ADAPTIVE_HALF_WIDTH):
+    """
+    Runs the benchmark and returns the report summary (None if nothing ran).
+    `registry` and `queries_path` default to MODEL_REGISTRY and QUERIES_PATH.
+    `trace` records per-phase spans; `profile_modes` ("cpu", "memory") profiles the run phase.
+    `incremental` reuses the stored cells of the run store and only computes the missing ones.
+    `samples` > 1 draws that many extra answers per pair and scores their majority vote.
+    `warehouse` stores the finished run in the results warehouse.
+    `adaptive` stops each model once its accuracy interval is within `adaptive_half_width`
+    points or separated from the other models' (adaptive.py).
+    """
+    phase_start = time.perf_counter()
+    # 0. Resume: the run header restores the original settings
+    if resume:
+        run_path = resolve_run_path(resume)
+        if not run_path.exists():
+            print(f"Error: Run file '{run_path}' not found.")
+            return
+        header = read_header(run_path)
+        group_name = header.get("model_group", group_name)
+        prompt_technique = header.get("prompt_technique", prompt_technique)
+        use_system_prompt = header.get("system_prompt_used", use_system_prompt)
+        reasoning = header.get("reasoning", reasoning)
+        sandbox = header.get("sandbox", sandbox)
+        match_mode = header.get("match_mode", match_mode)
+        scale_factors = header.get("scale_factors", scale_factors)
+        stream = header.get("stream", stream)
+        schema_pruning = header.get("schema_pruning", schema_pruning)
+        incremental = header.get("incremental", incremental)
+        samples = header.get("samples", samples)
+        adaptive_settings = header.get("adaptive")
+        adaptive = adaptive_settings is not None
+        adaptive_half_width = (adaptive_settings or {}).get("half_width", adaptive_half_width)
+        done = completed_pairs(run_path)
+        print(f"\n--- Resuming run '{run_path.stem}' ({len(done)} rows already done) ---")
+    else:
+        run_path = RUNS_DIR / f"{new_run_name(group_name, prompt_technique)}.jsonl"
+        done = frozenset()
+
     print(f"\n--- Running Benchmark for Group: '{group_name.upper()}' ---")
     
     # 1. Setup Models
-    llms = get_active_models(group_name, MODEL_REGISTRY, clients)
+    llms = get_active_models(group_name, registry or MODEL_REGISTRY, clients, stream=stream)
     if not llms:
         print(f"Error: No available models found for group '{group_name}'.")
         return
 
+    preflight_report = None
+    if not skip_preflight:
+        llms, preflight_report = check_backends(llms)
+        if not llms:
+            print(f"Error: No model of group '{group_name}' is served by a reachable backend.")
+            return
+
     # 2. Setup Data
-    test_cases = load_test_cases(QUERIES_PATH)
+    ground_truth = GroundTruthStore(DB_PATH)
+    test_cases, ground_truth_errors = drop_invalid_cases(load_test_cases(queries_path or QUERIES_PATH, ground_truth))
+    report_ground_truth_errors(ground_truth_errors)
     if not test_cases: return
 
-    benchmark_report = []
-    model_stats = {name: {"total_score": 0, "queries_run": 0} for name in llms}
+    cache = ResponseCache(mode=cache_mode) if cache_mode != "off" else None
+    set_response_cache(cache)
+    breaker = CircuitBreaker()
+    set_circuit_breaker(breaker)
+    tracer = Tracer() if trace else None
+    set_tracer(tracer)
+    run_store = RunStore() if incremental else None
+    stopper = AdaptiveStopper(llms, adaptive_half_width) if adaptive else None
+    if stopper and len(test_cases) < queries_to_converge(adaptive_half_width):
+        print(f"ℹ️ --adaptive: {len(test_cases)} queries cannot converge to ±{adaptive_half_width:g} points "
+              f"(needs {queries_to_converge(adaptive_half_width)}); models can only stop by separating")
+    if stopper and resume:
+        for row in iter_rows(run_path):
+            stopper.record(row)
+
+    memo = None
+    if memo_mode != "off":
+        memo = ExecutionMemo(memo_mode, db_hash=db_fingerprint(DB_PATH) if memo_mode == "persistent" else None)
 
-    with DBHandler(DB_PATH) as db:
-        db_schema = db.get_schema()
-        print(f"Schema loaded. Benchmarking {len(test_cases)} queries across {len(llms)} models.\n")
+    header = {
+        "model_group": group_name,
+        "prompt_technique": prompt_technique,
+        "system_prompt_used": use_system_prompt,
+        "reasoning": reasoning,
+        "sandbox": sandbox,
+        "match_mode": match_mode,
+        "scale_factors": scale_factors,
+        "stream": stream,
+        "schema_pruning": schema_pruning,
+        "incremental": incremental,
+        "samples": samples,
+        "sample_temperature": SAMPLE_TEMPERATURE if samples > 1 else None,
+        "adaptive": {"half_width": adaptive_half_width} if adaptive else None,
+        "started_utc": datetime.utcnow().isoformat(),
+    }
+    interrupted = False
+    with ResultSink(run_path, header, resume=bool(resume)) as sink, DBHandler(DB_PATH) as db, \
+            (SandboxedExecutor(DB_PATH) if sandbox else nullcontext(db)) as executor, \
+            (ScaleProfiler(scale_factors) if scale_factors else nullcontext()) as profiler:
+        if memo:
+            executor = MemoizedExecutor(executor, memo)
+        print(f"Schema loaded. Benchmarking {len(test_cases)} queries across {len(llms)} models.")
+        print(f"Streaming results to: {run_path}\n")
         
-        # Prepare system prompt once (it's constant for the schema/technique)
-        sys_prompt = build_system_prompt(db_schema, use_system_prompt, reasoning, prompt_technique)
+        prompt_for = make_prompt_for(db, use_system_prompt, reasoning, prompt_technique, schema_pruning)
 
-        for i, case in enumerate(test_cases):
-            query_id = case.get('id', f'q_{i}')
-            print(f"{'='*10} Test Case {i+1}: {query_id} {'='*10}")
-            print(f"Q: {case['question']}")
-            
-            expected_data = case.get("ground_truth_results", [])
-            print(f"Expected Rows: {len(expected_data)}")
-            
-            user_prompt = f"User Question: {case['question']}\n\n"
-
-            for model_name, model_func in llms.items():
-                print(f"  > Model: {model_name}...", end=" ", flush=True)
-
-                start_time = time.time()
-                try:
-                    generated_sql = model_func(sys_prompt=sys_prompt, prompt=user_prompt)
-                    clean_sql = generated_sql.replace('```sql', '').replace('```', '').strip()
-                    
-                    # Execute
-                    ai_headers, ai_rows = db.execute_query(clean_sql)
-                    error_msg = "None"
-                except Exception as e:
-                    print(f" [Err: {e}]", end="")
-                    clean_sql = ""
-                    ai_headers, ai_rows = [], None
-                    error_msg = str(e)
-
-                latency = time.time() - start_time
-                
-                # Metrics
-                score, matched, total = calculate_accuracy(expected_data, ai_rows, ai_headers)
-                
-                model_stats[model_name]["total_score"] += score
-                model_stats[model_name]["queries_run"] += 1
-                
-                status_icon = "✅" if score == 100 else "⚠️" if score > 0 else "❌"
-                print(f"{status_icon} Score: {score:.1f}% ({matched}/{total}) - {latency:.2f}s")
-                # print(f"    SQL: {clean_sql}") # Optional debug
-
-                benchmark_report.append({
-                    "timestamp": datetime.now().isoformat(),
-                    "query_id": query_id,
-                    "model": model_name,
-                    "difficulty": case.get('difficulty'),
-                    "match_percentage": score,
-                    "rows_matched": matched,
-                    "rows_expected": total,
-                    "latency": latency,
-                    "generated_sql": clean_sql,
-                    "error": "SQL Execution Failed" if ai_rows is None else error_msg
-                })
-                time.sleep(5) 
-
-    # 3. Save & Summarize
-    save_and_print_summary(benchmark_report, model_stats, group_name, prompt_technique, use_system_prompt, len(test_cases))
-
-
-def save_and_print_summary(report_data, stats, group, technique, use_sys, total_cases):
+        emit = sink.write
+        if run_store:
+            cells, reused = plan_incremental(run_store, test_cases, llms, prompt_for, ground_truth.db_hash,
+                                             match_mode, done, samples, sandbox)
+            for (query_id, model_name), row in reused.items():
+                sink.write({**row, "query_id": query_id, "model": model_name, "reused": True})
+                if stopper:
+                    stopper.record({**row, "model": model_name})
+            done = done | reused.keys()
+            print(f"Incremental: {len(reused)} of {len(cells)} cells reused from the run store, "
+                  f"{len(cells) - len(reused)} to compute.\n")
+
+            def emit(row):
+                sink.write(row)
+                fingerprint, meta = cells[(row["query_id"], row["model"])]
+                run_store.put(fingerprint, row, **meta)
+
+        run_cases = test_cases
+        if stopper:
+            # Stratified order: a model stopped early has run a proportional sample of the difficulty levels
+            run_cases = stratified_order(test_cases)
+            write = emit
+
+            def emit(row):
+                write(row)
+                stopper.record(row)
+
+        phase_seconds = {"setup": time.perf_counter() - phase_start}
+        phase_start = time.perf_counter()
+        capture = ProfileCapture(profile_modes)
+        try:
+            with capture:
+                if concurrent:
+                    run_concurrent(executor, run_cases, llms, prompt_for, emit, done, max_concurrency, memo,
+                                   match_mode, profiler, samples, stopper=stopper)
+                else:
+                    run_sequential(executor, run_cases, llms, prompt_for, emit, done, memo, match_mode, profiler,
+                                   samples, stopper)
+        except KeyboardInterrupt:
+            interrupted = True
+        phase_seconds["run"] = time.perf_counter() - phase_start
+
+    extra_metadata = {"run_name": run_path.stem, "phase_seconds": phase_seconds}
+    if profile_modes:
+        extra_metadata["profile"] = capture.save(TRACES_DIR / run_path.stem)
+    extra_metadata["ground_truth"] = {"compiled": ground_truth.compiled, "from_cache": ground_truth.loaded,
+                                      "errors": ground_truth_errors}
+    ground_truth.close()
+    if preflight_report:
+        extra_metadata["preflight"] = preflight_report
+    extra_metadata["circuit_breaker"] = breaker.stats()
+    set_circuit_breaker(None)
+    if cache:
+        extra_metadata["response_cache"] = cache.stats()
+        set_response_cache(None)
+        cache.close()
+    if memo:
+        extra_metadata["execution_memo"] = memo.stats()
+        memo.close()
+    if run_store:
+        extra_metadata["run_store"] = run_store.stats()
+        run_store.close()
+
+    if interrupted:
+        print(f"\nInterrupted. Completed rows are saved; continue with: --resume {run_path.stem}")
+        set_tracer(None)
+        return
+
+    # 3. Save & Summarize (streamed from the run file, not held in memory)
+    model_stats = {name: new_model_stats() for name in llms}
+    for row in iter_rows(run_path):
+        record_row(row, model_stats)
+    if stopper:
+        for name, stats in model_stats.items():
+            stats["adaptive"] = stopper.summary(name)
+        run_pairs = sum(stats["queries_run"] + stats["queries_skipped"] + stats["queries_failed"]
+                        for stats in model_stats.values())
+        extra_metadata["adaptive"] = stopper.stats(len(test_cases) * len(llms), run_pairs)
+
+    report_rows = iter_rows(run_path, order_key=report_order_key(test_cases, llms))
+    if tracer:
+        extra_metadata["trace_file"] = str(TRACES_DIR / f"{run_path.stem}.trace.json")
+    summary = save_and_print_summary(report_rows, model_stats, group_name, prompt_technique, use_system_prompt,
+                                     len(test_cases), extra_metadata=extra_metadata)
+    if warehouse:
+        with span("report_write"):
+            store_run(summary, iter_rows(run_path), config=header)
+    if tracer:
+        set_tracer(None)
+        tracer.export_chrome(TRACES_DIR / f"{run_path.stem}.trace.json")
+        print_phase_table(tracer.summary())
+        print(f"Chrome trace saved to: {extra_metadata['trace_file']}")
+    return summary
+
+
+def save_and_print_summary(report_data, stats, group, technique, use_sys, total_cases, extra_metadata=None,
+                           extra_sections=None):
+    """
+    Writes the JSON report (`report_data` may be any iterable of rows), prints the
+    summary table and returns the summary. `extra_sections` are added next to
+    `model_performance` (e.g. per-database scores).
+    """
     # Construct Summary
     summary = {
         "metadata": {
@@ -208,31 +841,57 @@ def save_and_print_summary(report_data, stats, group, technique, use_sys, total_
             "model_group": group,
             "total_queries_run": total_cases,
             "prompt_technique": technique,
-            "system_prompt_used": use_sys
+            "system_prompt_used": use_sys,
+            **(extra_metadata or {})
         },
         "model_performance": []
     }
 
     for name, data in stats.items():
         avg = (data["total_score"] / data["queries_run"]) if data["queries_run"] > 0 else 0
+        runs = data["queries_run"]
+        ttft_count, tps_count = data.get("ttft_count", 0), data.get("tps_count", 0)
         summary["model_performance"].append({
             "model_name": name,
             "average_accuracy": round(avg, 2),
-            "queries_completed": data["queries_run"]
+            "queries_completed": runs,
+            "queries_skipped": data.get("queries_skipped", 0),
+            "queries_failed": data.get("queries_failed", 0),
+            "average_latency": round(data.get("total_latency", 0.0) / runs, 3) if runs else None,
+            "average_ttft": round(data["ttft_sum"] / ttft_count, 3) if ttft_count else None,
+            "average_tokens_per_second": round(data["tps_sum"] / tps_count, 1) if tps_count else None,
+            "prompt_tokens": data.get("prompt_tokens", 0),
+            "completion_tokens": data.get("completion_tokens", 0)
         })
+        sampled = data.get("sampled_rows", 0)
+        if sampled:
+            summary["model_performance"][-1]["self_consistency"] = {
+                "rows": sampled,
+                "majority_exact_rate": round(data["majority_exact"] / sampled * 100, 2),
+                "pass_at_k": round(data["pass_at_k"] / sampled * 100, 2),
+                "mean_sample_accuracy": round(data["sample_accuracy_sum"] / sampled, 2),
+                "greedy_accuracy": round(data["greedy_score"] / sampled, 2),
+                "greedy_exact_rate": round(data["greedy_exact"] / sampled * 100, 2),
+                "average_samples_request_time": round(data["samples_time"] / sampled, 3),
+                "average_greedy_request_time": round(data["greedy_time"] / sampled, 3),
+                "latency_ratio": round(data["samples_time"] / data["greedy_time"], 2) if data["greedy_time"] else None,
+                "token_ratio": round(data["samples_tokens"] / data["greedy_tokens"], 2) if data["greedy_tokens"] else None,
+            }
+        if data.get("adaptive"):
+            summary["model_performance"][-1]["adaptive"] = data["adaptive"]
     
     summary["model_performance"].sort(key=lambda x: x["average_accuracy"], reverse=True)
+    summary.update(extra_sections or {})
 
-    # Save to JSON
-    final_output = {"summary": summary, "detailed_report": report_data}
-    
+    # Save to JSON (one file per run, so earlier runs are never overwritten)
     try:
         os.makedirs(RESULTS_DIR, exist_ok=True)
-        filename = f"benchmark_{group}_{technique}.json"
+        run_name = summary["metadata"].get("run_name")
+        filename = f"benchmark_{run_name}.json" if run_name else f"benchmark_{group}_{technique}.json"
         filepath = RESULTS_DIR / filename
         
-        with open(filepath, 'w') as f:
-            json.dump(final_output, f, indent=2)
+        with span("report_write"):
+            write_report_json(filepath, summary, report_data)
         print(f"\nBenchmark report saved to: {filepath}")
     except Exception as e:
         print(f"\nError saving report: {e}")
@@ -247,6 +906,60 @@ def save_and_print_summary(report_data, stats, group, technique, use_sys, total_
         print(f"{m['model_name']:<25} | {m['average_accuracy']:.2f}%{' ':<11} | {m['queries_completed']}")
     print("#"*50)
 
+    if any(m["average_ttft"] is not None or m["average_tokens_per_second"] is not None for m in summary["model_performance"]):
+        print(f"\n{'Model Name':<25} | {'Avg TTFT':<10} | {'Tokens/s':<10} | {'Prompt tok':<11} | {'Compl. tok'}")
+        print("-" * 78)
+        for m in summary["model_performance"]:
+            ttft = f"{m['average_ttft']:.3f}s" if m["average_ttft"] is not None else "-"
+            tps = f"{m['average_tokens_per_second']:.1f}" if m["average_tokens_per_second"] is not None else "-"
+            print(f"{m['model_name']:<25} | {ttft:<10} | {tps:<10} | {m['prompt_tokens']:<11} | {m['completion_tokens']}")
+
+    if any("self_consistency" in m for m in summary["model_performance"]):
+        print(f"\n{'Model Name':<25} | {'Majority':<9} | {'pass@k':<8} | {'Greedy':<8} | {'Sample':<8} | "
+              f"{'Latency x':<9} | {'Tokens x'}")
+        print("-" * 92)
+        for m in summary["model_performance"]:
+            sc = m.get("self_consistency")
+            if not sc:
+                continue
+            latency_ratio = f"{sc['latency_ratio']:.2f}" if sc["latency_ratio"] is not None else "-"
+            token_ratio = f"{sc['token_ratio']:.2f}" if sc["token_ratio"] is not None else "-"
+            print(f"{m['model_name']:<25} | {m['average_accuracy']:>7.2f}% | {sc['pass_at_k']:>6.2f}% | "
+                  f"{sc['greedy_accuracy']:>6.2f}% | {sc['mean_sample_accuracy']:>6.2f}% | {latency_ratio:<9} | {token_ratio}")
+        print("Majority, Greedy and Sample: average accuracy; pass@k: share of questions with an exact sample; "
+              "Latency x / Tokens x: k samples vs. greedy")
+
+    adaptive_stats = summary["metadata"].get("adaptive")
+    if adaptive_stats:
+        level = f"{adaptive_stats['confidence'] * 100:.0f}% CI"
+        print(f"\n{'Model Name':<25} | {'Accuracy':<9} | {level:<16} | {'Queries':<7} | {'Status'}")
+        print("-" * 80)
+        for m in summary["model_performance"]:
+            ad = m.get("adaptive")
+            if not ad:
+                continue
+            low, high = ad["accuracy_interval"]
+            print(f"{m['model_name']:<25} | {m['average_accuracy']:>7.2f}% | [{low:>5.1f}, {high:>5.1f}]"
+                  f"{' ':<2} | {ad['queries_scored']:<7} | {ad['status']}")
+        print(f"Adaptive: {adaptive_stats['pairs_saved']} of {adaptive_stats['pairs_planned']} (query, model) pairs "
+              f"saved, {adaptive_stats['models_stopped']} models stopped early")
+
+    cache_stats = summary["metadata"].get("response_cache")
+    if cache_stats:
+        print(f"Response cache ({cache_stats['mode']}): {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    memo_stats = summary["metadata"].get("execution_memo")
+    if memo_stats:
+        print(f"Execution memo ({memo_stats['mode']}): {memo_stats['executions_saved']} executions and "
+              f"{memo_stats['scores_saved']} scorings saved")
+    store_stats = summary["metadata"].get("run_store")
+    if store_stats:
+        print(f"Run store: {store_stats['cells_reused']} cells reused, {store_stats['cells_stored']} stored")
+    breaker_stats = summary["metadata"].get("circuit_breaker")
+    if breaker_stats and breaker_stats["requests_skipped"]:
+        print(f"Circuit breaker: {breaker_stats['requests_skipped']} requests skipped "
+              f"(open: {', '.join(breaker_stats['open_circuits']) or 'none'})")
+    return summary
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     # "all" is default, but allow any tag defined in logic
@@ -254,6 +967,30 @@ if __name__ == "__main__":
     parser.add_argument("--system_prompt", action="store_true", default=True)
     parser.add_argument("--prompt_technique", type=str, default="zero-shot", choices=FEW_SHOT_EXAMPLES.keys() | {"zero-shot"})
     parser.add_argument("--reasoning", action="store_true", default=True)
+    parser.add_argument("--concurrent", action="store_true", help="Send requests to different clients concurrently (rate limited per client).")
+    parser.add_argument("--max_concurrency", type=int, default=MAX_CONCURRENCY, help="Global cap on in-flight requests in --concurrent mode.")
+    parser.add_argument("--cache", type=str, default="off", choices=CACHE_MODES, help="LLM response cache: off, rw (read-write) or ro (read-only replay).")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN", help="Continue an interrupted run (run name or path to its .jsonl file).")
+    parser.add_argument("--sandbox", action="store_true", help="Run generated SQL read-only, with time/row limits, on a worker pool.")
+    parser.add_argument("--memo", type=str, default="run", choices=MEMO_MODES, help="Reuse execution results and scores of identical (canonicalized) SQL.")
+    parser.add_argument("--scale_factors", type=int, nargs="+", default=None, metavar="N", help="Also run each generated query on N-times scaled databases and record execution time and query plan.")
+    parser.add_argument("--stream", action="store_true", help="Stream completions to measure time-to-first-token and tokens/sec.")
+    parser.add_argument("--schema_pruning", action="store_true", help="Only include the tables linked to each question (plus join paths) in the system prompt.")
+    parser.add_argument("--skip_preflight", action="store_true", help="Do not probe the backends' /models endpoints before the run.")
+    parser.add_argument("--trace", action="store_true", help="Record per-phase spans; export a Chrome trace and print a phase summary.")
+    parser.add_argument("--profile", type=str, nargs="+", default=None, choices=["cpu", "memory"], help="Profile the run with cProfile (cpu) and/or tracemalloc (memory).")
+    parser.add_argument("--incremental", action="store_true", help="Only compute (query, model) cells missing from the run store; reuse the rest.")
+    parser.add_argument("--samples", type=int, default=1, metavar="K", help="Self-consistency: also draw K sampled answers per question, report their majority vote, pass@K and the cost against greedy decoding.")
+    parser.add_argument("--no_warehouse", action="store_true", help="Do not store the finished run in the results warehouse.")
+    parser.add_argument("--adaptive", action="store_true", help="Stop each model early once its accuracy confidence interval is tight, or cannot change the ranking.")
+    parser.add_argument("--adaptive_half_width", type=float, default=ADAPTIVE_HALF_WIDTH, metavar="POINTS", help="Half-width (accuracy points) at which --adaptive stops a model.")
+    parser.add_argument("--match_mode", type=str, default="named", choices=MATCH_MODES, help="How result columns are matched: by header name, by position, or ignoring both.")
 
     args = parser.parse_args()
-    main(args.group, args.system_prompt, args.prompt_technique, args.reasoning)
\ No newline at end of file
+    main(args.group, args.system_prompt, args.prompt_technique, args.reasoning,
+         concurrent=args.concurrent, max_concurrency=args.max_concurrency, cache_mode=args.cache,
+         resume=args.resume, sandbox=args.sandbox, memo_mode=args.memo, match_mode=args.match_mode,
+         scale_factors=args.scale_factors, stream=args.stream, schema_pruning=args.schema_pruning,
+         skip_preflight=args.skip_preflight, trace=args.trace, profile_modes=args.profile,
+         incremental=args.incremental, samples=args.samples, warehouse=not args.no_warehouse,
+         adaptive=args.adaptive, adaptive_half_width=args.adaptive_half_width)
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: result comparison on large result sets.
+
+Compares the legacy dict/sorted-tuple scoring with the hashed multiset engine
+in result_compare, on synthetic results of 10^5+ rows. The streaming case
+feeds `compare` straight from a SQLite cursor drained with `fetchmany`,
+without materializing the rows.
+
+Usage:
+    uv run python -m benchmarks.compare_bench --rows 100000 200000
+"""
+import argparse
+import random
+import sqlite3
+import time
+import tracemalloc
+
+from result_compare import ExpectedResult, compare
+
+HEADERS = ["book_id", "title", "publication_year", "genre"]
+
+
+def legacy_accuracy(expected_dicts, actual_rows, actual_headers):
+    """The pre-engine scoring: one dict and one sorted tuple per row, compared as sets."""
+    def normalize_row(row_dict):
+        return tuple(sorted((k.lower(), str(v).strip()) for k, v in row_dict.items()))
+
+    expected_set = {normalize_row(d) for d in expected_dicts}
+    actual_set = {normalize_row(dict(zip(actual_headers, row))) for row in actual_rows if len(row) == len(actual_headers)}
+    matched = len(expected_set & actual_set)
+    return matched / len(expected_set) * 100.0
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    genres = ["Drama", "Comedy", "Horror", "Documentary", "Thriller"]
+    return [(i, f"Title {i}", rng.randint(1950, 2025), rng.choice(genres)) for i in range(n)]
+
+
+def timed(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<36} {elapsed * 1000:>9.1f} ms   peak {peak / 1e6:>7.1f} MB")
+    return result
+
+
+def run(n):
+    print(f"--- {n:,} rows ---")
+    rows = make_rows(n)
+    expected_dicts = [dict(zip(HEADERS, r)) for r in rows]
+    # Same rows, shuffled columns and order, as a model might return them
+    actual_headers = ["title", "genre", "book_id", "publication_year"]
+    actual_rows = [(r[1], r[3], r[0], r[2]) for r in reversed(rows)]
+
+    timed("legacy normalize_row (sets)", lambda: legacy_accuracy(expected_dicts, actual_rows, actual_headers))
+    expected = timed("engine: prepare expectation", lambda: ExpectedResult(HEADERS, rows))
+    metrics = timed("engine: compare (materialized)", lambda: compare(expected, actual_rows, actual_headers))
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE t (title, genre, book_id, publication_year)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", actual_rows)
+
+    def streamed():
+        cursor = connection.execute("SELECT * FROM t")
+        headers = [d[0] for d in cursor.description]
+
+        def batches():
+            while batch := cursor.fetchmany(1000):
+                yield from batch
+
+        return compare(expected, batches(), headers)
+
+    streamed_metrics = timed("engine: compare (fetchmany stream)", streamed)
+    connection.close()
+    assert metrics == streamed_metrics and metrics["exact_match"] and not metrics["ordered_match"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 200_000])
+    args = parser.parse_args()
+    for n in args.rows:
+        run(n)
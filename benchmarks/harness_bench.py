@@ -0,0 +1,138 @@
+"""
+Harness throughput benchmark against the local mock LLM server.
+
+Drives benchmark.main in concurrent mode with thousands of synthetic test
+cases (the real questions, repeated under fresh ids) and many fake models
+served by mock_llm_server. With the default zero mock latency, the numbers
+measure the harness itself: scheduling, SQL execution, scoring and report
+writing. For each size it reports rows/sec, peak memory and the time spent
+in each phase (setup, run, report).
+
+Usage:
+    uv run python -m benchmarks.harness_bench --cases 1000 5000 --models 8
+    uv run python -m benchmarks.harness_bench --cases 2000 --latency lognormal:0.05:0.5 --error_rate 0.02 --stream
+    uv run python -m benchmarks.harness_bench --cases 500 --samples 5 --wrong_rate 0.3
+"""
+import argparse
+import contextlib
+import io
+import json
+import resource
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import benchmark
+from config import QUERIES_PATH, RESULTS_DIR, RUNS_DIR
+from ground_truth import GroundTruthStore
+from llm_connectors import register_client
+from mock_llm_server import MockLLMServer
+
+CLIENT_NAME = "Mock"
+GROUP = "mock"
+
+
+def synthetic_cases(n: int) -> tuple:
+    """Returns (cases, answers): `n` cases cycling over the real ones, and {question: ground-truth SQL}."""
+    store = GroundTruthStore()
+    with open(QUERIES_PATH, "r") as f:
+        base = [case for case in json.load(f) if case.get("ground_truth_sql")]
+    expected = [store.expected_results(case) for case in base]
+    store.close()
+
+    cases, answers = [], {}
+    for i in range(n):
+        case = base[i % len(base)]
+        question = f"{case['question']} [#{i}]"
+        cases.append({
+            "id": f"synth_{i:05d}",
+            "difficulty": case.get("difficulty"),
+            "question": question,
+            "ground_truth_results": expected[i % len(base)],
+        })
+        answers[question] = case["ground_truth_sql"]
+    return cases, answers
+
+
+def mock_registry(n_models: int) -> list:
+    return [{"name": f"mock-{i:02d}", "id": f"mock/model-{i:02d}", "client": CLIENT_NAME, "tags": [GROUP]}
+            for i in range(n_models)]
+
+
+def run(n_cases: int, args):
+    cases, answers = synthetic_cases(n_cases)
+    registry = mock_registry(args.models)
+    print(f"--- {n_cases:,} cases x {args.models} models = {n_cases * args.models:,} rows ---")
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockLLMServer(models=[m["id"] for m in registry], latency=args.latency, token_delay=args.token_delay,
+                          error_rate=args.error_rate, answers=answers, wrong_rate=args.wrong_rate) as server:
+        queries_path = Path(tmp) / "queries.json"
+        queries_path.write_text(json.dumps(cases), encoding="utf-8")
+        register_client(CLIENT_NAME, server.base_url)
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            summary = benchmark.main(GROUP, True, "zero-shot", True, concurrent=True,
+                                     max_concurrency=args.max_concurrency, memo_mode=args.memo, stream=args.stream,
+                                     registry=registry, queries_path=queries_path, trace=args.trace,
+                                     samples=args.samples, warehouse=False)
+        total = time.perf_counter() - start
+        if args.tracemalloc:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory = f"tracemalloc peak {peak / 1e6:.1f} MB"
+        else:
+            memory = f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB"
+        requests = server.requests
+
+    if summary is None:
+        print("  run failed (rerun with --verbose)")
+        return
+    metadata = summary["metadata"]
+    phases = metadata["phase_seconds"]
+    report = total - phases["setup"] - phases["run"]
+    rows = sum(m["queries_completed"] + m["queries_skipped"] for m in summary["model_performance"])
+    accuracy = sum(m["average_accuracy"] for m in summary["model_performance"]) / len(summary["model_performance"])
+
+    print(f"  rows                 {rows:>10,}   ({requests:,} mock requests)")
+    print(f"  throughput           {rows / total:>10.1f} rows/s   (run phase: {rows / phases['run']:.1f} rows/s)")
+    print(f"  setup                {phases['setup'] * 1000:>10.1f} ms")
+    print(f"  run                  {phases['run'] * 1000:>10.1f} ms   ({phases['run'] / rows * 1e6:.0f} us/row)")
+    print(f"  report               {report * 1000:>10.1f} ms")
+    print(f"  memory               {memory}")
+    print(f"  average accuracy     {accuracy:>10.2f} %")
+    sampled = [m["self_consistency"] for m in summary["model_performance"] if "self_consistency" in m]
+    if sampled:
+        print(f"  pass@{args.samples:<16}{sum(sc['pass_at_k'] for sc in sampled) / len(sampled):>10.2f} %")
+        print(f"  greedy accuracy      {sum(sc['greedy_accuracy'] for sc in sampled) / len(sampled):>10.2f} %")
+
+    if not args.keep:
+        run_name = metadata["run_name"]
+        (RUNS_DIR / f"{run_name}.jsonl").unlink(missing_ok=True)
+        (RESULTS_DIR / f"benchmark_{run_name}.json").unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--models", type=int, default=8)
+    parser.add_argument("--max_concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=str, default="0", help="Mock latency spec (see mock_llm_server.py).")
+    parser.add_argument("--token_delay", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--wrong_rate", type=float, default=0.1)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--samples", type=int, default=1, help="Self-consistency samples per question.")
+    parser.add_argument("--memo", type=str, default="run", choices=["off", "run"])
+    parser.add_argument("--tracemalloc", action="store_true", help="Report the traced Python heap peak (slower) instead of max RSS.")
+    parser.add_argument("--trace", action="store_true", help="Record spans and keep the Chrome trace in results/traces/.")
+    parser.add_argument("--verbose", action="store_true", help="Show the benchmark's own output.")
+    parser.add_argument("--keep", action="store_true", help="Keep the run files and reports in results/.")
+    args = parser.parse_args()
+    for n in args.cases:
+        run(n, args)
@@ -12,6 +12,8 @@ ROOT_DIR = Path(__file__).resolve().parent
 DB_PATH = ROOT_DIR / "data" / "library.db"
 QUERIES_PATH = ROOT_DIR / "test_cases" / "queries.json"
 RESULTS_DIR = ROOT_DIR / "results"
+RUNS_DIR = RESULTS_DIR / "runs"
+TRACES_DIR = RESULTS_DIR / "traces"
 
 # ==========================================
 # MODEL REGISTRY
@@ -65,4 +67,123 @@ FEW_SHOT_EXAMPLES = {
         "A: SELECT DISTINCT R.name, R.surname FROM READER R JOIN BOOK_LOAN BL ON R.reader_id = BL.reader_id;\n\n"
         "Example 5:\nQ: List all publishers located in 'New York'.\nA: SELECT name FROM PUBLISHER WHERE city = 'New York';\n\n"
     )
-}
\ No newline at end of file
+}
+
+# ==========================================
+# CONCURRENCY & RATE LIMITS
+# ==========================================
+# Used by the --concurrent execution mode (see scheduler.py).
+# "concurrency": max in-flight requests for this client
+# "rate": sustained requests per second (token bucket refill rate)
+# "burst": token bucket capacity
+CLIENT_RATE_LIMITS = {
+    "LM Studio": {"concurrency": 1, "rate": 2.0, "burst": 1},
+    "OpenRouter": {"concurrency": 4, "rate": 0.33, "burst": 2},
+    "Gemini": {"concurrency": 4, "rate": 0.16, "burst": 2},
+    "OpenAI": {"concurrency": 8, "rate": 1.0, "burst": 4},
+    # Local mock backend (mock_llm_server.py), used by the harness benchmarks
+    "Mock": {"concurrency": 64, "rate": 10_000.0, "burst": 64},
+}
+
+# Fallback for clients not listed above (matches the old 5s sequential pause)
+DEFAULT_RATE_LIMIT = {"concurrency": 1, "rate": 0.2, "burst": 1}
+
+# Global cap on in-flight requests across all clients
+MAX_CONCURRENCY = 8
+
+# ==========================================
+# RESPONSE CACHE
+# ==========================================
+# On-disk cache of LLM responses (see response_cache.py)
+CACHE_PATH = RESULTS_DIR / "response_cache.db"
+CACHE_MAX_ENTRIES = 50_000
+CACHE_MAX_AGE_DAYS = 30
+
+# ==========================================
+# SANDBOXED SQL EXECUTION
+# ==========================================
+# Limits applied to model-generated SQL in --sandbox mode (see db_handler.SandboxedExecutor)
+SQL_TIMEOUT_SECONDS = 10        # wall-clock budget per statement
+SQL_MAX_VM_STEPS = 200_000_000  # SQLite VM instruction budget per statement (None = unlimited)
+SQL_MAX_ROWS = 10_000           # rows fetched before the result is truncated
+SQL_WORKERS = 2                 # size of the execution thread pool
+
+# ==========================================
+# EXECUTION MEMO
+# ==========================================
+# Persistent store for --memo persistent (see sql_memo.py)
+MEMO_PATH = RESULTS_DIR / "execution_memo.db"
+
+# ==========================================
+# GROUND TRUTH CACHE
+# ==========================================
+# Materialized ground_truth_sql results (see ground_truth.py)
+GROUND_TRUTH_CACHE_PATH = RESULTS_DIR / "ground_truth_cache.db"
+
+# ==========================================
+# SCALED DATABASES
+# ==========================================
+# Synthetic, referentially consistent copies of library.db (see scale_db.py)
+INSERTS_DIR = ROOT_DIR / "inserts"
+SCALED_DB_DIR = ROOT_DIR / "data" / "scaled"
+
+# ==========================================
+# BACKEND HEALTH
+# ==========================================
+# Startup probe of every client's /models endpoint (see llm_connectors.preflight)
+PREFLIGHT_TIMEOUT_SECONDS = 5
+# Consecutive failures after which requests to a model / to a whole client are skipped
+MODEL_FAILURE_THRESHOLD = 3
+CLIENT_FAILURE_THRESHOLD = 5
+# Seconds before an open circuit lets one trial request through (None = open for the rest of the run)
+CIRCUIT_COOLDOWN_SECONDS = 120
+
+# ==========================================
+# INCREMENTAL RUN STORE
+# ==========================================
+# Scored cells reused by --incremental (see run_store.py)
+RUN_STORE_PATH = RESULTS_DIR / "run_store.db"
+# Bump whenever scoring changes, so stored cells are recomputed
+SCORING_VERSION = "2"
+
+# ==========================================
+# DISTRIBUTED WORK QUEUE
+# ==========================================
+# Shared task queue for multi-worker sweeps (see work_queue.py)
+QUEUE_PATH = RESULTS_DIR / "work_queue.db"
+QUEUE_LEASE_SECONDS = 300   # a task not completed within its lease is handed out again
+QUEUE_MAX_ATTEMPTS = 3      # leases per task before it is marked failed
+
+# ==========================================
+# SELF-CONSISTENCY SAMPLING
+# ==========================================
+# Used by --samples k (see self_consistency.py)
+SAMPLE_TEMPERATURE = 0.7
+# Clients asked for all k samples in one request with `n=k`; the others get k concurrent requests
+N_SAMPLING_CLIENTS = {"OpenAI", "Gemini", "Mock"}
+
+# ==========================================
+# RESULTS WAREHOUSE
+# ==========================================
+# Append-only store of every finished run, for analysis (see warehouse.py)
+WAREHOUSE_PATH = RESULTS_DIR / "warehouse.db"
+
+# ==========================================
+# MULTI-DATABASE SUITES
+# ==========================================
+# Manifest-driven runs over many databases (see multi_db.py)
+SCHEMA_CACHE_PATH = RESULTS_DIR / "schema_cache.db"
+MULTI_DB_WORKERS = 4        # worker processes
+MULTI_DB_MAX_OPEN = 16      # open database connections kept per worker process (LRU)
+MULTI_DB_CHUNK_SIZE = 25    # test cases per unit of work (and per resume checkpoint)
+
+# ==========================================
+# ADAPTIVE EVALUATION
+# ==========================================
+# Early stopping per model with --adaptive (see adaptive.py)
+ADAPTIVE_CONFIDENCE = 0.95   # confidence level of the Wilson intervals
+ADAPTIVE_HALF_WIDTH = 10.0   # stop a model once its interval is this tight (accuracy points)
+ADAPTIVE_MIN_QUERIES = 5     # queries scored per model before it may be stopped
+# Converging to ±10 takes 16 queries for a model at 0% or 100%, and 93 at 50%
+# (±5: 35 and 381). On smaller suites, such as the 10 shipped queries, a model
+# can only stop by separating, e.g. 0/5 [0, 43] vs 5/5 [57, 100].
@@ -1,10 +1,82 @@
+import contextvars
+import hashlib
 import sqlite3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from config import SQL_TIMEOUT_SECONDS, SQL_MAX_VM_STEPS, SQL_MAX_ROWS, SQL_WORKERS
+from tracing import span
+
+# Error categories reported for each executed query
+ERR_NONE = "none"
+ERR_SQL = "sql_error"
+ERR_TIMEOUT = "timeout"
+ERR_ROW_LIMIT = "row_limit"
+
+# How many SQLite VM instructions run between two progress handler calls
+PROGRESS_INTERVAL = 10_000
+
+
+def db_fingerprint(db_path) -> str:
+    """SHA-256 of the database file contents, used to key caches built from query results."""
+    digest = hashlib.sha256()
+    with open(db_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_schema(connection) -> str:
+    """Prompt representation of a database schema: every table with its column names and types."""
+    schema_str = []
+    for (table_name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall():
+        schema_str.append(f"Table: {table_name}")
+        # Columns: (cid, name, type, notnull, default, pk)
+        for column in connection.execute(f"PRAGMA table_info({table_name})").fetchall():
+            schema_str.append(f"  - {column[1]} ({column[2]})")
+        schema_str.append("") # Empty line between tables
+    return "\n".join(schema_str)
+
+
+def fetch_rows(cursor, max_rows: int = None) -> tuple:
+    """
+    Fetches a result in `fetchmany` batches as (rows, truncated), stopping after
+    `max_rows` rows, so an unbounded result is never built in memory.
+    """
+    rows = []
+    with span("row_fetch") as fetch:
+        while True:
+            size = 1000 if max_rows is None else min(1000, max_rows + 1 - len(rows))
+            batch = cursor.fetchmany(size)
+            if not batch:
+                break
+            rows.extend(map(tuple, batch))
+            if max_rows is not None and len(rows) > max_rows:
+                fetch.set(rows=max_rows)
+                return rows[:max_rows], True
+        fetch.set(rows=len(rows))
+    return rows, False
+
+
+class QueryResult(NamedTuple):
+    """Outcome of running one statement. `rows` is None when the statement failed."""
+    headers: list
+    rows: list
+    error: str = None
+    error_category: str = ERR_NONE
+    truncated: bool = False
+
 
 class DBHandler:
-    def __init__(self, db_path):
-        """Initialize the connection settings."""
+    pooled = False
+
+    def __init__(self, db_path, max_rows=SQL_MAX_ROWS):
+        """Initialize the connection settings; results are truncated after `max_rows` rows (None: no limit)."""
         self.db_path = db_path
+        self.max_rows = max_rows
         self.connection = None
         self.cursor = None
 
@@ -30,46 +102,181 @@ class DBHandler:
 
     def get_schema(self):
         """Constructs a string representation of the database schema."""
-        schema_str = []
         try:
-            # Get all table names
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = self.cursor.fetchall()
-            
-            for table in tables:
-                table_name = table['name']
-                schema_str.append(f"Table: {table_name}")
-                
-                # Get columns for this table
-                self.cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = self.cursor.fetchall()
-                for col in columns:
-                    schema_str.append(f"  - {col['name']} ({col['type']})")
-                schema_str.append("") # Empty line between tables
-                
-            return "\n".join(schema_str)
+            return read_schema(self.connection)
         except Exception as e:
             return f"Error getting schema: {e}"
 
+    def _execute(self, sql_query, params=()):
+        with span("sql_execute"):
+            self.cursor.execute(sql_query, params)
+        
+        # If it's a SELECT query, fetch results (Row objects become tuples)
+        if self.cursor.description:
+            headers = [description[0] for description in self.cursor.description]
+            rows, truncated = fetch_rows(self.cursor, self.max_rows)
+            return headers, rows, truncated
+        else:
+            # For INSERT/UPDATE/DELETE, commit changes
+            self.connection.commit()
+            return [], [], False
+
     def execute_query(self, sql_query, params=()):
         """
         Executes a SQL query and returns the results and column headers.
         """
         try:
-            self.cursor.execute(sql_query, params)
-            
-            # If it's a SELECT query, fetch results
-            if self.cursor.description:
-                headers = [description[0] for description in self.cursor.description]
-                results = self.cursor.fetchall()
-                # Convert Row objects to dictionaries or tuples for easier printing
-                clean_results = [tuple(row) for row in results]
-                return headers, clean_results
-            else:
-                # For INSERT/UPDATE/DELETE, commit changes
-                self.connection.commit()
-                return [], []
-                
+            headers, rows, _ = self._execute(sql_query, params)
+            return headers, rows
         except sqlite3.Error as e:
             print(f"❌ SQL Error: {e}")
-            return None, None
\ No newline at end of file
+            return None, None
+
+    def run_query(self, sql_query, params=()) -> QueryResult:
+        """Like execute_query, but keeps the error message and category."""
+        try:
+            headers, rows, truncated = self._execute(sql_query, params)
+            if truncated:
+                return QueryResult(headers, rows, f"Row limit exceeded: truncated to {self.max_rows} rows",
+                                   ERR_ROW_LIMIT, True)
+            return QueryResult(headers, rows)
+        except sqlite3.Error as e:
+            print(f"❌ SQL Error: {e}")
+            return QueryResult([], None, str(e), ERR_SQL)
+
+
+class SandboxedExecutor:
+    """
+    Runs untrusted (model-generated) SQL safely:
+      - the database is opened read-only (URI `mode=ro`, plus `PRAGMA query_only`),
+      - each statement gets a wall-clock and VM-step budget enforced by SQLite's progress handler,
+      - results are fetched with `fetchmany` and truncated at `max_rows`,
+      - statements run on a small thread pool, so `submit()` never blocks the caller.
+    """
+    pooled = True
+
+    def __init__(self, db_path, timeout=SQL_TIMEOUT_SECONDS, max_vm_steps=SQL_MAX_VM_STEPS,
+                 max_rows=SQL_MAX_ROWS, workers=SQL_WORKERS):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.max_vm_steps = max_vm_steps
+        self.max_rows = max_rows
+        self.workers = workers
+        self.pool = None
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def __enter__(self):
+        if not os.path.exists(self.db_path):
+            print(f"⚠️ Warning: Database file '{self.db_path}' not found.")
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sql")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.pool:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+    def _connection(self):
+        """One read-only connection per worker thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            connection.execute("PRAGMA query_only = ON")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _run(self, sql_query, params=()) -> QueryResult:
+        connection = self._connection()
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        state = {"steps": 0, "reason": None}
+
+        def progress():
+            state["steps"] += PROGRESS_INTERVAL
+            if deadline and time.monotonic() > deadline:
+                state["reason"] = f"exceeded {self.timeout}s time budget"
+                return 1
+            if self.max_vm_steps and state["steps"] > self.max_vm_steps:
+                state["reason"] = f"exceeded {self.max_vm_steps} VM step budget"
+                return 1
+            return 0
+
+        connection.set_progress_handler(progress, PROGRESS_INTERVAL)
+        cursor = connection.cursor()
+        try:
+            with span("sql_execute"):
+                cursor.execute(sql_query, params)
+            if not cursor.description:
+                return QueryResult([], [])
+            headers = [description[0] for description in cursor.description]
+            rows, truncated = fetch_rows(cursor, self.max_rows)
+            if truncated:
+                return QueryResult(headers, rows, f"Row limit exceeded: truncated to {self.max_rows} rows",
+                                   ERR_ROW_LIMIT, True)
+            return QueryResult(headers, rows)
+        except sqlite3.Error as e:
+            if state["reason"]:
+                return QueryResult([], None, f"Query interrupted: {state['reason']}", ERR_TIMEOUT)
+            return QueryResult([], None, str(e), ERR_SQL)
+        finally:
+            cursor.close()
+            connection.set_progress_handler(None, PROGRESS_INTERVAL)
+
+    def submit(self, sql_query, params=()):
+        """Schedules a statement on the pool and returns a Future[QueryResult]."""
+        # The worker inherits the caller's context (e.g. tracing attributes)
+        return self.pool.submit(contextvars.copy_context().run, self._run, sql_query, params)
+
+    def run_query(self, sql_query, params=()) -> QueryResult:
+        """Runs a statement on the pool and waits for its result."""
+        return self.submit(sql_query, params).result()
+
+
+class ReadOnlyConnection(SandboxedExecutor):
+    """
+    A single read-only connection with the sandbox's time, VM-step and row limits, running
+    statements in the calling thread. With `in_memory`, the database is first copied into
+    memory with `sqlite3.backup`, so later statements never touch the file.
+    """
+    pooled = False
+
+    def __init__(self, db_path, in_memory=False, **limits):
+        super().__init__(db_path, **limits)
+        self.in_memory = in_memory
+        self.connection = None
+        self.schema = None  # may be preset from a schema cache
+
+    def __enter__(self):
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        if self.in_memory:
+            memory = sqlite3.connect(":memory:", check_same_thread=False)
+            self.connection.backup(memory)
+            self.connection.close()
+            self.connection = memory
+        self.connection.execute("PRAGMA query_only = ON")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def _connection(self):
+        return self.connection
+
+    def get_schema(self) -> str:
+        if self.schema is None:
+            self.schema = read_schema(self.connection)
+        return self.schema
+
+    def run_query(self, sql_query, params=()) -> QueryResult:
+        return self._run(sql_query, params)
@@ -0,0 +1,193 @@
+"""
+Ground-truth materialization.
+
+Test cases that carry a `ground_truth_sql` no longer need hand-copied
+`ground_truth_results`: the statement is executed once against the benchmark
+database and the result set is stored in a compact SQLite cache (zlib-compressed
+JSON), keyed by query id, the SQL text and the database content hash. A change
+to `data/library.db` or to the statement therefore recompiles the expectation
+instead of scoring against stale rows.
+
+Usage:
+    uv run ground_truth.py                 # compile all test case files
+    uv run ground_truth.py --check         # compare embedded results with the compiled ones
+    uv run ground_truth.py --strip         # drop embedded results that can be compiled
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+from config import DB_PATH, QUERIES_PATH, ROOT_DIR, GROUND_TRUTH_CACHE_PATH
+from db_handler import db_fingerprint
+
+
+def _sql_hash(sql: str) -> str:
+    return hashlib.sha256(sql.strip().encode("utf-8")).hexdigest()
+
+
+def unique_headers(headers: list) -> list:
+    """Makes repeated column names unique (name, name_2, ...) so rows can be stored as dicts."""
+    seen = {}
+    result = []
+    for header in headers:
+        seen[header] = seen.get(header, 0) + 1
+        result.append(header if seen[header] == 1 else f"{header}_{seen[header]}")
+    return result
+
+
+class GroundTruthStore:
+    def __init__(self, db_path=DB_PATH, cache_path=GROUND_TRUTH_CACHE_PATH, db_hash: str = None):
+        """Opens the cache; the database is only opened if something needs compiling."""
+        self.db_path = db_path
+        self.db_hash = db_hash or db_fingerprint(db_path)
+        self.compiled = 0
+        self.loaded = 0
+        self._db = None
+
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Several processes (multi_db.py) may compile into the same cache: wait for their locks
+        self.connection = sqlite3.connect(cache_path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS ground_truth ("
+            " query_id TEXT, sql_hash TEXT, db_hash TEXT,"
+            " headers TEXT NOT NULL, rows BLOB NOT NULL,"
+            " PRIMARY KEY (query_id, sql_hash, db_hash))"
+        )
+
+    def _database(self):
+        if self._db is None:
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+            self._db = sqlite3.connect(uri, uri=True)
+        return self._db
+
+    def result_set(self, query_id: str, sql: str):
+        """Returns (headers, rows) for a ground-truth statement, compiling it on a cache miss."""
+        key = (query_id, _sql_hash(sql), self.db_hash)
+        row = self.connection.execute(
+            "SELECT headers, rows FROM ground_truth WHERE query_id = ? AND sql_hash = ? AND db_hash = ?", key
+        ).fetchone()
+        if row:
+            self.loaded += 1
+            return json.loads(row[0]), [tuple(r) for r in json.loads(zlib.decompress(row[1]))]
+
+        cursor = self._database().execute(sql)
+        headers = [description[0] for description in cursor.description or []]
+        rows = [tuple(r) for r in cursor.fetchall()]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO ground_truth (query_id, sql_hash, db_hash, headers, rows) VALUES (?, ?, ?, ?, ?)",
+            (*key, json.dumps(headers), zlib.compress(json.dumps(rows).encode("utf-8"))),
+        )
+        self.connection.commit()
+        self.compiled += 1
+        return headers, rows
+
+    def expected_results(self, case: dict) -> list:
+        """Ground-truth rows of a case as a list of dicts (the `ground_truth_results` format)."""
+        headers, rows = self.result_set(case["id"], case["ground_truth_sql"])
+        headers = unique_headers(headers)
+        return [dict(zip(headers, r)) for r in rows]
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+class TestCase(dict):
+    """
+    A test case whose `ground_truth_results` are materialized from the store on
+    first access. When a case has `ground_truth_sql`, the compiled rows take
+    precedence over any hand-copied ones in the JSON file.
+    """
+
+    def __init__(self, data: dict, store: GroundTruthStore):
+        super().__init__(data)
+        self._store = store
+        self._materialized = "ground_truth_sql" not in data
+
+    def _materialize(self):
+        if not self._materialized:
+            self["ground_truth_results"] = self._store.expected_results(self)
+            self._materialized = True
+
+    def compile_error(self):
+        """Materializes the expected rows now; returns the error of a failing `ground_truth_sql`, or None."""
+        try:
+            self._materialize()
+        except sqlite3.Error as e:
+            return str(e)
+        return None
+
+    def __getitem__(self, key):
+        if key == "ground_truth_results":
+            self._materialize()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == "ground_truth_results":
+            self._materialize()
+        return super().get(key, default)
+
+
+def drop_invalid_cases(cases: list) -> tuple:
+    """
+    Compiles the ground truth of every case and returns (valid cases, {query_id: error}).
+    Cases keep their positional ids ("q_3"), so dropping one does not renumber the others.
+    """
+    valid, errors = [], {}
+    for i, case in enumerate(cases):
+        case.setdefault("id", f"q_{i}")
+        error = case.compile_error() if isinstance(case, TestCase) else None
+        if error:
+            errors[case["id"]] = error
+        else:
+            valid.append(case)
+    return valid, errors
+
+
+def _default_query_files():
+    return sorted((ROOT_DIR / "test_cases").glob("*.json"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile ground_truth_sql into the ground-truth cache.")
+    parser.add_argument("files", nargs="*", help=f"Test case files (default: all in test_cases/, e.g. {QUERIES_PATH.name})")
+    parser.add_argument("--check", action="store_true", help="Report cases whose embedded results differ from the compiled ones.")
+    parser.add_argument("--strip", action="store_true", help="Remove embedded ground_truth_results from cases that have ground_truth_sql.")
+    args = parser.parse_args()
+
+    store = GroundTruthStore()
+    files = args.files or _default_query_files()
+    for path in files:
+        with open(path, "r") as f:
+            cases = json.load(f)
+        print(f"--- {path} ---")
+        for case in cases:
+            if "ground_truth_sql" not in case:
+                print(f"  {case.get('id')}: no ground_truth_sql, skipped")
+                continue
+            try:
+                compiled = store.expected_results(case)
+            except sqlite3.Error as e:
+                print(f"  ❌ {case['id']}: {e}")
+                continue
+            status = f"{len(compiled)} rows"
+            if args.check and "ground_truth_results" in case and case["ground_truth_results"] != compiled:
+                status += f" ⚠️ differs from embedded results ({len(case['ground_truth_results'])} rows)"
+            print(f"  ✅ {case['id']}: {status}")
+        if args.strip:
+            for case in cases:
+                if "ground_truth_sql" in case:
+                    case.pop("ground_truth_results", None)
+            with open(path, "w") as f:
+                json.dump(cases, f, indent=2, ensure_ascii=False)
+            print(f"  Stripped embedded results from {path}")
+
+    print(f"\nCompiled {store.compiled}, loaded {store.loaded} from cache (db hash {store.db_hash[:12]}).")
+    store.close()
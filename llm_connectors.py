@@ -5,10 +5,26 @@ Each function in this module is designed to take a prompt string as input
 and return a generated SQL query string. It centralizes all API-specific logic,
 including client initialization, request formatting, and error handling.
 """
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import openai
 from dotenv import load_dotenv
 
+from config import (
+    PREFLIGHT_TIMEOUT_SECONDS,
+    MODEL_FAILURE_THRESHOLD,
+    CLIENT_FAILURE_THRESHOLD,
+    CIRCUIT_COOLDOWN_SECONDS,
+    SAMPLE_TEMPERATURE,
+    N_SAMPLING_CLIENTS
+)
+from response_cache import make_cache_key
+from tracing import span
+
 load_dotenv()
 
 # --- Configuration ---
@@ -39,28 +55,176 @@ if OPENROUTER_API_KEY:
     )
 
 # The LM Studio client requires no API key.
+# LM_STUDIO_BASE_URL can point it elsewhere, e.g. at mock_llm_server.py.
 clients["LM Studio"] = openai.OpenAI(
-    base_url="http://localhost:1234/v1",
+    base_url=os.getenv("LM_STUDIO_BASE_URL", "http://localhost:1234/v1"),
     api_key="not-needed"
 )
 
-def get_sql_from_ai(prompt: str, sys_prompt: str, model: str, client_name: str) -> str:
-    """
-    Generates a SQL query from any pre-configured OpenAI-compatible client.
+def register_client(client_name: str, base_url: str, api_key: str = "not-needed"):
+    """Adds (or replaces) an OpenAI-compatible client, e.g. a local or mock server."""
+    clients[client_name] = openai.OpenAI(base_url=base_url, api_key=api_key)
+    return clients[client_name]
 
-    Args:
-        prompt (str): The user's natural language question.
-        model (str): The model identifier to use (e.g., 'gpt-4-turbo', 'gemini/gemini-1.5-flash-latest').
-        client_name (str): The key for the client in the `clients` dictionary.
+# --- Response Cache ---
+# Optional ResponseCache instance, installed by the benchmark via set_response_cache().
+response_cache = None
+
+def set_response_cache(cache):
+    """Installs (or removes, with None) the cache consulted by get_sql_with_metrics."""
+    global response_cache
+    response_cache = cache
+
+# --- Preflight ---
+def _served_model_ids(client_name: str, timeout: float) -> set:
+    client = clients[client_name].with_options(timeout=timeout, max_retries=0)
+    # Gemini lists its models as "models/<id>"
+    return {m.id.removeprefix("models/") for m in client.models.list()}
+
+def preflight(client_names, timeout: float = PREFLIGHT_TIMEOUT_SECONDS) -> dict:
+    """
+    Probes the `/models` endpoint of each client concurrently.
 
     Returns:
-        The generated SQL query as a string, or an error message.
+        {client_name: {"reachable", "models", "error", "elapsed"}}. `models` is the set
+        of served model ids, or None if the client answered but could not list them.
     """
-    if client_name not in clients:
-        return f"Error: Client '{client_name}' is not configured or its API key is missing."
+    def probe(client_name):
+        start_time = time.perf_counter()
+        reachable, models, error = True, None, None
+        try:
+            models = _served_model_ids(client_name, timeout)
+        except (openai.APIConnectionError, openai.AuthenticationError, openai.PermissionDeniedError) as e:
+            reachable, error = False, f"{type(e).__name__}: {e}"
+        except Exception as e:
+            # e.g. no /models route: the backend is up, the model ids just cannot be checked
+            error = f"{type(e).__name__}: {e}"
+        return client_name, {"reachable": reachable, "models": models, "error": error,
+                             "elapsed": time.perf_counter() - start_time}
 
-    client = clients[client_name]
-    
+    client_names = [name for name in client_names if name in clients]
+    if not client_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(client_names)) as pool:
+        return dict(pool.map(probe, client_names))
+
+# --- Circuit Breaker ---
+class CircuitBreaker:
+    """
+    Counts consecutive failed requests per model and per client. When a count reaches
+    its threshold the circuit opens and further requests are skipped; after `cooldown`
+    seconds one trial request is let through, and a success closes the circuit again.
+    """
+
+    def __init__(self, model_threshold: int = MODEL_FAILURE_THRESHOLD,
+                 client_threshold: int = CLIENT_FAILURE_THRESHOLD, cooldown: float = CIRCUIT_COOLDOWN_SECONDS):
+        self.model_threshold = model_threshold
+        self.client_threshold = client_threshold
+        self.cooldown = cooldown
+        self.failures = {}
+        self.opened = {}  # key -> time.monotonic() when the circuit opened (or last let a trial through)
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def _keys(self, client_name, model):
+        return (((client_name, None), self.client_threshold), ((client_name, model), self.model_threshold))
+
+    def _blocked(self, key, now) -> bool:
+        opened = self.opened.get(key)
+        return opened is not None and (self.cooldown is None or now - opened < self.cooldown)
+
+    def is_open(self, client_name: str, model: str) -> bool:
+        """True while requests to this model would be skipped (does not start a trial)."""
+        with self._lock:
+            now = time.monotonic()
+            return any(self._blocked(key, now) for key, _ in self._keys(client_name, model))
+
+    def allow(self, client_name: str, model: str) -> bool:
+        """False while the client's or the model's circuit is open; may let a trial request through."""
+        with self._lock:
+            now = time.monotonic()
+            keys = [key for key, _ in self._keys(client_name, model)]
+            if any(self._blocked(key, now) for key in keys):
+                return False
+            for key in keys:
+                if key in self.opened:
+                    self.opened[key] = now  # half-open: this request is the trial
+            return True
+
+    def count_skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record(self, client_name: str, model: str, ok: bool):
+        with self._lock:
+            for key, threshold in self._keys(client_name, model):
+                if ok:
+                    self.failures.pop(key, None)
+                    self.opened.pop(key, None)
+                else:
+                    self.failures[key] = self.failures.get(key, 0) + 1
+                    if self.failures[key] >= threshold:
+                        self.opened[key] = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_circuits = sorted(client if model is None else f"{client}/{model}" for client, model in self.opened)
+            return {"open_circuits": open_circuits, "requests_skipped": self.skipped}
+
+# Optional CircuitBreaker instance, installed by the benchmark via set_circuit_breaker().
+circuit_breaker = None
+
+def set_circuit_breaker(breaker):
+    """Installs (or removes, with None) the breaker consulted by get_sql_with_metrics."""
+    global circuit_breaker
+    circuit_breaker = breaker
+
+def check_circuit(model: str, client_name: str, stream: bool = False):
+    """
+    Returns the (message, metrics) response of a skipped request if the circuit for this
+    model or client is open, otherwise None.
+    """
+    if circuit_breaker is None or not circuit_breaker.is_open(client_name, model):
+        return None
+    return _skipped_response(model, client_name, stream)
+
+def _skipped_response(model: str, client_name: str, stream: bool):
+    circuit_breaker.count_skip()
+    return (f"Error: Skipped model '{model}' on {client_name} after repeated failures (circuit open).",
+            {"streamed": stream, "skipped": True})
+
+def _record_outcome(client_name: str, model: str, ok: bool):
+    if circuit_breaker is not None:
+        circuit_breaker.record(client_name, model, ok)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for backends that report no usage."""
+    return max(1, round(len(text) / 4)) if text else 0
+
+def _clean_sql(sql_query: str) -> str:
+    """Strips potential code block markers."""
+    if sql_query and sql_query.startswith("```sql"):
+        sql_query = sql_query[6:]
+    if sql_query and sql_query.endswith("```"):
+        sql_query = sql_query[:-3]
+    return (sql_query or "").strip()
+
+def _complete_streaming(client, request: dict, start_time: float):
+    """Consumes a streamed completion; returns (text, time to first token, usage or None)."""
+    stream = client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+    parts = []
+    ttft = None
+    usage = None
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            if ttft is None:
+                ttft = time.perf_counter() - start_time
+            parts.append(chunk.choices[0].delta.content)
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage
+    return "".join(parts), ttft, usage
+
+def _build_request(model: str, client_name: str, sys_prompt: str, prompt: str, temperature: float) -> dict:
     # OpenRouter requires special headers
     extra_headers = {}
     if client_name == "OpenRouter":
@@ -69,32 +233,228 @@ def get_sql_from_ai(prompt: str, sys_prompt: str, model: str, client_name: str)
             "X-Title": "LLM SQL Benchmark"
         }
 
-    try:
-        completion = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.0,
-            stream=False,
-            extra_headers=extra_headers,
-            timeout=40,
-        )
-        sql_query = completion.choices[0].message.content
-
-        # Clean up potential code block markers
-        if sql_query and sql_query.startswith("```sql"):
-            sql_query = sql_query[6:]
-        if sql_query and sql_query.endswith("```"):
-            sql_query = sql_query[:-3]
-        return sql_query.strip()
-
-    except openai.APIConnectionError as e:
+    return dict(
+        model=model,
+        messages=[
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=temperature,
+        extra_headers=extra_headers,
+        timeout=40,
+    )
+
+def _complete(client, request: dict, stream: bool, start_time: float):
+    """One completion; returns (text, time to first token or None, usage or None)."""
+    if stream:
+        return _complete_streaming(client, request, start_time)
+    completion = client.chat.completions.create(**request, stream=False)
+    return completion.choices[0].message.content, None, getattr(completion, "usage", None)
+
+def _error_message(e: Exception, client_name: str, model: str) -> str:
+    if isinstance(e, openai.APIConnectionError):
         return f"Error: Could not connect to {client_name}. Is the server/service running? Details: {e}"
-    except openai.AuthenticationError:
+    if isinstance(e, openai.AuthenticationError):
         return f"Error: Authentication failed for {client_name}. Check your API key."
-    except openai.NotFoundError:
+    if isinstance(e, openai.NotFoundError):
         return f"Error: Model '{model}' not found for client {client_name} or you lack access."
+    return f"Error: An unexpected error occurred with {client_name}: {e}"
+
+def get_sql_with_metrics(prompt: str, sys_prompt: str, model: str, client_name: str, stream: bool = False):
+    """
+    Generates a SQL query and reports how the time was spent.
+
+    Args:
+        prompt (str): The user's natural language question.
+        sys_prompt (str): The system prompt (schema, instructions, examples).
+        model (str): The model identifier to use.
+        client_name (str): The key for the client in the `clients` dictionary.
+        stream (bool): Stream the completion to measure time-to-first-token.
+
+    Returns:
+        (sql, metrics): the generated SQL (or an error message) and a dict with
+        ttft, generation_time, prompt_tokens, completion_tokens, tokens_per_second
+        and usage_source ("api", "estimate" or "cache"). Requests skipped by an
+        open circuit have `"skipped": True` in their metrics; failed requests
+        (the text is then an error message, not SQL) have `"error": True`.
+    """
+    metrics = {"streamed": stream}
+    if client_name not in clients:
+        return f"Error: Client '{client_name}' is not configured or its API key is missing.", {**metrics, "error": True}
+
+    client = clients[client_name]
+    temperature = 0.0
+
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(client_name, model, sys_prompt, prompt, temperature)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached, {**metrics, "usage_source": "cache"}
+        if response_cache.mode == "ro":
+            return f"Error: No cached response for model '{model}' on {client_name} (cache is in read-only replay mode).", {**metrics, "error": True}
+
+    if circuit_breaker is not None and not circuit_breaker.allow(client_name, model):
+        return _skipped_response(model, client_name, stream)
+
+    request = _build_request(model, client_name, sys_prompt, prompt, temperature)
+
+    try:
+        with span("llm_request", client=client_name, streamed=stream):
+            start_time = time.perf_counter()
+            content, ttft, usage = _complete(client, request, stream, start_time)
+        generation_time = time.perf_counter() - start_time
+
+        if usage is not None and usage.completion_tokens is not None:
+            prompt_tokens, completion_tokens, usage_source = usage.prompt_tokens, usage.completion_tokens, "api"
+        else:
+            prompt_tokens = estimate_tokens(sys_prompt) + estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(content)
+            usage_source = "estimate"
+
+        # Throughput over the decoding phase when the first token time is known
+        decode_time = generation_time - ttft if ttft is not None else generation_time
+        metrics.update({
+            "ttft": ttft,
+            "generation_time": generation_time,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": completion_tokens / decode_time if decode_time > 0 else None,
+            "usage_source": usage_source,
+        })
+
+        _record_outcome(client_name, model, True)
+        sql_query = _clean_sql(content)
+        if cache_key is not None:
+            response_cache.put(cache_key, sql_query, client_name=client_name, model=model)
+        return sql_query, metrics
+
     except Exception as e:
-        return f"Error: An unexpected error occurred with {client_name}: {e}"
\ No newline at end of file
+        _record_outcome(client_name, model, False)
+        return _error_message(e, client_name, model), {**metrics, "error": True}
+
+# --- Self-Consistency Sampling ---
+# Clients that rejected `n=` during this process; their samples are requested one by one
+_n_unsupported = set()
+
+def _sample_parallel(client, request: dict, count: int, stream: bool, start_time: float) -> list:
+    """`count` independent completions in parallel; returns [(text, ttft, usage)] of those that succeeded."""
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(_complete, client, request, stream, start_time) for _ in range(count)]
+    outcomes, errors = [], []
+    for future in futures:
+        if future.exception() is None:
+            outcomes.append(future.result())
+        else:
+            errors.append(future.exception())
+    if not outcomes and errors:
+        raise errors[0]
+    return outcomes
+
+def get_sql_samples(prompt: str, sys_prompt: str, model: str, client_name: str, samples: int,
+                    temperature: float = SAMPLE_TEMPERATURE, stream: bool = False):
+    """
+    Draws `samples` completions at `temperature` for self-consistency decoding.
+
+    Clients in N_SAMPLING_CLIENTS get a single request with `n=samples` (not
+    streamed); missing choices, other clients and streamed runs use concurrent
+    single requests.
+
+    Returns:
+        (candidates, metrics): the list of generated SQL strings (a single error
+        message if every request failed) and a dict with the same keys as
+        get_sql_with_metrics, summed over all samples, plus samples_received and
+        sampling ("n", "parallel" or "n+parallel"). Failures are flagged with
+        `"error": True`, as in get_sql_with_metrics.
+    """
+    metrics = {"streamed": stream}
+    if client_name not in clients:
+        return [f"Error: Client '{client_name}' is not configured or its API key is missing."], {**metrics, "error": True}
+
+    client = clients[client_name]
+
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(client_name, model, sys_prompt, prompt, temperature, samples)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            candidates = json.loads(cached)
+            return candidates, {**metrics, "usage_source": "cache", "samples_received": len(candidates)}
+        if response_cache.mode == "ro":
+            return [f"Error: No cached response for model '{model}' on {client_name} (cache is in read-only replay mode)."], {**metrics, "error": True}
+
+    if circuit_breaker is not None and not circuit_breaker.allow(client_name, model):
+        message, metrics = _skipped_response(model, client_name, stream)
+        return [message], metrics
+
+    request = _build_request(model, client_name, sys_prompt, prompt, temperature)
+
+    try:
+        with span("llm_request", client=client_name, streamed=stream, samples=samples):
+            start_time = time.perf_counter()
+            # (usage, texts, ttft) per API request
+            responses, modes = [], []
+            if not stream and client_name in N_SAMPLING_CLIENTS and client_name not in _n_unsupported:
+                try:
+                    completion = client.chat.completions.create(**request, n=samples, stream=False)
+                    texts = [choice.message.content for choice in completion.choices[:samples]]
+                    responses.append((getattr(completion, "usage", None), texts, None))
+                    modes.append("n")
+                except openai.BadRequestError:
+                    _n_unsupported.add(client_name)
+            received = sum(len(texts) for _, texts, _ in responses)
+            if received < samples:
+                for text, ttft, usage in _sample_parallel(client, request, samples - received, stream, start_time):
+                    responses.append((usage, [text], ttft))
+                modes.append("parallel")
+        generation_time = time.perf_counter() - start_time
+
+        if all(usage is not None and usage.completion_tokens is not None for usage, _, _ in responses):
+            # Billed per request: an `n=` request pays for its prompt once
+            prompt_tokens = sum(usage.prompt_tokens or 0 for usage, _, _ in responses)
+            completion_tokens = sum(usage.completion_tokens for usage, _, _ in responses)
+            usage_source = "api"
+        else:
+            prompt_tokens = (estimate_tokens(sys_prompt) + estimate_tokens(prompt)) * len(responses)
+            completion_tokens = sum(estimate_tokens(text) for _, texts, _ in responses for text in texts)
+            usage_source = "estimate"
+        outcomes = [text for _, texts, _ in responses for text in texts]
+
+        ttfts = [ttft for _, _, ttft in responses if ttft is not None]
+        ttft = min(ttfts) if ttfts else None
+        decode_time = generation_time - ttft if ttft is not None else generation_time
+        metrics.update({
+            "ttft": ttft,
+            "generation_time": generation_time,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": completion_tokens / decode_time if decode_time > 0 else None,
+            "usage_source": usage_source,
+            "samples_received": len(outcomes),
+            "sampling": "+".join(modes),
+        })
+
+        _record_outcome(client_name, model, True)
+        candidates = [_clean_sql(text) for text in outcomes]
+        if cache_key is not None and len(candidates) == samples:
+            response_cache.put(cache_key, json.dumps(candidates), client_name=client_name, model=model)
+        return candidates, metrics
+
+    except Exception as e:
+        _record_outcome(client_name, model, False)
+        return [_error_message(e, client_name, model)], {**metrics, "error": True}
+
+def get_sql_from_ai(prompt: str, sys_prompt: str, model: str, client_name: str) -> str:
+    """
+    Generates a SQL query from any pre-configured OpenAI-compatible client.
+
+    Args:
+        prompt (str): The user's natural language question.
+        model (str): The model identifier to use (e.g., 'gpt-4-turbo', 'gemini/gemini-1.5-flash-latest').
+        client_name (str): The key for the client in the `clients` dictionary.
+
+    Returns:
+        The generated SQL query as a string, or an error message.
+    """
+    sql_query, _ = get_sql_with_metrics(prompt, sys_prompt, model, client_name)
+    return sql_query
@@ -0,0 +1,268 @@
+"""
+Local OpenAI-compatible stand-in for the LLM backends.
+
+Serves `GET /v1/models` and `POST /v1/chat/completions` (plain, with `n`
+choices, and streamed as server-sent events), so the harness can run end to end without any provider.
+Answers are either one canned statement or the `ground_truth_sql` of the
+matching test case, optionally corrupted at a given rate; latency, per-token
+delay and error rates are configurable.
+
+Latency specs:
+    0                    no delay
+    const:0.2            0.2s for every request
+    uniform:0.1:0.5      uniformly between 0.1s and 0.5s
+    lognormal:0.3:0.5    median 0.3s, sigma 0.5 (long tail, like real backends)
+
+Usage:
+    uv run mock_llm_server.py --port 1234 --latency lognormal:0.3:0.5 --error_rate 0.05
+    LM_STUDIO_BASE_URL=http://127.0.0.1:1234/v1 uv run benchmark.py --group LM-Studio-Local
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import MODEL_REGISTRY, QUERIES_PATH
+
+CANNED_SQL = "SELECT title FROM BOOK;"
+WRONG_SQL = "SELECT 1;"
+
+_QUESTION_PREFIX = "User Question:"
+
+
+def parse_latency(spec: str):
+    """Turns a latency spec into a function `rng -> seconds`."""
+    kind, *params = str(spec).split(":")
+    values = [float(p) for p in params]
+    if kind in ("0", "none") and not values:
+        return lambda rng: 0.0
+    if kind == "const" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Invalid latency spec '{spec}'. Use 0, const:S, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA")
+
+
+def answers_from_cases(cases: list) -> dict:
+    """Maps each test case question to its ground-truth SQL."""
+    return {case["question"]: case["ground_truth_sql"] for case in cases if case.get("ground_truth_sql")}
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, round(len(text) / 4)) if text else 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLLM/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            models = self.server.mock.models
+            return self._send_json(200, {"object": "list", "data": [
+                {"id": model_id, "object": "model", "owned_by": "mock"} for model_id in models]})
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        mock = self.server.mock
+        plan = mock.plan(request)
+        if plan["status"] != 200:
+            time.sleep(plan["latency"])
+            return self._send_json(plan["status"], {"error": {"message": "Injected mock failure", "code": plan["status"]}})
+        if request.get("stream"):
+            return self._stream(request, plan)
+
+        time.sleep(plan["latency"] + plan["token_delay"] * max(len(tokens) for tokens in plan["choices"]))
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{plan['request_id']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": i, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens)}}
+                        for i, tokens in enumerate(plan["choices"])],
+            "usage": plan["usage"],
+        })
+
+    def _stream(self, request: dict, plan: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, usage=None):
+            chunk = {"id": f"chatcmpl-mock-{plan['request_id']}", "object": "chat.completion.chunk",
+                     "created": int(time.time()), "model": request.get("model"), "choices": choices}
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        time.sleep(plan["latency"])
+        for i, token in enumerate(plan["tokens"]):
+            if i:
+                time.sleep(plan["token_delay"])
+            event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], plan["usage"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockLLMServer:
+    """
+    Runs the mock backend in a background thread.
+
+        with MockLLMServer(models=["mock/a"], latency="const:0.05") as server:
+            register_client("Mock", server.base_url)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, models: list = None, latency: str = "0",
+                 token_delay: float = 0.0, error_rate: float = 0.0, error_status: int = 500,
+                 answers: dict = None, wrong_rate: float = 0.0, canned_sql: str = CANNED_SQL, seed: int = 0):
+        """
+        Args:
+            port (int): 0 picks a free port (see `base_url`).
+            models (list): Model ids listed by /v1/models; defaults to every id in MODEL_REGISTRY.
+            latency (str): Delay before the first token, as a latency spec (see module docstring).
+            token_delay (float): Delay between streamed tokens (and per token in plain responses).
+            error_rate (float): Fraction of requests answered with `error_status`.
+            answers (dict): {question: sql}; questions not listed get `canned_sql`.
+            wrong_rate (float): Fraction of answered requests returning a wrong statement.
+        """
+        self.models = models if models is not None else sorted({m["id"] for m in MODEL_REGISTRY})
+        self.latency = parse_latency(latency)
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.answers = answers or {}
+        self.wrong_rate = wrong_rate
+        self.canned_sql = canned_sql
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _answer(self, request: dict) -> str:
+        messages = request.get("messages") or []
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        question = question.strip().removeprefix(_QUESTION_PREFIX).strip()
+        return self.answers.get(question, self.canned_sql)
+
+    def plan(self, request: dict) -> dict:
+        """
+        Draws the outcome of one request: status, latency, answer tokens and usage.
+        Each of the `n` requested choices (streams always get one) is wrong with `wrong_rate`.
+        """
+        n = 1 if request.get("stream") else max(1, int(request.get("n") or 1))
+        with self._lock:
+            self.requests += 1
+            request_id = self.requests
+            failed = self._rng.random() < self.error_rate
+            wrong = [self._rng.random() < self.wrong_rate for _ in range(n)]
+            latency = max(0.0, self.latency(self._rng))
+            if failed:
+                self.errors += 1
+        answer = self._answer(request)
+        choices = []
+        for is_wrong in wrong:
+            tokens = [word + " " for word in (WRONG_SQL if is_wrong else answer).split(" ")]
+            tokens[-1] = tokens[-1].rstrip()
+            choices.append(tokens)
+        prompt_text = "".join(m.get("content", "") for m in request.get("messages") or [])
+        completion_tokens = sum(len(tokens) for tokens in choices)
+        usage = {"prompt_tokens": _estimate_tokens(prompt_text), "completion_tokens": completion_tokens,
+                 "total_tokens": _estimate_tokens(prompt_text) + completion_tokens}
+        return {"request_id": request_id, "status": self.error_status if failed else 200, "latency": latency,
+                "token_delay": self.token_delay, "tokens": choices[0], "choices": choices, "usage": usage}
+
+    def serve_forever(self):
+        """Serves in the calling thread until interrupted."""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock LLM server.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=str, default="0", help="0, const:S, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--token_delay", type=float, default=0.0, help="Seconds between generated tokens.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests that fail.")
+    parser.add_argument("--error_status", type=int, default=500, help="HTTP status of injected failures (e.g. 429).")
+    parser.add_argument("--answers", type=str, default="ground_truth", choices=["ground_truth", "canned"],
+                        help="Answer with the test case's ground_truth_sql, or always with --sql.")
+    parser.add_argument("--queries", type=str, default=str(QUERIES_PATH), help="Test cases used for ground-truth answers.")
+    parser.add_argument("--wrong_rate", type=float, default=0.0, help="Fraction of answers replaced by a wrong statement.")
+    parser.add_argument("--sql", type=str, default=CANNED_SQL, help="Canned answer.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    answers = {}
+    if args.answers == "ground_truth":
+        with open(args.queries, "r") as f:
+            answers = answers_from_cases(json.load(f))
+
+    server = MockLLMServer(args.host, args.port, latency=args.latency, token_delay=args.token_delay,
+                           error_rate=args.error_rate, error_status=args.error_status, answers=answers,
+                           wrong_rate=args.wrong_rate, canned_sql=args.sql, seed=args.seed)
+    print(f"Mock LLM server on {server.base_url} ({len(server.models)} models, {len(answers)} known questions)")
+    server.serve_forever()
@@ -0,0 +1,511 @@
+"""
+Multi-database benchmark mode for Spider/BIRD-style suites.
+
+A manifest lists (database, test cases) pairs; relative paths are resolved
+against the manifest's directory and the test case files use the format of
+test_cases/queries.json:
+
+    {"databases": [
+        {"name": "concert_singer", "db": "database/concert_singer/concert_singer.sqlite",
+         "queries": "queries/concert_singer.json"},
+        ...
+    ]}
+
+Each database's cases are split into chunks of at most `--chunk_size`, which
+are spread over a process pool. Every worker process keeps an LRU pool of at
+most `--max_open` read-only connections (in-memory copies with `--in_memory`)
+together with their prompt builders, so a database is opened once per process
+however many of its chunks the process runs. Schema strings are cached on disk
+by database file hash (SCHEMA_CACHE_PATH), and file hashes by (path, size,
+mtime), so unchanged databases are never re-read or re-hashed. The per-client
+rate limits are shared out between the workers and each worker schedules its
+requests as `benchmark.py --concurrent` does, so the pool as a whole stays
+within CLIENT_RATE_LIMITS and MAX_CONCURRENCY.
+
+Rows carry a `database` field and query ids are prefixed with the database
+name ("concert_singer/q_3"). Rows are saved as each chunk completes, which is
+also the granularity of `--resume`. A chunk that raises is listed under
+`failed_chunks` in the report and the others carry on; `--resume` reruns it.
+`--memo run` memoizes per worker process and database, so chunks of one
+database that land on different workers do not share executions. The report adds per-database scores and a
+per-model macro average over databases to the usual summary.
+
+Usage:
+    uv run multi_db.py --manifest suites/spider_dev.json --group small --workers 4 --in_memory
+    uv run multi_db.py --manifest suites/spider_dev.json --resume spider_dev_zero-shot_20251201T101500000000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from benchmark import (
+    check_backends,
+    get_active_models,
+    make_prompt_for,
+    new_model_stats,
+    record_row,
+    report_ground_truth_errors,
+    report_order_key,
+    run_concurrent,
+    save_and_print_summary
+)
+from config import (
+    MODEL_REGISTRY,
+    FEW_SHOT_EXAMPLES,
+    CLIENT_RATE_LIMITS,
+    DEFAULT_RATE_LIMIT,
+    MAX_CONCURRENCY,
+    RUNS_DIR,
+    SCHEMA_CACHE_PATH,
+    MULTI_DB_WORKERS,
+    MULTI_DB_MAX_OPEN,
+    MULTI_DB_CHUNK_SIZE
+)
+from db_handler import ReadOnlyConnection, db_fingerprint
+from ground_truth import GroundTruthStore, TestCase, drop_invalid_cases
+from llm_connectors import clients, register_client, set_response_cache, CircuitBreaker, set_circuit_breaker
+from response_cache import ResponseCache, CACHE_MODES
+from result_compare import MATCH_MODES
+from result_sink import (ResultSink, new_run_name, resolve_run_path, read_header, iter_rows, completed_pairs,
+                         TRANSIENT_CATEGORIES)
+from sql_memo import ExecutionMemo, MemoizedExecutor, MEMO_MODES
+from warehouse import store_run
+
+
+# ==========================================
+# CACHES
+# ==========================================
+class SchemaCache:
+    """Schema strings keyed by database file hash, and file hashes keyed by (path, size, mtime)."""
+
+    def __init__(self, path=SCHEMA_CACHE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by all worker processes: wait for each other's write locks
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, db_hash TEXT);"
+            "CREATE TABLE IF NOT EXISTS schemas (db_hash TEXT PRIMARY KEY, schema TEXT NOT NULL);"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, db_path) -> str:
+        """db_fingerprint of the file, recomputed only when its size or mtime changed."""
+        path = str(Path(db_path).resolve())
+        stat = os.stat(path)
+        row = self.connection.execute("SELECT db_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                      (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        db_hash = db_fingerprint(path)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, db_hash) VALUES (?, ?, ?, ?)",
+                                    (path, stat.st_size, stat.st_mtime_ns, db_hash))
+        return db_hash
+
+    def schema(self, db_hash: str, read) -> str:
+        """The cached schema string of a database, or `read()` stored on a miss."""
+        row = self.connection.execute("SELECT schema FROM schemas WHERE db_hash = ?", (db_hash,)).fetchone()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        schema = read()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO schemas (db_hash, schema) VALUES (?, ?)", (db_hash, schema))
+        return schema
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+class ConnectionPool:
+    """LRU pool of open ReadOnlyConnections (at most `max_open`), each with its prompt builders."""
+
+    def __init__(self, schema_cache: SchemaCache, max_open: int = MULTI_DB_MAX_OPEN, in_memory: bool = False):
+        self.schema_cache = schema_cache
+        self.max_open = max_open
+        self.in_memory = in_memory
+        self.entries = OrderedDict()
+        self.opened = 0
+        self.reused = 0
+
+    def get(self, db_path, db_hash: str) -> ReadOnlyConnection:
+        """The open connection of a database, opening it (and evicting the least recently used) if needed."""
+        key = (str(db_path), db_hash)
+        db = self.entries.get(key)
+        if db is not None:
+            self.entries.move_to_end(key)
+            self.reused += 1
+            return db
+        while len(self.entries) >= self.max_open:
+            _, evicted = self.entries.popitem(last=False)
+            evicted.__exit__(None, None, None)
+        db = ReadOnlyConnection(db_path, in_memory=self.in_memory).__enter__()
+        db.schema = self.schema_cache.schema(db_hash, db.get_schema)
+        db.prompts = {}
+        self.entries[key] = db
+        self.opened += 1
+        return db
+
+    def close(self):
+        for db in self.entries.values():
+            db.__exit__(None, None, None)
+        self.entries.clear()
+
+
+# ==========================================
+# WORKER PROCESS
+# ==========================================
+# Per-process state, set up by _init_worker
+_worker = {}
+
+
+def share_limits(client_names, workers: int, limits: dict = CLIENT_RATE_LIMITS) -> dict:
+    """Per-process client limits such that `workers` processes together stay within `limits`."""
+    shares = {}
+    for name in client_names:
+        limit = limits.get(name, DEFAULT_RATE_LIMIT)
+        shares[name] = {"concurrency": max(1, limit["concurrency"] // workers), "rate": limit["rate"] / workers,
+                        "burst": max(1, limit["burst"] / workers)}
+    return shares
+
+
+def _init_worker(settings: dict):
+    for name, base_url in settings["endpoints"].items():
+        if name not in clients:
+            register_client(name, base_url)
+    set_circuit_breaker(CircuitBreaker())
+    if settings["cache_mode"] != "off":
+        set_response_cache(ResponseCache(mode=settings["cache_mode"]))
+    schema_cache = SchemaCache()
+    _worker.update(settings=settings, schema_cache=schema_cache, memos={},
+                   pool=ConnectionPool(schema_cache, settings["max_open"], settings["in_memory"]))
+
+
+def run_chunk(chunk: dict) -> dict:
+    """Runs one chunk of one database's cases; returns its rows and the worker's cache counters."""
+    settings, pool, schema_cache = _worker["settings"], _worker["pool"], _worker["schema_cache"]
+    name, db_path = chunk["database"], chunk["db"]
+    start_time = time.perf_counter()
+
+    db_hash = schema_cache.fingerprint(db_path)
+    db = pool.get(db_path, db_hash)
+    prompt_key = (settings["use_system_prompt"], settings["reasoning"], settings["technique"], settings["schema_pruning"])
+    if prompt_key not in db.prompts:
+        db.prompts[prompt_key] = make_prompt_for(db, *prompt_key)
+    prompt_for = db.prompts[prompt_key]
+
+    store = GroundTruthStore(db_path, db_hash=db_hash)
+    cases, ground_truth_errors = drop_invalid_cases([TestCase(case, store) for case in chunk["cases"]])
+    llms = get_active_models(settings["group"], settings["registry"], clients, stream=settings["stream"])
+    # One memo per (worker, database): "run" mode spans every chunk of the database this worker runs
+    memo = None
+    if settings["memo_mode"] != "off":
+        if db_hash not in _worker["memos"]:
+            _worker["memos"][db_hash] = ExecutionMemo(settings["memo_mode"],
+                                                      db_hash=db_hash if settings["memo_mode"] == "persistent" else None)
+        memo = _worker["memos"][db_hash]
+    executor = MemoizedExecutor(db, memo) if memo else db
+
+    rows = []
+
+    def emit(row):
+        rows.append({**row, "database": name})
+
+    done = {tuple(pair) for pair in chunk["done"]}
+    output = contextlib.nullcontext() if settings["verbose"] else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            run_concurrent(executor, cases, llms, prompt_for, emit, done, settings["max_concurrency"], memo,
+                           settings["match_mode"], None, settings["samples"], limits=settings["limits"])
+    finally:
+        store.close()
+    return {"database": name, "index": chunk["index"], "rows": rows, "ground_truth_errors": ground_truth_errors,
+            "pid": os.getpid(),
+            "seconds": time.perf_counter() - start_time,
+            "cache": {"connections_opened": pool.opened, "connections_reused": pool.reused,
+                      "schema_hits": schema_cache.hits, "schema_misses": schema_cache.misses}}
+
+
+# ==========================================
+# MANIFEST & PLANNING
+# ==========================================
+def load_manifest(path) -> list:
+    """Returns [{"name", "db", "queries"}] with absolute paths; names default to the database file stem."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    entries = manifest["databases"] if isinstance(manifest, dict) else manifest
+    databases, names = [], set()
+    for entry in entries:
+        db_path = (path.parent / entry["db"]).resolve()
+        queries_path = (path.parent / entry["queries"]).resolve()
+        name = entry.get("name") or db_path.stem
+        if name in names:
+            raise ValueError(f"Duplicate database name '{name}' in {path}")
+        if not db_path.exists():
+            raise FileNotFoundError(f"Database '{db_path}' of '{name}' not found")
+        names.add(name)
+        databases.append({"name": name, "db": str(db_path), "queries": str(queries_path)})
+    return databases
+
+
+def load_suite(databases: list) -> list:
+    """All test cases of the suite, with query ids prefixed by their database name."""
+    cases = []
+    for database in databases:
+        with open(database["queries"], "r", encoding="utf-8") as f:
+            for i, case in enumerate(json.load(f)):
+                cases.append({**case, "id": f"{database['name']}/{case.get('id', f'q_{i}')}",
+                              "_database": database["name"]})
+    return cases
+
+
+def plan_chunks(databases: list, cases: list, model_names: list, done: set, chunk_size: int) -> list:
+    """Splits each database's pending cases into chunks (in manifest order)."""
+    by_database = {}
+    for case in cases:
+        if not all((case["id"], name) in done for name in model_names):
+            by_database.setdefault(case["_database"], []).append(case)
+    chunks = []
+    for database in databases:
+        pending = by_database.get(database["name"], [])
+        for start in range(0, len(pending), chunk_size):
+            chunk_cases = [{k: v for k, v in case.items() if k != "_database"}
+                           for case in pending[start:start + chunk_size]]
+            chunk_done = [(case["id"], name) for case in chunk_cases for name in model_names
+                          if (case["id"], name) in done]
+            chunks.append({"index": len(chunks), "database": database["name"], "db": database["db"],
+                           "cases": chunk_cases, "done": chunk_done})
+    return chunks
+
+
+def database_performance(rows, databases: list, model_names: list) -> dict:
+    """Per-database accuracy (overall and per model) and the per-model macro average over databases."""
+    totals = {}
+    for row in rows:
+        if row.get("error_category") in TRANSIENT_CATEGORIES:
+            continue
+        per_model = totals.setdefault(row.get("database"), {})
+        score = per_model.setdefault(row["model"], [0, 0.0])
+        score[0] += 1
+        score[1] += row["match_percentage"]
+
+    per_database = []
+    for database in databases:
+        per_model = totals.get(database["name"], {})
+        runs = sum(n for n, _ in per_model.values())
+        per_database.append({
+            "database": database["name"],
+            "rows": runs,
+            "average_accuracy": round(sum(s for _, s in per_model.values()) / runs, 2) if runs else None,
+            "models": {model: round(s / n, 2) for model, (n, s) in per_model.items()},
+        })
+    macro = {}
+    for model in model_names:
+        scores = [db["models"][model] for db in per_database if model in db["models"]]
+        macro[model] = round(sum(scores) / len(scores), 2) if scores else None
+    return {"per_database": per_database, "macro_accuracy": macro}
+
+
+# ==========================================
+# MAIN EXECUTION
+# ==========================================
+def main(manifest, group_name: str = "all", use_system_prompt: bool = True, prompt_technique: str = "zero-shot",
+         reasoning: bool = True, workers: int = MULTI_DB_WORKERS, max_open: int = MULTI_DB_MAX_OPEN,
+         in_memory: bool = False, chunk_size: int = MULTI_DB_CHUNK_SIZE,
+         max_concurrency: int = MAX_CONCURRENCY, memo_mode: str = "run", match_mode: str = "named",
+         stream: bool = False, schema_pruning: bool = False, samples: int = 1, cache_mode: str = "off",
+         skip_preflight: bool = False, resume: str = None, verbose: bool = False, registry: list = None,
+         warehouse: bool = True):
+    """Runs a manifest of (database, test cases) pairs and returns the report summary (None if nothing ran)."""
+    databases = load_manifest(manifest)
+    suite = Path(manifest).stem
+
+    if resume:
+        run_path = resolve_run_path(resume)
+        if not run_path.exists():
+            print(f"Error: Run file '{run_path}' not found.")
+            return
+        header = read_header(run_path)
+        group_name = header.get("model_group", group_name)
+        prompt_technique = header.get("prompt_technique", prompt_technique)
+        use_system_prompt = header.get("system_prompt_used", use_system_prompt)
+        reasoning = header.get("reasoning", reasoning)
+        match_mode = header.get("match_mode", match_mode)
+        stream = header.get("stream", stream)
+        schema_pruning = header.get("schema_pruning", schema_pruning)
+        samples = header.get("samples", samples)
+        in_memory = header.get("in_memory", in_memory)
+        done = completed_pairs(run_path)
+        print(f"\n--- Resuming run '{run_path.stem}' ({len(done)} rows already done) ---")
+    else:
+        run_path = RUNS_DIR / f"{new_run_name(suite, prompt_technique)}.jsonl"
+        done = set()
+
+    print(f"\n--- Multi-database run of '{suite}': {len(databases)} databases, group '{group_name.upper()}' ---")
+    llms = get_active_models(group_name, registry or MODEL_REGISTRY, clients, stream=stream)
+    if not llms:
+        print(f"Error: No available models found for group '{group_name}'.")
+        return
+    preflight_report = None
+    if not skip_preflight:
+        llms, preflight_report = check_backends(llms)
+        if not llms:
+            print(f"Error: No model of group '{group_name}' is served by a reachable backend.")
+            return
+    model_names = list(llms)
+    client_names = {func.keywords["client_name"] for func in llms.values()}
+
+    cases = load_suite(databases)
+    chunks = plan_chunks(databases, cases, model_names, done, chunk_size)
+    workers = max(1, min(workers, len(chunks) or 1))
+    settings = {
+        "group": group_name, "registry": [m for m in (registry or MODEL_REGISTRY) if m["name"] in llms],
+        "use_system_prompt": use_system_prompt, "reasoning": reasoning, "technique": prompt_technique,
+        "schema_pruning": schema_pruning, "stream": stream, "samples": samples, "match_mode": match_mode,
+        "memo_mode": memo_mode, "cache_mode": cache_mode, "max_concurrency": max(1, max_concurrency // workers),
+        "limits": share_limits(client_names, workers),
+        # Clients registered at runtime (local or mock servers) are re-registered in spawned workers
+        "endpoints": {name: str(clients[name].base_url) for name in client_names if hasattr(clients[name], "base_url")},
+        "max_open": max_open, "in_memory": in_memory, "verbose": verbose,
+    }
+    header = {
+        "manifest": str(Path(manifest).resolve()),
+        "model_group": group_name,
+        "prompt_technique": prompt_technique,
+        "system_prompt_used": use_system_prompt,
+        "reasoning": reasoning,
+        "match_mode": match_mode,
+        "stream": stream,
+        "schema_pruning": schema_pruning,
+        "samples": samples,
+        "in_memory": in_memory,
+        "databases": len(databases),
+        "started_utc": datetime.utcnow().isoformat(),
+    }
+    print(f"{len(cases)} test cases across {len(databases)} databases, {len(model_names)} models: "
+          f"{len(chunks)} chunks on {workers} worker processes.")
+    print(f"Streaming results to: {run_path}\n")
+
+    start_time = time.perf_counter()
+    interrupted = False
+    worker_cache = {}
+    ground_truth_errors = {}
+    failed_chunks = []
+    with ResultSink(run_path, header, resume=bool(resume)) as sink:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,))
+        try:
+            futures = {pool.submit(run_chunk, chunk): chunk for chunk in chunks}
+            for finished, future in enumerate(as_completed(futures), start=1):
+                chunk = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # One failing database or chunk must not cost the others their rows
+                    failed_chunks.append({"index": chunk["index"], "database": chunk["database"],
+                                          "cases": len(chunk["cases"]), "error": f"{type(e).__name__}: {e}"})
+                    print(f"  ❌ [{finished}/{len(chunks)}] {chunk['database']}: chunk failed ({type(e).__name__}: {e})")
+                    continue
+                for row in result["rows"]:
+                    sink.write(row)
+                worker_cache[result["pid"]] = result["cache"]
+                report_ground_truth_errors(result["ground_truth_errors"])
+                ground_truth_errors.update(result["ground_truth_errors"])
+                scored = [row["match_percentage"] for row in result["rows"] if row.get("error_category") not in TRANSIENT_CATEGORIES]
+                accuracy = f"{sum(scored) / len(scored):.1f}%" if scored else "-"
+                print(f"  ✅ [{finished}/{len(chunks)}] {result['database']}: {len(result['rows'])} rows, "
+                      f"avg {accuracy} ({result['seconds']:.1f}s)")
+        except KeyboardInterrupt:
+            interrupted = True
+        finally:
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+    run_seconds = time.perf_counter() - start_time
+
+    if interrupted:
+        print(f"\nInterrupted. Completed chunks are saved; continue with: --resume {run_path.stem}")
+        return
+
+    model_stats = {name: new_model_stats() for name in model_names}
+    for row in iter_rows(run_path):
+        record_row(row, model_stats)
+    per_database = database_performance(iter_rows(run_path), databases, model_names)
+
+    cache_totals = {}
+    for counters in worker_cache.values():
+        for key, value in counters.items():
+            cache_totals[key] = cache_totals.get(key, 0) + value
+    extra_metadata = {"run_name": run_path.stem, "manifest": header["manifest"], "databases": len(databases),
+                      "workers": workers, "in_memory": in_memory, "phase_seconds": {"run": run_seconds},
+                      "worker_caches": cache_totals, "ground_truth_errors": ground_truth_errors,
+                      "failed_chunks": failed_chunks}
+    if preflight_report:
+        extra_metadata["preflight"] = preflight_report
+
+    order_cases = [{"id": case["id"]} for case in cases]
+    report_rows = iter_rows(run_path, order_key=report_order_key(order_cases, llms))
+    summary = save_and_print_summary(report_rows, model_stats, group_name, prompt_technique, use_system_prompt,
+                                     len(cases), extra_metadata=extra_metadata,
+                                     extra_sections={"database_performance": per_database})
+
+    print(f"\n{'Database':<30} | {'Rows':>6} | {'Avg Accuracy':>12} | Best model")
+    print("-" * 80)
+    for db in per_database["per_database"]:
+        best = max(db["models"].items(), key=lambda item: item[1], default=("-", None))
+        accuracy = f"{db['average_accuracy']:.2f}%" if db["average_accuracy"] is not None else "-"
+        print(f"{db['database']:<30} | {db['rows']:>6} | {accuracy:>12} | {best[0]}")
+    print("\nMacro accuracy (mean over databases): " + ", ".join(
+        f"{model} {score:.2f}%" for model, score in per_database["macro_accuracy"].items() if score is not None))
+    print(f"Worker caches: {cache_totals.get('connections_opened', 0)} connections opened, "
+          f"{cache_totals.get('connections_reused', 0)} reused; schema cache {cache_totals.get('schema_hits', 0)} hits, "
+          f"{cache_totals.get('schema_misses', 0)} misses")
+
+    if failed_chunks:
+        print(f"\n⚠️ {len(failed_chunks)} of {len(chunks)} chunks failed; "
+              f"run them again with: --resume {run_path.stem}")
+
+    if warehouse:
+        store_run(summary, iter_rows(run_path), config=header)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark a manifest of (database, test cases) pairs.")
+    parser.add_argument("--manifest", type=str, required=True, help="JSON manifest of {name, db, queries} entries.")
+    parser.add_argument("--group", type=str, default="all")
+    parser.add_argument("--system_prompt", action="store_true", default=True)
+    parser.add_argument("--prompt_technique", type=str, default="zero-shot", choices=FEW_SHOT_EXAMPLES.keys() | {"zero-shot"})
+    parser.add_argument("--reasoning", action="store_true", default=True)
+    parser.add_argument("--workers", type=int, default=MULTI_DB_WORKERS, help="Worker processes.")
+    parser.add_argument("--max_open", type=int, default=MULTI_DB_MAX_OPEN, help="Open database connections kept per worker (LRU).")
+    parser.add_argument("--in_memory", action="store_true", help="Copy each opened database into memory (sqlite3 backup).")
+    parser.add_argument("--chunk_size", type=int, default=MULTI_DB_CHUNK_SIZE, help="Test cases per unit of work.")
+    parser.add_argument("--max_concurrency", type=int, default=MAX_CONCURRENCY, help="Global cap on in-flight requests, across all workers.")
+    parser.add_argument("--cache", type=str, default="off", choices=CACHE_MODES)
+    parser.add_argument("--memo", type=str, default="run", choices=MEMO_MODES)
+    parser.add_argument("--match_mode", type=str, default="named", choices=MATCH_MODES)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--schema_pruning", action="store_true")
+    parser.add_argument("--samples", type=int, default=1, metavar="K")
+    parser.add_argument("--skip_preflight", action="store_true")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN")
+    parser.add_argument("--verbose", action="store_true", help="Show the per-row output of the workers.")
+    parser.add_argument("--no_warehouse", action="store_true")
+    args = parser.parse_args()
+
+    main(args.manifest, args.group, args.system_prompt, args.prompt_technique, args.reasoning, workers=args.workers,
+         max_open=args.max_open, in_memory=args.in_memory, chunk_size=args.chunk_size,
+         max_concurrency=args.max_concurrency, memo_mode=args.memo, match_mode=args.match_mode, stream=args.stream,
+         schema_pruning=args.schema_pruning, samples=args.samples, cache_mode=args.cache,
+         skip_preflight=args.skip_preflight, resume=args.resume, verbose=args.verbose, warehouse=not args.no_warehouse)
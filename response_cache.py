@@ -0,0 +1,113 @@
+"""
+Persistent, content-addressed cache for LLM responses.
+
+Responses are stored in a small SQLite file keyed by a hash of everything that
+determines the completion: client, model id, system prompt, user prompt,
+temperature and, for self-consistency runs, the number of samples. Re-running the benchmark after a scoring or ground-truth fix can
+then replay the stored SQL instead of calling the APIs again.
+
+Modes:
+    off: the cache is not used.
+    rw:  read cached responses, store new ones.
+    ro:  replay only; a miss is reported as an error and no API call is made.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from config import CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_MAX_AGE_DAYS
+
+CACHE_MODES = ("off", "rw", "ro")
+
+
+def make_cache_key(client_name: str, model: str, sys_prompt: str, prompt: str, temperature: float,
+                   samples: int = 1) -> str:
+    """Returns a stable SHA-256 key for one completion request (or one set of `samples` completions)."""
+    fields = [client_name, model, sys_prompt, prompt, temperature]
+    if samples != 1:
+        # Single-completion keys stay unchanged
+        fields.append(samples)
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, mode: str = "rw",
+                 max_entries: int = CACHE_MAX_ENTRIES, max_age_days: float = CACHE_MAX_AGE_DAYS):
+        """Opens (or creates) the cache file and applies eviction."""
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid cache mode '{mode}'. Choices: {', '.join(CACHE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the worker threads of the concurrent mode, guarded by _lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " client TEXT, model TEXT, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.commit()
+        if mode == "rw":
+            self.evict()
+
+    def get(self, key: str):
+        """Returns the cached response for `key`, or None on a miss."""
+        with self._lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "rw":
+                self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.connection.commit()
+            return row[0]
+
+    def put(self, key: str, response: str, client_name: str = None, model: str = None):
+        """Stores a response (no-op in read-only mode)."""
+        if self.mode != "rw":
+            return
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, client, model, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, client_name, model, response, now, now),
+            )
+            self.connection.commit()
+
+    def evict(self):
+        """Drops entries older than max_age_days, then the least recently used beyond max_entries."""
+        with self._lock:
+            cutoff = time.time() - self.max_age_days * 86400
+            self.connection.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            self.connection.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
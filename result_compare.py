@@ -0,0 +1,218 @@
+"""
+Result-set comparison engine.
+
+Each row is normalized and hashed exactly once; both sides are then compared
+as multisets of row hashes, so duplicate rows count and no per-row dicts or
+sorted tuples are built. Actual rows are consumed from any iterable, e.g. a
+cursor drained with `fetchmany` (see benchmarks/compare_bench.py). The
+benchmark's executors still return materialized rows, because the execution
+memo and self-consistency voting reuse them; `--sandbox` caps them at
+SQL_MAX_ROWS.
+
+Match modes:
+    named:      columns are matched by (case-insensitive) header name,
+                independently of their order. Default; same as the old scoring.
+    positional: headers are ignored; values are compared column by column.
+    unordered:  headers and column order are ignored; each row is compared
+                as a multiset of values.
+
+Metrics:
+    match_percentage: recall (matched rows / expected rows) * 100
+    precision:        matched rows / returned rows * 100
+    exact_match:      both multisets are identical and, when the ground truth
+                      has an ORDER BY, also in the right order (= ordered_match)
+    ordered_match:    same rows in the same order. When every ORDER BY term of
+                      the ground truth is a returned column, only the sequence of
+                      those sort keys is checked, so rows tied on the keys may
+                      come in any order.
+"""
+import re
+from collections import Counter
+
+from ground_truth import unique_headers
+
+MATCH_MODES = ("named", "positional", "unordered")
+
+_ORDER_BY_RE = re.compile(r"\border\s+by\b", re.IGNORECASE)
+# A plain sort term: optionally qualified (T1.col) or quoted column, with ASC/DESC and NULLS FIRST/LAST
+_ORDER_TERM_RE = re.compile(
+    r"(?:\w+\.)?[\"`\[]?(\w+)[\"`\]]?(?:\s+(?:asc|desc))?(?:\s+nulls\s+(?:first|last))?", re.IGNORECASE)
+_ORDER_END_RE = re.compile(r"\b(?:limit|offset)\b|;", re.IGNORECASE)
+
+
+def requires_order(sql: str) -> bool:
+    """True if a (ground-truth) statement specifies an ORDER BY."""
+    return bool(sql and _ORDER_BY_RE.search(sql))
+
+
+def order_keys(sql: str):
+    """
+    The sort keys of a (ground-truth) statement's final ORDER BY: None without
+    one, the lowercased column names if every term is a plain column, else ().
+    """
+    matches = list(_ORDER_BY_RE.finditer(sql or ""))
+    if not matches:
+        return None
+    clause = sql[matches[-1].end():]
+    end = _ORDER_END_RE.search(clause)
+    terms = [term.strip() for term in (clause[:end.start()] if end else clause).split(",")]
+    keys = []
+    for term in terms:
+        match = _ORDER_TERM_RE.fullmatch(term)
+        if not match:
+            return ()
+        keys.append(match.group(1).lower())
+    return tuple(keys)
+
+
+def _normalize(value) -> str:
+    return str(value).strip()
+
+
+def _row_hasher(headers: list, mode: str, reference_headers: list = None):
+    """
+    Returns a function mapping a row (sequence of values) to a hash.
+
+    In named mode the columns are permuted into `reference_headers` order; if
+    the header sets differ, None is returned (no row can match).
+    """
+    if mode == "named":
+        names = [h.lower() for h in unique_headers(headers)]
+        reference = reference_headers if reference_headers is not None else sorted(names)
+        if sorted(names) != sorted(reference):
+            return None
+        position = {name: i for i, name in enumerate(names)}
+        permutation = [position[name] for name in reference]
+        return lambda row: hash(tuple(_normalize(row[i]) for i in permutation))
+    if mode == "positional":
+        return lambda row: hash(tuple(_normalize(v) for v in row))
+    if mode == "unordered":
+        return lambda row: hash(tuple(sorted(_normalize(v) for v in row)))
+    raise ValueError(f"Invalid match mode '{mode}'. Choices: {', '.join(MATCH_MODES)}")
+
+
+def _key_hasher(positions: list):
+    return lambda row: hash(tuple(_normalize(row[i]) for i in positions))
+
+
+class ExpectedResult:
+    """An expected result set, hashed once and reused for every model's answer."""
+
+    def __init__(self, headers: list, rows: list, mode: str = "named", order_by=None):
+        """`order_by`: the ground truth's order_keys(); None when the row order does not matter."""
+        self.mode = mode
+        self.headers = sorted(h.lower() for h in unique_headers(headers))
+        self.width = len(headers)
+        hasher = _row_hasher(headers, mode)
+        self.sequence = [hasher(row) for row in rows]
+        self.counts = Counter(self.sequence)
+        self.total = len(self.sequence)
+
+        self.order_required = order_by is not None
+        # Sort-key columns, when the order can be checked on them alone (ties in any order)
+        self.key_columns = None
+        self.key_sequence = None
+        names = [h.lower() for h in unique_headers(headers)]
+        if order_by and mode != "unordered" and all(key in names for key in order_by):
+            self.key_columns = list(order_by)
+            self.key_positions = [names.index(key) for key in order_by]
+            key_hasher = _key_hasher(self.key_positions)
+            self.key_sequence = [key_hasher(row) for row in rows]
+
+    @classmethod
+    def from_dicts(cls, expected_dicts: list, mode: str = "named", order_by=None) -> "ExpectedResult":
+        """Builds the expectation from the `ground_truth_results` format (list of dicts)."""
+        headers = list(expected_dicts[0].keys()) if expected_dicts else []
+        rows = [[d.get(h) for h in headers] for d in expected_dicts]
+        return cls(headers, rows, mode, order_by)
+
+    def key_hasher(self, actual_headers: list):
+        """Hashes an actual row's sort keys; None if the order must be checked on whole rows."""
+        if self.key_columns is None:
+            return None
+        if self.mode == "positional":
+            return _key_hasher(self.key_positions)
+        names = [h.lower() for h in unique_headers(actual_headers)]
+        if not all(key in names for key in self.key_columns):
+            return None
+        return _key_hasher([names.index(key) for key in self.key_columns])
+
+
+# Prepared expectations, keyed by the identity of the expected list (kept alive by the entry)
+_prepared = {}
+_PREPARED_MAX = 512
+
+
+def prepare_expected(expected_dicts: list, mode: str = "named", order_by=None) -> ExpectedResult:
+    """Returns the hashed expectation for a `ground_truth_results` list, building it once."""
+    key = (id(expected_dicts), mode, order_by)
+    entry = _prepared.get(key)
+    if entry is None or entry[0] is not expected_dicts:
+        if len(_prepared) >= _PREPARED_MAX:
+            _prepared.clear()
+        entry = (expected_dicts, ExpectedResult.from_dicts(expected_dicts, mode, order_by))
+        _prepared[key] = entry
+    return entry[1]
+
+
+def compare(expected: ExpectedResult, actual_rows, actual_headers: list) -> dict:
+    """
+    Compares an iterable of actual rows against a prepared expectation.
+
+    Returns a dict with match_percentage, rows_matched, rows_expected,
+    rows_returned, precision, exact_match and ordered_match.
+    """
+    total = expected.total
+    if actual_rows is None:
+        # The statement failed: no credit, even when nothing is expected
+        return {**_metrics(0, total, 0, False, False), "match_percentage": 0.0, "precision": 0.0,
+                "exact_match": False, "ordered_match": False}
+
+    hasher = None
+    if len(actual_headers) == expected.width or expected.mode == "named":
+        hasher = _row_hasher(actual_headers, expected.mode, expected.headers)
+    key_hasher = expected.key_hasher(actual_headers) if hasher is not None else None
+
+    actual_counts = Counter()
+    returned = 0
+    in_order = True
+    for row in actual_rows:
+        if hasher is None or len(row) != len(actual_headers):
+            returned += 1
+            in_order = False
+            continue
+        h = hasher(row)
+        if in_order:
+            if returned >= total:
+                in_order = False
+            elif key_hasher is not None:
+                in_order = expected.key_sequence[returned] == key_hasher(row)
+            else:
+                in_order = expected.sequence[returned] == h
+        actual_counts[h] += 1
+        returned += 1
+
+    matched = sum(min(count, actual_counts[h]) for h, count in expected.counts.items())
+    exact = matched == total == returned
+    ordered = exact and in_order
+    if expected.order_required:
+        exact = ordered
+    return _metrics(matched, total, returned, exact, ordered)
+
+
+def _metrics(matched, total, returned, exact, ordered) -> dict:
+    if total == 0:
+        # Expecting nothing: only an empty answer is correct
+        recall = 100.0 if returned == 0 else 0.0
+        exact = ordered = returned == 0
+    else:
+        recall = matched / total * 100.0
+    return {
+        "match_percentage": recall,
+        "rows_matched": matched,
+        "rows_expected": total,
+        "rows_returned": returned,
+        "precision": (matched / returned * 100.0) if returned else (100.0 if total == 0 else 0.0),
+        "exact_match": exact,
+        "ordered_match": ordered,
+    }
@@ -0,0 +1,140 @@
+"""
+Streaming, crash-safe storage for benchmark result rows.
+
+Each run appends its rows to `results/runs/<run_name>.jsonl` as soon as they
+are scored: one JSON object per line, flushed and fsynced, preceded by a
+header line describing the run. A crash or Ctrl-C therefore loses at most the
+row in flight, and `--resume <run_name>` can pick the run up where it stopped,
+retrying the pairs that were skipped while a backend was down.
+"""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from config import RUNS_DIR
+from tracing import span
+
+HEADER_KEY = "run_header"
+# Error categories of rows that say nothing about the model's SQL: the request failed
+# or was never sent (circuit open). --resume retries them, the run store never stores
+# them, and neither the accuracy averages nor --adaptive count them.
+GENERATION_ERROR = "generation_error"
+SKIPPED = "skipped"
+TRANSIENT_CATEGORIES = (GENERATION_ERROR, SKIPPED)
+
+
+def new_run_name(group: str, technique: str) -> str:
+    """Unique, sortable run name, e.g. 'small_2-shots_20251120T101500123456' (microsecond timestamp)."""
+    return f"{group}_{technique}_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}"
+
+
+def resolve_run_path(run) -> Path:
+    """Accepts a run name or a path to a run's .jsonl file."""
+    path = Path(run)
+    if path.suffix == ".jsonl" and path.exists():
+        return path
+    return RUNS_DIR / f"{path.name.removesuffix('.jsonl')}.jsonl"
+
+
+class ResultSink:
+    def __init__(self, path: Path, header: dict = None, resume: bool = False):
+        """
+        Creates the run file and writes the header. With `resume`, opens an
+        existing run file for appending instead. A new run never appends to an
+        existing file: opening it raises FileExistsError.
+        """
+        self.path = path
+        self.rows_written = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not resume or not path.exists() or path.stat().st_size == 0
+        self.file = open(path, "a" if resume else "x", encoding="utf-8")
+        if is_new:
+            self._write_line({HEADER_KEY: header or {}})
+
+    def _write_line(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def write(self, row: dict):
+        """Appends one result row and makes it durable before returning."""
+        with span("result_write"):
+            self._write_line(row)
+        self.rows_written += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _iter_records(path: Path):
+    """Yields (offset, record) for every readable line. A torn last line is skipped."""
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                yield offset, json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def read_header(path: Path) -> dict:
+    """Returns the run header (the metadata the run was started with)."""
+    for _, record in _iter_records(path):
+        if HEADER_KEY in record:
+            return record[HEADER_KEY]
+    return {}
+
+
+def iter_rows(path: Path, order_key=None):
+    """
+    Yields the result rows of a run file without loading them all at once.
+
+    A resumed run may have recorded a (query_id, model) pair more than once
+    (a skipped row, then its retry); only the last row of each pair is yielded.
+    Rows come in file order, or sorted by `order_key(row)` if it is given. Only
+    (key, file offset) pairs are kept in memory and rows are re-read by seeking.
+    """
+    latest = {}
+    for offset, record in _iter_records(path):
+        if HEADER_KEY not in record:
+            key = (record["query_id"], record["model"])
+            latest[key] = (order_key(record) if order_key else None, offset)
+    index = list(latest.values())
+    index.sort(key=lambda item: item[0] if order_key else item[1])
+    with open(path, "rb") as f:
+        for _, offset in index:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+
+def completed_pairs(path: Path) -> set:
+    """
+    Returns the (query_id, model) pairs already answered in a run file. Pairs
+    whose request failed or was skipped (TRANSIENT_CATEGORIES) are not done:
+    --resume retries them.
+    """
+    return {(row["query_id"], row["model"]) for row in iter_rows(path)
+            if row.get("error_category") not in TRANSIENT_CATEGORIES}
+
+
+def write_report_json(filepath: Path, summary: dict, rows):
+    """Writes {"summary": ..., "detailed_report": [...]} streaming the rows one by one."""
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write('{\n  "summary": ')
+        f.write(json.dumps(summary, indent=2).replace("\n", "\n  "))
+        f.write(',\n  "detailed_report": [')
+        for i, row in enumerate(rows):
+            f.write(("," if i else "") + "\n    " + json.dumps(row))
+        f.write("\n  ]\n}\n")
@@ -0,0 +1,120 @@
+"""
+Fingerprinted store of scored benchmark cells, for incremental re-benchmarking.
+
+A cell is one (model, question) result under one configuration. Its
+fingerprint hashes every input that can change the row:
+
+    model id, client, system prompt hash, question hash, database hash, scoring version
+
+With `--incremental`, the benchmark looks every cell of the requested sweep up
+in `results/run_store.db`; only missing or invalidated cells (new model, new
+or edited question, new prompt technique, changed schema or database, bumped
+SCORING_VERSION) are sent to the models. Stored rows are merged into the run,
+so its summary reflects the whole sweep.
+
+Usage:
+    uv run run_store.py            # cells stored per model
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from config import RUN_STORE_PATH
+from result_sink import TRANSIENT_CATEGORIES
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def question_hash(case: dict) -> str:
+    """Hash of a test case's question and its ground truth (the SQL, or the embedded rows without one)."""
+    truth = case.get("ground_truth_sql")
+    if not truth:
+        truth = json.dumps(case.get("ground_truth_results", []), sort_keys=True, default=str)
+    return text_hash(json.dumps([case["question"], truth], ensure_ascii=False))
+
+
+def cell_fingerprint(model_id: str, client_name: str, prompt_hash: str, question_hash: str, db_hash: str,
+                     scoring_version: str) -> str:
+    """Stable SHA-256 of everything that determines one result cell."""
+    payload = json.dumps([model_id, client_name, prompt_hash, question_hash, db_hash, scoring_version])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunStore:
+    def __init__(self, path=RUN_STORE_PATH):
+        """Opens (or creates) the store."""
+        self.path = path
+        self.reused = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " fingerprint TEXT PRIMARY KEY,"
+            " model_id TEXT, client TEXT, query_id TEXT, scoring_version TEXT,"
+            " row TEXT NOT NULL, stored_utc TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+    def lookup(self, fingerprints: dict) -> dict:
+        """Maps {cell key: fingerprint} to {cell key: stored row} for the cells present in the store."""
+        unique = list(set(fingerprints.values()))
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for fingerprint, row in self.connection.execute(
+                        f"SELECT fingerprint, row FROM cells WHERE fingerprint IN ({placeholders})", chunk):
+                    found[fingerprint] = row
+            rows = {key: json.loads(found[fingerprint]) for key, fingerprint in fingerprints.items()
+                    if fingerprint in found}
+            self.reused += len(rows)
+        return rows
+
+    def put(self, fingerprint: str, row: dict, model_id: str = None, client_name: str = None,
+            scoring_version: str = None):
+        """Stores a scored row under its cell fingerprint (transient failures are ignored)."""
+        if row.get("error_category") in TRANSIENT_CATEGORIES:
+            return
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cells (fingerprint, model_id, client, query_id, scoring_version, row, stored_utc) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, model_id, client_name, row.get("query_id"), scoring_version,
+                 json.dumps(row, ensure_ascii=False, default=str), datetime.utcnow().isoformat()),
+            )
+            self.connection.commit()
+            self.stored += 1
+
+    def stats(self) -> dict:
+        return {"cells_reused": self.reused, "cells_stored": self.stored}
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the cells kept in the incremental run store.")
+    parser.parse_args()
+
+    store = RunStore()
+    rows = store.connection.execute(
+        "SELECT client, model_id, scoring_version, COUNT(*), MAX(stored_utc) FROM cells "
+        "GROUP BY client, model_id, scoring_version ORDER BY client, model_id"
+    ).fetchall()
+    print(f"{'Client':<12} | {'Model id':<42} | {'Scoring':<7} | {'Cells':>6} | Last stored (UTC)")
+    print("-" * 100)
+    for client, model_id, version, count, last in rows:
+        print(f"{client or '-':<12} | {model_id or '-':<42} | {version or '-':<7} | {count:>6} | {last[:19]}")
+    store.close()
@@ -0,0 +1,189 @@
+"""
+Scaled-database generator and execution-cost profiler.
+
+`data/library.db` is small enough that any generated query runs in
+microseconds. This module rebuilds the schema from `inserts/SCHEMA.sql`, loads
+the rows from the insert files and replicates them `factor` times into
+`data/scaled/library_x{factor}.db`:
+
+  - integer primary keys are shifted by `copy * (max_pk + 1)`, so every copy is unique;
+  - each foreign key of a copied row points into a parent copy chosen by a fixed,
+    per-row random shift, so joins cross copies but every reference still exists
+    (and composite primary keys such as BOOK_LOAN's stay unique).
+
+The ScaleProfiler then runs each model's SQL against those databases and records
+execution time and the `EXPLAIN QUERY PLAN` (full scans vs index use),
+separately from LLM latency.
+
+Usage:
+    uv run scale_db.py --factors 10 100 1000
+"""
+import argparse
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from config import INSERTS_DIR, SCALED_DB_DIR
+from db_handler import SandboxedExecutor
+from sql_memo import canonicalize_sql
+
+_INSERT_FILE_RE = re.compile(r"^[A-Z_]+\.sql$")
+
+
+def scaled_db_path(factor: int):
+    return SCALED_DB_DIR / f"library_x{factor}.db"
+
+
+def load_base_database() -> sqlite3.Connection:
+    """Builds an in-memory database from SCHEMA.sql and the insert files."""
+    connection = sqlite3.connect(":memory:")
+    connection.executescript((INSERTS_DIR / "SCHEMA.sql").read_text(encoding="utf-8"))
+    connection.execute("PRAGMA foreign_keys = OFF")
+    for path in sorted(INSERTS_DIR.glob("*.sql")):
+        if path.name != "SCHEMA.sql" and _INSERT_FILE_RE.match(path.name):
+            connection.executescript(path.read_text(encoding="utf-8"))
+    return connection
+
+
+def _table_order(connection) -> list:
+    """Tables sorted so that parents come before the tables referencing them."""
+    tables = [r[0] for r in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+    parents = {t: {fk[2] for fk in connection.execute(f"PRAGMA foreign_key_list({t})")} - {t} for t in tables}
+    ordered = []
+    while len(ordered) < len(tables):
+        ready = [t for t in tables if t not in ordered and parents[t] <= set(ordered)]
+        if not ready:  # cycle: keep the remaining order
+            ready = [t for t in tables if t not in ordered]
+        ordered.extend(sorted(ready))
+    return ordered
+
+
+def generate_scaled_db(factor: int, seed: int = 0, overwrite: bool = False):
+    """Writes library_x{factor}.db and returns its path."""
+    target = scaled_db_path(factor)
+    if target.exists() and not overwrite:
+        return target
+    SCALED_DB_DIR.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+
+    base = load_base_database()
+    rng = random.Random(seed)
+    out = sqlite3.connect(target)
+    out.executescript((INSERTS_DIR / "SCHEMA.sql").read_text(encoding="utf-8"))
+    out.execute("PRAGMA foreign_keys = OFF")
+
+    # Integer primary key of each table and the offset between two copies
+    pk_offset = {}
+    for table in _table_order(base):
+        columns = list(base.execute(f"PRAGMA table_info({table})"))
+        pk_columns = [c[1] for c in columns if c[5]]
+        if len(pk_columns) == 1 and columns[[c[1] for c in columns].index(pk_columns[0])][2].upper() == "INTEGER":
+            max_pk = base.execute(f"SELECT COALESCE(MAX({pk_columns[0]}), 0) FROM {table}").fetchone()[0]
+            pk_offset[table] = (pk_columns[0], max_pk + 1)
+
+    for table in _table_order(base):
+        names = [c[1] for c in base.execute(f"PRAGMA table_info({table})")]
+        rows = base.execute(f"SELECT * FROM {table}").fetchall()
+        # (column index, parent table) for every foreign key pointing at a scaled parent
+        foreign_keys = [(names.index(fk[3]), fk[2]) for fk in base.execute(f"PRAGMA foreign_key_list({table})")
+                        if fk[2] in pk_offset]
+        shifts = [[rng.randrange(factor) for _ in foreign_keys] for _ in rows]
+        own_pk = pk_offset.get(table)
+        own_index = names.index(own_pk[0]) if own_pk else None
+
+        def copies():
+            for copy in range(factor):
+                for row, row_shifts in zip(rows, shifts):
+                    values = list(row)
+                    if own_pk:
+                        values[own_index] += copy * own_pk[1]
+                    for (index, parent), shift in zip(foreign_keys, row_shifts):
+                        if values[index] is not None:
+                            values[index] += ((copy + shift) % factor) * pk_offset[parent][1]
+                    yield values
+
+        placeholders = ", ".join("?" * len(names))
+        out.executemany(f"INSERT INTO {table} VALUES ({placeholders})", copies())
+        out.commit()
+
+    out.close()
+    base.close()
+    return target
+
+
+def plan_summary(plan_rows: list) -> dict:
+    """Classifies EXPLAIN QUERY PLAN details into full scans and index searches."""
+    details = [r[-1] for r in plan_rows]
+    return {
+        "plan": details,
+        "full_scans": sum(1 for d in details if d.startswith("SCAN") and "CONSTANT ROW" not in d),
+        "index_searches": sum(1 for d in details if d.startswith("SEARCH")),
+    }
+
+
+class ScaleProfiler:
+    """Runs generated SQL on the scaled databases; each canonical statement is profiled once."""
+
+    def __init__(self, factors: list):
+        self.factors = sorted(factors)
+        self.executors = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        for factor in self.factors:
+            path = scaled_db_path(factor)
+            if not path.exists():
+                print(f"Generating scaled database x{factor}...")
+                generate_scaled_db(factor)
+            self.executors[factor] = SandboxedExecutor(path, workers=1).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for executor in self.executors.values():
+            executor.__exit__(exc_type, exc_val, exc_tb)
+        self.executors.clear()
+
+    def profile(self, sql: str) -> dict:
+        """Returns {"x10": {...}, ..., "query_plan": {...}} for one statement."""
+        canonical = canonicalize_sql(sql)
+        with self._lock:
+            if canonical in self._cache:
+                return self._cache[canonical]
+
+        profile = {}
+        for factor, executor in self.executors.items():
+            start = time.perf_counter()
+            result = executor.run_query(sql)
+            profile[f"x{factor}"] = {
+                "exec_seconds": time.perf_counter() - start,
+                "rows": len(result.rows) if result.rows is not None else None,
+                "error_category": result.error_category,
+            }
+        largest = self.executors[self.factors[-1]]
+        plan = largest.run_query(f"EXPLAIN QUERY PLAN {sql}")
+        profile["query_plan"] = plan_summary(plan.rows) if plan.rows is not None else None
+
+        with self._lock:
+            self._cache[canonical] = profile
+        return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate scaled copies of the library database.")
+    parser.add_argument("--factors", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for factor in args.factors:
+        start = time.time()
+        path = generate_scaled_db(factor, seed=args.seed, overwrite=True)
+        with sqlite3.connect(path) as connection:
+            counts = {t: connection.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                      for (t,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            violations = connection.execute("PRAGMA foreign_key_check").fetchall()
+        print(f"✅ x{factor}: {path} in {time.time() - start:.1f}s, "
+              f"{sum(counts.values()):,} rows, {len(violations)} FK violations")
@@ -0,0 +1,113 @@
+"""
+Concurrent scheduler for benchmark jobs.
+
+The blocking LLM calls run in worker threads so requests to different clients
+(LM Studio, OpenRouter, Gemini, ...) overlap. Each client gets its own
+concurrency limit and token-bucket rate limit, replacing the flat sleep
+between sequential calls. Result handling happens on the event loop thread,
+so anything that is not thread-safe (e.g. the shared SQLite connection) can
+be used there safely.
+"""
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, NamedTuple
+
+from config import CLIENT_RATE_LIMITS, DEFAULT_RATE_LIMIT, MAX_CONCURRENCY
+
+
+class Job(NamedTuple):
+    """A single unit of work: a blocking call issued against one client."""
+    client_name: str
+    call: Callable[[], Any]
+    context: Any = None
+    # Optional check run before rate limiting; a non-None return value is used as the
+    # job's result without calling `call` (e.g. the backend is known to be down)
+    shortcut: Callable[[], Any] = None
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `capacity` stored."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits until a token is available and consumes it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _ClientLimiter:
+    """Bundles the per-client semaphore and token bucket."""
+
+    def __init__(self, limits: dict):
+        self.semaphore = asyncio.Semaphore(limits["concurrency"])
+        self.bucket = TokenBucket(limits["rate"], limits["burst"])
+
+
+async def _run_jobs(jobs, on_result, limits, max_concurrency):
+    global_semaphore = asyncio.Semaphore(max_concurrency)
+    limiters = {
+        name: _ClientLimiter(limits.get(name, DEFAULT_RATE_LIMIT))
+        for name in {job.client_name for job in jobs}
+    }
+    results = [None] * len(jobs)
+
+    async def worker(index, job):
+        limiter = limiters[job.client_name]
+        async with limiter.semaphore:
+            value = job.shortcut() if job.shortcut else None
+            if value is not None:
+                error, elapsed = None, 0.0
+            else:
+                await limiter.bucket.acquire()
+                async with global_semaphore:
+                    start_time = time.time()
+                    try:
+                        value, error = await asyncio.to_thread(job.call), None
+                    except Exception as e:
+                        value, error = None, e
+                    elapsed = time.time() - start_time
+        # Runs on the loop thread: safe for non-thread-safe resources.
+        # An async follow-up (e.g. pooled SQL execution) is awaited outside the client limits.
+        result = on_result(job, value, error, elapsed)
+        if inspect.isawaitable(result):
+            result = await result
+        results[index] = result
+
+    await asyncio.gather(*(worker(i, job) for i, job in enumerate(jobs)))
+    return results
+
+
+def run_jobs(jobs: list, on_result: Callable, limits: dict = None, max_concurrency: int = None) -> list:
+    """
+    Runs all jobs concurrently, honouring per-client limits.
+
+    Args:
+        jobs (list[Job]): Work items; `call` is executed in a worker thread.
+        on_result (callable): `on_result(job, value, error, elapsed)`, called on the
+            event loop thread as each job finishes. Its return value is collected;
+            if it is awaitable, it is awaited first.
+        limits (dict): Per-client limits, defaults to `config.CLIENT_RATE_LIMITS`.
+        max_concurrency (int): Global cap on in-flight calls.
+
+    Returns:
+        The `on_result` return values, in the same order as `jobs` (not completion order).
+    """
+    if limits is None:
+        limits = CLIENT_RATE_LIMITS
+    if max_concurrency is None:
+        max_concurrency = MAX_CONCURRENCY
+    return asyncio.run(_run_jobs(jobs, on_result, limits, max_concurrency))
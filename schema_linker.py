@@ -0,0 +1,177 @@
+"""
+Schema linking: shrink the system prompt to the tables a question needs.
+
+The index is built once per database from `sqlite_master`, `PRAGMA table_info`,
+`PRAGMA foreign_key_list` and a few sample values of every text column. For each
+question, tables are scored by matches on their name, column names and sample
+values; the best ones are kept and connected through the shortest foreign-key
+join paths. Pruned schema strings and prompts are cached per table set.
+"""
+import re
+import sqlite3
+from collections import deque
+
+SAMPLE_VALUES_PER_COLUMN = 50
+MAX_SAMPLE_LENGTH = 40
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no schema information
+_STOPWORDS = {
+    "the", "a", "an", "of", "for", "and", "or", "in", "on", "at", "to", "by", "with", "from", "who", "which",
+    "what", "that", "have", "has", "had", "are", "is", "was", "were", "be", "all", "any", "each", "find", "list",
+    "show", "give", "how", "many", "much", "name", "names", "id", "number", "their", "there", "than", "more",
+    "most", "least", "still", "been", "do", "does", "did", "not", "no", "me",
+}
+
+
+def _stem(word: str) -> str:
+    """Very small plural stripper: books -> book, libraries -> library."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _terms(text: str) -> set:
+    return {_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS}
+
+
+class SchemaIndex:
+    def __init__(self, tables: dict, foreign_keys: dict, samples: dict):
+        """
+        tables:       {table: [(column, type), ...]}
+        foreign_keys: {table: [(column, parent_table, parent_column), ...]}
+        samples:      {table: set of terms found in its text values}
+        """
+        self.tables = tables
+        self.foreign_keys = foreign_keys
+        self.samples = samples
+        self.neighbours = {t: set() for t in tables}
+        for table, fks in foreign_keys.items():
+            for _, parent, _ in fks:
+                if parent in self.neighbours:
+                    self.neighbours[table].add(parent)
+                    self.neighbours[parent].add(table)
+        self._schema_cache = {}
+        self._prompt_cache = {}
+
+    @classmethod
+    def from_connection(cls, connection: sqlite3.Connection) -> "SchemaIndex":
+        """Builds the index from an open SQLite connection."""
+        tables, foreign_keys, samples = {}, {}, {}
+        names = [r[0] for r in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+        for table in names:
+            columns = [(c[1], c[2]) for c in connection.execute(f"PRAGMA table_info({table})")]
+            tables[table] = columns
+            foreign_keys[table] = [(fk[3], fk[2], fk[4]) for fk in connection.execute(f"PRAGMA foreign_key_list({table})")]
+            terms = set()
+            for column, col_type in columns:
+                if "CHAR" in col_type.upper() or "TEXT" in col_type.upper():
+                    values = connection.execute(
+                        f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL "
+                        f"AND LENGTH({column}) <= ? LIMIT ?",
+                        (MAX_SAMPLE_LENGTH, SAMPLE_VALUES_PER_COLUMN),
+                    )
+                    for (value,) in values:
+                        terms |= _terms(str(value))
+            samples[table] = terms
+        return cls(tables, foreign_keys, samples)
+
+    # --- Linking ---
+    def _document_frequency(self):
+        """How many tables mention each column term / sample term (rarer terms weigh more)."""
+        if not hasattr(self, "_df"):
+            column_df, sample_df = {}, {}
+            for table, columns in self.tables.items():
+                for term in set().union(*(_terms(c.replace("_", " ")) for c, _ in columns)):
+                    column_df[term] = column_df.get(term, 0) + 1
+                for term in self.samples.get(table, ()):
+                    sample_df[term] = sample_df.get(term, 0) + 1
+            self._df = (column_df, sample_df)
+        return self._df
+
+    def score_tables(self, question: str) -> dict:
+        """Relevance score of every table for a question."""
+        terms = _terms(question)
+        # Numbers and very short words match far too many sample values
+        value_terms = {t for t in terms if len(t) >= 3 and not t.isdigit()}
+        column_df, sample_df = self._document_frequency()
+        scores = {}
+        for table, columns in self.tables.items():
+            table_terms = _terms(table.replace("_", " "))
+            score = 3.0 * len(terms & table_terms)
+            column_terms = set().union(*(_terms(c.replace("_", " ")) for c, _ in columns)) - table_terms
+            score += sum(1.0 / column_df[t] for t in terms & column_terms)
+            score += sum(2.0 / sample_df[t] for t in value_terms & self.samples.get(table, set()))
+            scores[table] = score
+        return scores
+
+    def _join_path(self, source: str, targets: set) -> list:
+        """Shortest FK path (BFS) from `source` to any table in `targets`."""
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            table = queue.popleft()
+            if table in targets:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path
+            for neighbour in sorted(self.neighbours[table]):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return [source]
+
+    def select_tables(self, question: str, min_score: float = 1.0, relative_score: float = 0.5) -> list:
+        """
+        Relevant tables plus the tables on the join paths between them. A table is
+        relevant if the question names it, or if its score is at least `min_score` and
+        `relative_score` times the best score. Falls back to all tables when nothing matches.
+        """
+        scores = self.score_tables(question)
+        best = max(scores.values(), default=0)
+        if best < min_score:
+            return list(self.tables)
+        threshold = max(min_score, relative_score * best)
+        terms = _terms(question)
+        selected = [t for t, s in sorted(scores.items(), key=lambda item: -item[1])
+                    if s >= threshold or _terms(t.replace("_", " ")) <= terms]
+        connected = {selected[0]}
+        for table in selected[1:]:
+            if table not in connected:
+                connected.update(self._join_path(table, connected))
+        return [t for t in self.tables if t in connected]
+
+    # --- Rendering ---
+    def render_schema(self, tables: list) -> str:
+        """Same format as DBHandler.get_schema, limited to `tables`, with FK references."""
+        key = tuple(tables)
+        if key not in self._schema_cache:
+            lines = []
+            for table in tables:
+                references = {column: (parent, parent_column) for column, parent, parent_column in self.foreign_keys[table]}
+                lines.append(f"Table: {table}")
+                for column, col_type in self.tables[table]:
+                    line = f"  - {column} ({col_type})"
+                    if column in references and references[column][0] in tables:
+                        line += f" REFERENCES {references[column][0]}({references[column][1]})"
+                    lines.append(line)
+                lines.append("")
+            self._schema_cache[key] = "\n".join(lines)
+        return self._schema_cache[key]
+
+    def pruned_prompt(self, question: str, build_prompt) -> tuple:
+        """
+        Returns (system prompt, selected tables) for a question. `build_prompt(schema)`
+        turns a schema string into the full system prompt; results are cached per table set.
+        """
+        tables = self.select_tables(question)
+        key = tuple(tables)
+        if key not in self._prompt_cache:
+            self._prompt_cache[key] = build_prompt(self.render_schema(tables))
+        return self._prompt_cache[key], tables
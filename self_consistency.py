@@ -0,0 +1,61 @@
+"""
+Self-consistency voting over sampled SQL candidates.
+
+With `--samples k`, every (query, model) cell gets k completions at
+SAMPLE_TEMPERATURE in addition to the usual greedy one. Candidates that
+canonicalize to the same statement are executed once. Each candidate then
+votes for its result set; failed statements do not vote. The most common
+result set wins, and ties go to the earliest sample. Result sets are compared
+as multisets of rows (under the run's match mode), so row order never splits
+a vote.
+
+The winning statement is scored as the cell's answer. Every distinct statement
+is scored as well, which gives pass@k (at least one sample is an exact match)
+and the mean accuracy of a single sample.
+"""
+from collections import Counter
+
+from result_compare import ExpectedResult
+from sql_memo import canonicalize_sql
+
+
+def distinct_statements(sqls: list) -> dict:
+    """Maps each canonical statement to its first occurrence, in order: the statements to execute."""
+    statements = {}
+    for sql in sqls:
+        statements.setdefault(canonicalize_sql(sql), sql)
+    return statements
+
+
+def result_signature(result, match_mode: str = "named"):
+    """Hashable identity of a result set (None for failed statements, which do not vote)."""
+    if result.rows is None:
+        return None
+    hashed = ExpectedResult(result.headers, result.rows, match_mode)
+    columns = tuple(hashed.headers) if match_mode == "named" else hashed.width
+    return columns, frozenset(hashed.counts.items())
+
+
+def majority_vote(candidates: list, results: dict, match_mode: str = "named") -> tuple:
+    """
+    Picks the candidate whose result set most samples agree on.
+
+    Args:
+        candidates (list): The sampled SQL strings.
+        results (dict): {canonical statement: QueryResult} covering every candidate.
+
+    Returns:
+        (winner index, votes for the winning result, number of distinct successful results).
+    """
+    signatures = {canonical: result_signature(result, match_mode) for canonical, result in results.items()}
+    votes = Counter()
+    first = {}
+    for i, sql in enumerate(candidates):
+        signature = signatures[canonicalize_sql(sql)]
+        if signature is not None:
+            votes[signature] += 1
+            first.setdefault(signature, i)
+    if not votes:
+        return 0, 0, 0
+    winner = max(votes, key=lambda signature: (votes[signature], -first[signature]))
+    return first[winner], votes[winner], len(votes)
@@ -0,0 +1,207 @@
+"""
+Memoization of generated-SQL execution and scoring.
+
+Many models answer the same question with the same query, differing only in
+whitespace, keyword case, comments or a trailing semicolon. The memo maps each
+statement to a canonical form and reuses both the fetched rows and the
+computed score for every later copy.
+
+Modes:
+    off:        every statement is executed and scored.
+    run:        in-memory memo for the current run.
+    persistent: additionally stored in a SQLite file, keyed on the database
+                file fingerprint so a changed library.db never reuses stale rows.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from config import MEMO_PATH, SCORING_VERSION
+from db_handler import QueryResult, ERR_NONE, ERR_SQL
+
+MEMO_MODES = ("off", "run", "persistent")
+# Bump whenever canonicalize_sql changes, so persistent entries keyed on older canonical forms are never reused
+CANONICAL_FORM_VERSION = "2"
+
+# Single- and double-quoted tokens are kept verbatim (SQLite reads an unresolved
+# "x" as a string literal); comments are dropped; everything else, including
+# `x` and [x] identifiers, is split into words and single punctuation characters.
+_TOKEN_RE = re.compile(
+    r"(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<quoted>'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])"
+    r"|(?P<word>\w+)"
+    r"|(?P<punct>\S)",
+    re.DOTALL,
+)
+
+# Statements whose result can change between two executions
+_VOLATILE_RE = re.compile(r"\b(random|randomblob|changes|last_insert_rowid)\s*\(|'now'", re.IGNORECASE)
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Returns a canonical form of a statement: comments removed, whitespace
+    collapsed, keywords/identifiers lowercased (single- and double-quoted
+    tokens untouched) and trailing semicolons dropped.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql or ""):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        token = match.group()
+        tokens.append(token if kind == "quoted" and token[0] in "'\"" else token.lower())
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def _expected_hash(expected_data) -> str:
+    # Includes the scoring version, so scores stored by an older scoring (or payload format) are never reused
+    payload = json.dumps({"scoring_version": SCORING_VERSION, "expected": expected_data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExecutionMemo:
+    def __init__(self, mode: str = "run", db_hash: str = None, path=MEMO_PATH):
+        """`db_hash` is required in persistent mode (see db_handler.db_fingerprint)."""
+        if mode not in MEMO_MODES:
+            raise ValueError(f"Invalid memo mode '{mode}'. Choices: {', '.join(MEMO_MODES)}")
+        self.mode = mode
+        self.db_hash = db_hash
+        # Key of the persistent rows: the database and the canonical form they were stored under
+        self.store_key = f"{db_hash}/{CANONICAL_FORM_VERSION}"
+        self.results = {}
+        self.scores = {}
+        self.executions_saved = 0
+        self.scores_saved = 0
+        self._lock = threading.Lock()
+        self.connection = None
+
+        if mode == "persistent":
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.executescript(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " db_hash TEXT, canonical_sql TEXT, payload TEXT NOT NULL,"
+                " PRIMARY KEY (db_hash, canonical_sql));"
+                "CREATE TABLE IF NOT EXISTS scores ("
+                " db_hash TEXT, canonical_sql TEXT, query_id TEXT, expected_hash TEXT, payload TEXT NOT NULL,"
+                " PRIMARY KEY (db_hash, canonical_sql, query_id, expected_hash));"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # --- Execution results ---
+    def get_result(self, canonical: str):
+        """Returns the memoized QueryResult for a canonical statement, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            result = self.results.get(canonical)
+            if result is None and self.connection:
+                row = self.connection.execute(
+                    "SELECT payload FROM results WHERE db_hash = ? AND canonical_sql = ?",
+                    (self.store_key, canonical),
+                ).fetchone()
+                if row:
+                    data = json.loads(row[0])
+                    rows = [tuple(r) for r in data["rows"]] if data["rows"] is not None else None
+                    result = QueryResult(data["headers"], rows, data["error"], data["error_category"], data["truncated"])
+                    self.results[canonical] = result
+            if result is not None:
+                self.executions_saved += 1
+            return result
+
+    def put_result(self, canonical: str, result: QueryResult):
+        """Stores a result if it is deterministic (a read that succeeded or failed to compile)."""
+        if not self.enabled or _VOLATILE_RE.search(canonical):
+            return
+        if result.error_category == ERR_NONE and not result.headers:
+            return  # not a read: never skip a write on a later run
+        if result.error_category not in (ERR_NONE, ERR_SQL):
+            return  # timeouts and truncations depend on limits and load
+        with self._lock:
+            self.results[canonical] = result
+            if self.connection:
+                payload = json.dumps(result._asdict(), default=str)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO results (db_hash, canonical_sql, payload) VALUES (?, ?, ?)",
+                    (self.store_key, canonical, payload),
+                )
+                self.connection.commit()
+
+    # --- Scores ---
+    def score(self, canonical: str, query_id: str, expected_data, compute):
+        """Returns `compute()` (a metrics dict) for this (statement, question, expectation), computing it at most once."""
+        if not self.enabled or not canonical:
+            return compute()
+        key = (canonical, query_id, _expected_hash(expected_data))
+        with self._lock:
+            cached = self.scores.get(key)
+            if cached is None and self.connection:
+                row = self.connection.execute(
+                    "SELECT payload FROM scores WHERE db_hash = ? AND canonical_sql = ? AND query_id = ? AND expected_hash = ?",
+                    (self.store_key, *key),
+                ).fetchone()
+                if row:
+                    cached = json.loads(row[0])
+            if cached is not None:
+                self.scores_saved += 1
+                return cached
+
+        value = compute()
+        with self._lock:
+            self.scores[key] = value
+            if self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO scores (db_hash, canonical_sql, query_id, expected_hash, payload) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.store_key, *key, json.dumps(value)),
+                )
+                self.connection.commit()
+        return value
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "executions_saved": self.executions_saved, "scores_saved": self.scores_saved}
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+class MemoizedExecutor:
+    """Wraps a DBHandler or SandboxedExecutor so repeated (canonical) statements are executed once."""
+
+    def __init__(self, executor, memo: ExecutionMemo):
+        self.executor = executor
+        self.memo = memo
+
+    @property
+    def pooled(self) -> bool:
+        return self.executor.pooled
+
+    def run_query(self, sql_query) -> QueryResult:
+        canonical = canonicalize_sql(sql_query)
+        result = self.memo.get_result(canonical)
+        if result is None:
+            result = self.executor.run_query(sql_query)
+            self.memo.put_result(canonical, result)
+        return result
+
+    def submit(self, sql_query) -> Future:
+        canonical = canonicalize_sql(sql_query)
+        result = self.memo.get_result(canonical)
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            return future
+        future = self.executor.submit(sql_query)
+        future.add_done_callback(lambda f: f.exception() is None and self.memo.put_result(canonical, f.result()))
+        return future
@@ -0,0 +1,212 @@
+"""
+Lightweight span tracing and profiling for benchmark runs.
+
+Code marks its phases with `span(name)`; while no Tracer is installed, `span`
+returns a shared no-op object, so instrumented code costs a function call and
+nothing else. With `--trace`, every span is recorded with `perf_counter_ns`,
+the calling thread and the attributes of the enclosing `attributes(...)`
+blocks (query id, model), then exported as Chrome trace-event JSON (open it in
+chrome://tracing or https://ui.perfetto.dev) plus a per-phase summary table.
+
+Phases recorded by the benchmark:
+    prompt_build, llm_request, sql_execute, row_fetch, scoring, result_write, report_write
+
+`ProfileCapture` optionally wraps the run in cProfile (CPU, calling thread
+only) and/or tracemalloc (memory, all threads).
+"""
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+# Attributes attached to every span opened in the current context
+_attributes = contextvars.ContextVar("trace_attributes", default={})
+
+# The active Tracer, or None when tracing is disabled
+_tracer = None
+
+
+def set_tracer(tracer):
+    """Installs (or removes, with None) the tracer that records spans."""
+    global _tracer
+    _tracer = tracer
+
+
+class _NullSpan:
+    """Returned while tracing is disabled: does nothing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter_ns()
+        attrs = {**_attributes.get(), **self.attrs}
+        if exc_type is not None:
+            attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, end - self.start, attrs)
+        return False
+
+    def set(self, **attrs):
+        """Adds attributes known only once the span is running (e.g. row counts)."""
+        self.attrs.update(attrs)
+
+
+def span(name: str, **attrs):
+    """Context manager timing one phase; a no-op unless a tracer is installed."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, attrs)
+
+
+class _Attributes:
+    __slots__ = ("attrs", "token")
+
+    def __init__(self, attrs):
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.token = _attributes.set({**_attributes.get(), **self.attrs})
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _attributes.reset(self.token)
+        return False
+
+
+def attributes(**attrs):
+    """Context manager adding attributes (e.g. query_id, model) to the spans opened inside it."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Attributes(attrs)
+
+
+def _percentile(sorted_values: list, fraction: float):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Tracer:
+    def __init__(self):
+        self.events = []  # (name, start_ns, duration_ns, thread id, attrs); list.append is atomic
+        self.origin = time.perf_counter_ns()
+
+    def record(self, name: str, start_ns: int, duration_ns: int, attrs: dict):
+        self.events.append((name, start_ns, duration_ns, threading.get_ident(), attrs))
+
+    def export_chrome(self, path):
+        """Writes the spans as Chrome trace-event JSON ("X" complete events, microseconds)."""
+        pid = os.getpid()
+        thread_ids = {}
+        trace_events = []
+        for name, start, duration, thread, attrs in self.events:
+            tid = thread_ids.setdefault(thread, len(thread_ids) + 1)
+            trace_events.append({
+                "name": name, "cat": "benchmark", "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - self.origin) / 1000, "dur": duration / 1000, "args": attrs,
+            })
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def summary(self) -> dict:
+        """Per-phase count, total, mean, p50, p95 and max duration in milliseconds."""
+        durations = {}
+        for name, _, duration, _, _ in self.events:
+            durations.setdefault(name, []).append(duration / 1e6)
+        result = {}
+        for name, values in durations.items():
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "total_ms": round(sum(values), 3),
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(_percentile(values, 0.50), 3),
+                "p95_ms": round(_percentile(values, 0.95), 3),
+                "max_ms": round(values[-1], 3),
+            }
+        return result
+
+
+def print_phase_table(summary: dict):
+    print(f"\n{'Phase':<14} | {'Count':>7} | {'Total ms':>10} | {'Mean ms':>9} | {'p50 ms':>9} | {'p95 ms':>9} | {'Max ms':>9}")
+    print("-" * 85)
+    for name, s in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{name:<14} | {s['count']:>7} | {s['total_ms']:>10.1f} | {s['mean_ms']:>9.3f} | "
+              f"{s['p50_ms']:>9.3f} | {s['p95_ms']:>9.3f} | {s['max_ms']:>9.3f}")
+
+
+class ProfileCapture:
+    """
+    Optional cProfile ("cpu") and tracemalloc ("memory") capture around a block.
+    cProfile only sees the thread that entered the block; tracemalloc sees all threads.
+    """
+
+    def __init__(self, modes=()):
+        self.modes = set(modes or ())
+        self.profile = None
+        self.snapshot = None
+        self.peak = None
+
+    def __enter__(self):
+        if "memory" in self.modes:
+            tracemalloc.start()
+        if "cpu" in self.modes:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.profile:
+            self.profile.disable()
+        if "memory" in self.modes:
+            self.snapshot = tracemalloc.take_snapshot()
+            _, self.peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return False
+
+    def save(self, path_prefix, top: int = 15) -> dict:
+        """Writes `<prefix>.prof` (cProfile) and prints the top entries; returns file paths and the memory peak."""
+        saved = {}
+        if self.profile:
+            prof_path = Path(f"{path_prefix}.prof")
+            prof_path.parent.mkdir(parents=True, exist_ok=True)
+            self.profile.dump_stats(prof_path)
+            saved["cpu_profile"] = str(prof_path)
+            out = io.StringIO()
+            pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(top)
+            print(f"\n--- cProfile (top {top} by cumulative time, full stats in {prof_path}) ---")
+            print(out.getvalue().strip())
+        if self.snapshot:
+            saved["memory_peak_mb"] = round(self.peak / 1e6, 2)
+            print(f"\n--- tracemalloc (peak {self.peak / 1e6:.1f} MB, top {top} allocation sites) ---")
+            for stat in self.snapshot.statistics("lineno")[:top]:
+                print(f"  {stat.size / 1e6:>8.2f} MB  {stat.count:>8} blocks  {stat.traceback}")
+        return saved
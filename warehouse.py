@@ -0,0 +1,375 @@
+"""
+Append-only results warehouse for analysis across runs.
+
+Every finished run is stored in one SQLite file (`results/warehouse.db`): a
+`runs` table with the run's settings and summary, and a `results` table with
+one typed row per (run, query, model). `results` is indexed on model,
+query_id, technique and run_id, so the notebook and CI dashboards can query
+thousands of runs without parsing any JSON reports. Rows that are not
+first-class columns are kept in the `extra` JSON column.
+
+A run id is stored once: storing it again is a no-op, so history is never
+overwritten. `import` backfills the warehouse from existing `benchmark_*.json`
+reports.
+
+Usage:
+    uv run warehouse.py import results/                       # backfill from JSON reports
+    uv run warehouse.py runs
+    uv run warehouse.py accuracy --by difficulty --technique few-shots
+    uv run warehouse.py latency --model gemini-2.5-flash
+    uv run warehouse.py diff --runs small_zero-shot_20251120T101500000000 small_zero-shot_20251127T090000000000
+    uv run warehouse.py diff --models qwen3-4b-2507 phi-4-mini --technique zero-shot
+
+From Python (e.g. the notebook):
+    from warehouse import load_results
+    df = load_results(technique="few-shots")
+"""
+import argparse
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from config import WAREHOUSE_PATH
+from result_sink import TRANSIENT_CATEGORIES
+
+# Report-row keys stored as typed columns; every other key goes to `extra`
+RESULT_COLUMNS = (
+    "query_id", "model", "difficulty", "match_percentage", "precision", "exact_match", "ordered_match",
+    "rows_matched", "rows_expected", "rows_returned", "latency", "ttft", "generation_time", "prompt_tokens",
+    "completion_tokens", "tokens_per_second", "usage_source", "error_category", "generated_sql", "reused",
+)
+# Run settings stored as typed columns (from the run header and the report metadata)
+RUN_COLUMNS = (
+    "model_group", "prompt_technique", "system_prompt_used", "reasoning", "match_mode", "samples", "sweep",
+    "timestamp_utc",
+)
+# Groupings accepted by `accuracy --by`
+GROUPINGS = {"difficulty": "r.difficulty", "model": "r.model", "technique": "r.technique", "run": "r.run_id",
+             "query": "r.query_id"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    model_group TEXT, prompt_technique TEXT, system_prompt_used INTEGER, reasoning INTEGER,
+    match_mode TEXT, samples INTEGER, sweep TEXT, timestamp_utc TEXT,
+    rows INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    ingested_utc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT NOT NULL,
+    technique TEXT,
+    query_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    difficulty TEXT,
+    match_percentage REAL, precision REAL, exact_match INTEGER, ordered_match INTEGER,
+    rows_matched INTEGER, rows_expected INTEGER, rows_returned INTEGER,
+    latency REAL, ttft REAL, generation_time REAL,
+    prompt_tokens INTEGER, completion_tokens INTEGER, tokens_per_second REAL, usage_source TEXT,
+    error_category TEXT, generated_sql TEXT, reused INTEGER,
+    extra TEXT,
+    PRIMARY KEY (run_id, query_id, model)
+);
+CREATE INDEX IF NOT EXISTS results_model ON results (model);
+CREATE INDEX IF NOT EXISTS results_query ON results (query_id);
+CREATE INDEX IF NOT EXISTS results_technique ON results (technique);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id);
+"""
+
+
+def _percentile(sorted_values: list, fraction: float):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _filters(run_ids=None, models=None, technique=None, group=None, include_skipped=False) -> tuple:
+    """WHERE clause (on `results r` joined with `runs u`) and its parameters."""
+    clauses, params = [], []
+    for column, values in (("r.run_id", run_ids), ("r.model", models)):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += list(values)
+    if technique:
+        clauses.append("r.technique = ?")
+        params.append(technique)
+    if group:
+        clauses.append("u.model_group = ?")
+        params.append(group)
+    if not include_skipped:
+        # Failed or never sent requests say nothing about the model
+        clauses.append(f"COALESCE(r.error_category, '') NOT IN ({', '.join('?' * len(TRANSIENT_CATEGORIES))})")
+        params += list(TRANSIENT_CATEGORIES)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class ResultsWarehouse:
+    def __init__(self, path=WAREHOUSE_PATH):
+        """Opens (or creates) the warehouse."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        # Readers (dashboards, the notebook) never block a run storing its results
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+        self.connection.commit()
+
+    # --- Ingestion ---
+    def has_run(self, run_id: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    def add_run(self, run_id: str, summary: dict, rows, config: dict = None) -> int:
+        """
+        Stores a run and its report rows in one transaction; returns the number of rows
+        stored (0 if the run id is already present).
+
+        Args:
+            summary (dict): The report summary (`metadata` and `model_performance`).
+            rows (iterable): Report rows, consumed once.
+            config (dict): Run settings not in the summary metadata (e.g. the run header).
+        """
+        if self.has_run(run_id):
+            return 0
+        settings = {**(config or {}), **summary.get("metadata", {})}
+        technique = settings.get("prompt_technique")
+        count = 0
+        with self.connection:
+            batch = []
+            for row in rows:
+                extra = {key: value for key, value in row.items() if key not in RESULT_COLUMNS}
+                batch.append((run_id, technique, *(row.get(column) for column in RESULT_COLUMNS),
+                              json.dumps(extra, ensure_ascii=False, default=str) if extra else None))
+                if len(batch) >= 1000:
+                    count += self._insert_rows(batch)
+                    batch = []
+            count += self._insert_rows(batch)
+            self.connection.execute(
+                f"INSERT INTO runs (run_id, {', '.join(RUN_COLUMNS)}, rows, summary, ingested_utc) "
+                f"VALUES (?, {', '.join('?' * len(RUN_COLUMNS))}, ?, ?, ?)",
+                (run_id, *(settings.get(column) for column in RUN_COLUMNS), count,
+                 json.dumps(summary, ensure_ascii=False, default=str), datetime.utcnow().isoformat()),
+            )
+        return count
+
+    def _insert_rows(self, batch: list) -> int:
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO results (run_id, technique, {', '.join(RESULT_COLUMNS)}, extra) "
+            f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS) + 3))})",
+            batch,
+        )
+        return len(batch)
+
+    def import_report(self, path: Path) -> int:
+        """Stores a `benchmark_*.json` report (run id: its run_name, else the file name)."""
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        summary = report.get("summary", {})
+        run_id = summary.get("metadata", {}).get("run_name") or Path(path).stem.removeprefix("benchmark_")
+        return self.add_run(run_id, summary, report.get("detailed_report", []))
+
+    # --- Queries ---
+    def runs(self) -> list:
+        cursor = self.connection.execute(
+            "SELECT run_id, model_group, prompt_technique, reasoning, samples, rows, timestamp_utc FROM runs "
+            "ORDER BY timestamp_utc, run_id"
+        )
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def accuracy(self, by: str = "difficulty", **filters) -> list:
+        """Average accuracy, exact-match rate and error count per model and `by` value."""
+        where, params = _filters(**filters)
+        key = GROUPINGS[by]
+        cursor = self.connection.execute(
+            f"SELECT r.model, {key} AS {by}, COUNT(*) AS n, AVG(r.match_percentage) AS accuracy, "
+            f"AVG(r.exact_match) * 100 AS exact_rate, "
+            f"SUM(COALESCE(r.error_category, 'none') != 'none') AS errors "
+            f"FROM results r JOIN runs u ON u.run_id = r.run_id{where} "
+            f"GROUP BY r.model, {key} ORDER BY r.model, {key}",
+            params,
+        )
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def latency_percentiles(self, **filters) -> list:
+        """Per-model latency count, mean, p50, p90, p95, p99 and max (seconds)."""
+        where, params = _filters(**filters)
+        where += (" AND " if where else " WHERE ") + "r.latency IS NOT NULL"
+        latencies = {}
+        for model, latency in self.connection.execute(
+                f"SELECT r.model, r.latency FROM results r JOIN runs u ON u.run_id = r.run_id{where} "
+                f"ORDER BY r.model, r.latency", params):
+            latencies.setdefault(model, []).append(latency)
+        return [{"model": model, "n": len(values), "mean": sum(values) / len(values),
+                 "p50": _percentile(values, 0.50), "p90": _percentile(values, 0.90),
+                 "p95": _percentile(values, 0.95), "p99": _percentile(values, 0.99), "max": values[-1]}
+                for model, values in latencies.items()]
+
+    def _cells(self, where: str, params: list) -> dict:
+        return {(run_id, query_id, model): (accuracy, bool(exact))
+                for run_id, query_id, model, accuracy, exact in self.connection.execute(
+                    f"SELECT r.run_id, r.query_id, r.model, r.match_percentage, r.exact_match "
+                    f"FROM results r JOIN runs u ON u.run_id = r.run_id{where}", params)}
+
+    def diff_runs(self, run_a: str, run_b: str, models=None) -> dict:
+        """
+        Compares two runs on the (query, model) cells they share.
+        Returns {"models": [per-model accuracy in A and B], "changed": [cells whose exact match flipped]}.
+        """
+        where, params = _filters(run_ids=[run_a, run_b], models=models)
+        cells = self._cells(where, params)
+        shared = {(query_id, model) for run_id, query_id, model in cells if run_id == run_a} & \
+                 {(query_id, model) for run_id, query_id, model in cells if run_id == run_b}
+        return self._diff(shared, lambda cell: cells[(run_a, *cell)], lambda cell: cells[(run_b, *cell)],
+                          key=lambda cell: cell[1])
+
+    def diff_models(self, model_a: str, model_b: str, **filters) -> dict:
+        """
+        Compares two models on the (run, query) cells both answered.
+        Returns {"runs": [per-run accuracy of A and B], "changed": [cells where exactly one is correct]}.
+        """
+        where, params = _filters(models=[model_a, model_b], **filters)
+        cells = self._cells(where, params)
+        shared = {(run_id, query_id) for run_id, query_id, model in cells if model == model_a} & \
+                 {(run_id, query_id) for run_id, query_id, model in cells if model == model_b}
+        diff = self._diff(shared, lambda cell: cells[(*cell, model_a)], lambda cell: cells[(*cell, model_b)],
+                          key=lambda cell: cell[0])
+        diff["runs"] = diff.pop("models")
+        return diff
+
+    @staticmethod
+    def _diff(shared: set, side_a, side_b, key) -> dict:
+        totals, changed = {}, []
+        for cell in sorted(shared):
+            (accuracy_a, exact_a), (accuracy_b, exact_b) = side_a(cell), side_b(cell)
+            total = totals.setdefault(key(cell), [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += accuracy_a or 0.0
+            total[2] += accuracy_b or 0.0
+            if exact_a != exact_b:
+                changed.append({"cell": list(cell), "a": accuracy_a, "b": accuracy_b,
+                                "change": "improved" if exact_b else "regressed"})
+        summary = [{"key": name, "n": n, "accuracy_a": a / n, "accuracy_b": b / n, "delta": (b - a) / n}
+                   for name, (n, a, b) in sorted(totals.items())]
+        return {"models": summary, "changed": changed}
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def store_run(summary: dict, rows, config: dict = None, path=WAREHOUSE_PATH):
+    """Stores a finished run (keyed by its run_name) and reports it on the console."""
+    run_id = summary["metadata"].get("run_name")
+    if not run_id:
+        return
+    try:
+        with ResultsWarehouse(path) as warehouse:
+            count = warehouse.add_run(run_id, summary, rows, config)
+        if count:
+            print(f"📦 Stored {count} rows of run '{run_id}' in the results warehouse ({path})")
+    except sqlite3.Error as e:
+        print(f"\nError storing run in the results warehouse: {e}")
+
+
+def load_results(run_ids=None, models=None, technique=None, group=None, include_skipped=False, path=WAREHOUSE_PATH):
+    """Returns the matching result rows, joined with their run settings, as a pandas DataFrame."""
+    import pandas as pd
+
+    where, params = _filters(run_ids, models, technique, group, include_skipped)
+    with ResultsWarehouse(path) as warehouse:
+        return pd.read_sql_query(
+            f"SELECT r.*, {', '.join(f'u.{column}' for column in RUN_COLUMNS if column != 'prompt_technique')} "
+            f"FROM results r JOIN runs u ON u.run_id = r.run_id{where}",
+            warehouse.connection, params=params,
+        )
+
+
+def _print_table(rows: list, columns: list):
+    if not rows:
+        print("No matching results.")
+        return
+    cells = [[("-" if row[c] is None else f"{row[c]:.3f}" if isinstance(row[c], float) else str(row[c]))
+              for c in columns] for row in rows]
+    widths = [max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)]
+    print(" | ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for line in cells:
+        print(" | ".join(value.ljust(w) for value, w in zip(line, widths)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the append-only results warehouse.")
+    parser.add_argument("--db", type=str, default=str(WAREHOUSE_PATH), help="Path to the warehouse file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="Backfill from benchmark_*.json reports.")
+    importer.add_argument("paths", nargs="+", help="Report files or directories containing them.")
+    commands.add_parser("runs", help="List the stored runs.")
+
+    def add_filters(command):
+        command.add_argument("--run", type=str, nargs="+", default=None, dest="run_ids")
+        command.add_argument("--model", type=str, nargs="+", default=None, dest="models")
+        command.add_argument("--technique", type=str, default=None)
+        command.add_argument("--group", type=str, default=None)
+        return command
+
+    add_filters(commands.add_parser("accuracy", help="Accuracy per model and difficulty (or --by)")).add_argument(
+        "--by", type=str, default="difficulty", choices=GROUPINGS)
+    add_filters(commands.add_parser("latency", help="Latency percentiles per model."))
+    diff = commands.add_parser("diff", help="Compare two runs, or two models across runs.")
+    pair = diff.add_mutually_exclusive_group(required=True)
+    pair.add_argument("--runs", type=str, nargs=2, metavar=("A", "B"))
+    pair.add_argument("--models", type=str, nargs=2, metavar=("A", "B"))
+    diff.add_argument("--run", type=str, nargs="+", default=None, dest="run_ids", help="With --models: only these runs.")
+    diff.add_argument("--technique", type=str, default=None)
+    args = parser.parse_args()
+
+    warehouse = ResultsWarehouse(args.db)
+    if args.command == "import":
+        files = []
+        for path in map(Path, args.paths):
+            files += sorted(path.glob("benchmark_*.json")) if path.is_dir() else [path]
+        stored = 0
+        for file in files:
+            try:
+                count = warehouse.import_report(file)
+            except (json.JSONDecodeError, sqlite3.Error) as e:
+                print(f"⚠️  {file}: {e}")
+                continue
+            stored += bool(count)
+            print(f"{'✅' if count else '⏭️ '} {file.name}: {count} rows" + ("" if count else " (already stored)"))
+        print(f"Imported {stored} of {len(files)} reports.")
+    elif args.command == "runs":
+        _print_table(warehouse.runs(), ["run_id", "model_group", "prompt_technique", "reasoning", "samples", "rows",
+                                        "timestamp_utc"])
+    elif args.command == "accuracy":
+        _print_table(warehouse.accuracy(args.by, run_ids=args.run_ids, models=args.models, technique=args.technique,
+                                        group=args.group),
+                     ["model", args.by, "n", "accuracy", "exact_rate", "errors"])
+    elif args.command == "latency":
+        _print_table(warehouse.latency_percentiles(run_ids=args.run_ids, models=args.models, technique=args.technique,
+                                                   group=args.group),
+                     ["model", "n", "mean", "p50", "p90", "p95", "p99", "max"])
+    elif args.command == "diff":
+        if args.runs:
+            result = warehouse.diff_runs(*args.runs)
+            label, rows = "model", result["models"]
+        else:
+            result = warehouse.diff_models(*args.models, run_ids=args.run_ids, technique=args.technique)
+            label, rows = "run", result["runs"]
+        a, b = args.runs or args.models
+        print(f"A = {a}\nB = {b}\n")
+        _print_table([{label: row["key"], **row} for row in rows], [label, "n", "accuracy_a", "accuracy_b", "delta"])
+        if result["changed"]:
+            print(f"\nExact match flipped in {len(result['changed'])} cells:")
+            for change in result["changed"]:
+                icon = "⬆️ " if change["change"] == "improved" else "⬇️ "
+                print(f"  {icon} {' | '.join(change['cell'])}: {change['a'] or 0.0:.1f}% -> {change['b'] or 0.0:.1f}%")
+    warehouse.close()
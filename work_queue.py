@@ -0,0 +1,385 @@
+"""
+Distributed work queue: many worker processes (on one or more hosts) share a sweep.
+
+A coordinator expands a sweep (groups x prompt techniques x reasoning settings)
+into one task per (model, query, technique, reasoning) in a SQLite queue file.
+Workers claim small batches of tasks under a time-limited lease, run them
+against their own local copy of the database, and write the scored rows back.
+A task whose lease expires (crashed or stuck worker) is handed out again, up
+to QUEUE_MAX_ATTEMPTS times. `report` then builds one report per (technique,
+reasoning) with the same row order and summary as a single-process run.
+
+The queue file must live on a filesystem with working SQLite locking (a local
+disk, or a shared mount that supports POSIX locks). Every worker checks that
+its database and test cases match the sweep's fingerprints before claiming.
+
+Usage:
+    uv run work_queue.py init --groups all --techniques zero-shot 1-shot 2-shots few-shots --reasoning both
+    uv run work_queue.py work          # on each worker process / host
+    uv run work_queue.py status
+    uv run work_queue.py report
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from benchmark import (
+    check_backends,
+    format_row_status,
+    get_active_models,
+    load_test_cases,
+    make_prompt_for,
+    new_model_stats,
+    record_row,
+    report_ground_truth_errors,
+    report_order_key,
+    run_pair,
+    save_and_print_summary
+)
+from config import (
+    DB_PATH,
+    QUERIES_PATH,
+    MODEL_REGISTRY,
+    FEW_SHOT_EXAMPLES,
+    QUEUE_PATH,
+    QUEUE_LEASE_SECONDS,
+    QUEUE_MAX_ATTEMPTS
+)
+from db_handler import DBHandler, SandboxedExecutor, db_fingerprint
+from ground_truth import GroundTruthStore, drop_invalid_cases
+from llm_connectors import clients
+from result_compare import MATCH_MODES
+from run_store import text_hash
+from sql_memo import ExecutionMemo, MemoizedExecutor
+from warehouse import store_run
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+TECHNIQUES = ["zero-shot", *FEW_SHOT_EXAMPLES]
+
+
+def _queries_hash(path) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return text_hash(f.read())
+
+
+def combination_name(sweep_id: str, technique: str, reasoning: bool) -> str:
+    return f"{sweep_id}_{technique}_{'reasoning' if reasoning else 'no-reasoning'}"
+
+
+class WorkQueue:
+    def __init__(self, path=QUEUE_PATH):
+        """Opens (or creates) the queue file. Transactions are explicit (BEGIN IMMEDIATE)."""
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS sweeps ("
+            " sweep_id TEXT PRIMARY KEY, config TEXT NOT NULL, created_utc TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " task_id INTEGER PRIMARY KEY AUTOINCREMENT, sweep_id TEXT NOT NULL,"
+            " technique TEXT NOT NULL, reasoning INTEGER NOT NULL, query_id TEXT NOT NULL, model TEXT NOT NULL,"
+            " status TEXT NOT NULL, worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT, updated REAL);"
+            "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (sweep_id, status, lease_expires);"
+        )
+
+    def create_sweep(self, sweep_id: str, config: dict, tasks: list):
+        """Stores the sweep config and enqueues its tasks: (technique, reasoning, query_id, model) tuples."""
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute("INSERT INTO sweeps (sweep_id, config, created_utc) VALUES (?, ?, ?)",
+                                    (sweep_id, json.dumps(config), datetime.utcnow().isoformat()))
+            self.connection.executemany(
+                "INSERT INTO tasks (sweep_id, technique, reasoning, query_id, model, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(sweep_id, technique, int(reasoning), query_id, model, STATUS_PENDING, now)
+                 for technique, reasoning, query_id, model in tasks],
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def latest_sweep(self):
+        row = self.connection.execute("SELECT sweep_id FROM sweeps ORDER BY created_utc DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def sweep_config(self, sweep_id: str) -> dict:
+        row = self.connection.execute("SELECT config FROM sweeps WHERE sweep_id = ?", (sweep_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown sweep '{sweep_id}'")
+        return json.loads(row[0])
+
+    def claim(self, sweep_id: str, worker: str, models: list, limit: int = 1,
+              lease_seconds: float = QUEUE_LEASE_SECONDS, max_attempts: int = QUEUE_MAX_ATTEMPTS) -> list:
+        """
+        Leases up to `limit` pending or expired tasks for the given models.
+        Tasks that already used `max_attempts` leases are marked failed instead.
+        Returns a list of dicts (task_id, technique, reasoning, query_id, model).
+        """
+        now = time.time()
+        placeholders = ", ".join("?" * len(models))
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute(
+                "UPDATE tasks SET status = ?, updated = ? WHERE sweep_id = ? AND status = ? AND lease_expires < ? "
+                "AND attempts >= ?",
+                (STATUS_FAILED, now, sweep_id, STATUS_LEASED, now, max_attempts),
+            )
+            rows = self.connection.execute(
+                f"SELECT task_id, technique, reasoning, query_id, model FROM tasks "
+                f"WHERE sweep_id = ? AND model IN ({placeholders}) "
+                f"AND (status = ? OR (status = ? AND lease_expires < ?)) ORDER BY task_id LIMIT ?",
+                (sweep_id, *models, STATUS_PENDING, STATUS_LEASED, now, limit),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+                "WHERE task_id = ?",
+                [(STATUS_LEASED, worker, now + lease_seconds, now, row[0]) for row in rows],
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return [{"task_id": r[0], "technique": r[1], "reasoning": bool(r[2]), "query_id": r[3], "model": r[4]}
+                for r in rows]
+
+    def complete(self, task_id: int, worker: str, row: dict) -> bool:
+        """Stores a task's result; ignored (False) if the lease was lost to another worker."""
+        cursor = self.connection.execute(
+            "UPDATE tasks SET status = ?, result = ?, lease_expires = NULL, updated = ? "
+            "WHERE task_id = ? AND worker = ? AND status = ?",
+            (STATUS_DONE, json.dumps(row, ensure_ascii=False, default=str), time.time(), task_id, worker,
+             STATUS_LEASED),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, task_ids: list, worker: str):
+        """Hands unfinished leased tasks back (e.g. on Ctrl-C)."""
+        self.connection.executemany(
+            "UPDATE tasks SET status = ?, worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+            "WHERE task_id = ? AND worker = ? AND status = ?",
+            [(STATUS_PENDING, task_id, worker, STATUS_LEASED) for task_id in task_ids],
+        )
+
+    def counts(self, sweep_id: str) -> dict:
+        """Number of tasks per status; expired leases are counted as `expired`."""
+        now = time.time()
+        counts = {STATUS_PENDING: 0, STATUS_LEASED: 0, "expired": 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for status, expired, count in self.connection.execute(
+                "SELECT status, status = ? AND lease_expires < ?, COUNT(*) FROM tasks WHERE sweep_id = ? "
+                "GROUP BY 1, 2", (STATUS_LEASED, now, sweep_id)):
+            counts["expired" if expired else status] += count
+        return counts
+
+    def results(self, sweep_id: str, technique: str, reasoning: bool):
+        """Yields the stored rows of one (technique, reasoning) combination."""
+        for (result,) in self.connection.execute(
+                "SELECT result FROM tasks WHERE sweep_id = ? AND technique = ? AND reasoning = ? AND status = ?",
+                (sweep_id, technique, int(reasoning), STATUS_DONE)):
+            yield json.loads(result)
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+
+# ==========================================
+# COORDINATOR
+# ==========================================
+def expand_sweep(groups: list, techniques: list, reasoning_values: list, test_cases: list) -> tuple:
+    """Returns (model names in registry order, query ids, task tuples) for the sweep."""
+    every_client = dict.fromkeys(m["client"] for m in MODEL_REGISTRY)
+    selected = set()
+    for group in groups:
+        selected.update(get_active_models(group, MODEL_REGISTRY, every_client))
+    models = [m["name"] for m in MODEL_REGISTRY if m["name"] in selected]
+    query_ids = [case.get("id", f"q_{i}") for i, case in enumerate(test_cases)]
+    tasks = [(technique, reasoning, query_id, model)
+             for technique in techniques for reasoning in reasoning_values
+             for query_id in query_ids for model in models]
+    return models, query_ids, tasks
+
+
+def init_sweep(queue: WorkQueue, groups: list, techniques: list, reasoning_values: list, sweep_id: str = None,
+               match_mode: str = "named", sandbox: bool = False, schema_pruning: bool = False) -> str:
+    ground_truth = GroundTruthStore(DB_PATH)
+    test_cases, ground_truth_errors = drop_invalid_cases(load_test_cases(QUERIES_PATH, ground_truth))
+    report_ground_truth_errors(ground_truth_errors)
+    models, query_ids, tasks = expand_sweep(groups, techniques, reasoning_values, test_cases)
+    sweep_id = sweep_id or f"sweep_{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+    config = {
+        "groups": groups,
+        "techniques": techniques,
+        "reasoning": reasoning_values,
+        "models": models,
+        "query_ids": query_ids,
+        "match_mode": match_mode,
+        "sandbox": sandbox,
+        "schema_pruning": schema_pruning,
+        "db_hash": ground_truth.db_hash,
+        "queries_hash": _queries_hash(QUERIES_PATH),
+    }
+    ground_truth.close()
+    queue.create_sweep(sweep_id, config, tasks)
+    print(f"✅ Sweep '{sweep_id}': {len(tasks)} tasks "
+          f"({len(models)} models x {len(query_ids)} queries x {len(techniques)} techniques x {len(reasoning_values)} reasoning)")
+    return sweep_id
+
+
+# ==========================================
+# WORKER
+# ==========================================
+def run_worker(queue: WorkQueue, sweep_id: str, worker_id: str, batch: int = 1, pause: float = 5.0,
+               poll: float = 10.0, skip_preflight: bool = False) -> int:
+    """Claims and runs tasks until the sweep has none left for this worker. Returns the number completed."""
+    config = queue.sweep_config(sweep_id)
+    if db_fingerprint(DB_PATH) != config["db_hash"]:
+        print(f"❌ Local database {DB_PATH} differs from the sweep's database; refusing to run.")
+        return 0
+    if _queries_hash(QUERIES_PATH) != config["queries_hash"]:
+        print(f"❌ Local test cases {QUERIES_PATH} differ from the sweep's; refusing to run.")
+        return 0
+
+    # Only the sweep's models whose client is configured (and reachable) on this host
+    llms = {name: func for name, func in get_active_models("all", MODEL_REGISTRY, clients).items()
+            if name in config["models"]}
+    if llms and not skip_preflight:
+        llms, _ = check_backends(llms)
+    if not llms:
+        print("❌ None of the sweep's models are available on this worker.")
+        return 0
+    print(f"Worker '{worker_id}' serving {len(llms)} models: {', '.join(llms)}")
+
+    ground_truth = GroundTruthStore(DB_PATH)
+    cases = {case.get("id", f"q_{i}"): case for i, case in enumerate(load_test_cases(QUERIES_PATH, ground_truth))}
+    memo = ExecutionMemo("run")
+    match_mode = config["match_mode"]
+    completed = 0
+    leased = []
+
+    with DBHandler(DB_PATH) as db, \
+            (SandboxedExecutor(DB_PATH) if config["sandbox"] else nullcontext(db)) as executor:
+        executor = MemoizedExecutor(executor, memo)
+        prompt_builders = {}
+        try:
+            while True:
+                leased = queue.claim(sweep_id, worker_id, list(llms), limit=batch)
+                if not leased:
+                    counts = queue.counts(sweep_id)
+                    if counts[STATUS_LEASED] == 0 and counts["expired"] == 0:
+                        break
+                    # Other workers hold leases: wait in case they expire
+                    time.sleep(poll)
+                    continue
+                for task in list(leased):
+                    combination = (task["technique"], task["reasoning"])
+                    if combination not in prompt_builders:
+                        prompt_builders[combination] = make_prompt_for(db, True, task["reasoning"], task["technique"],
+                                                                       config["schema_pruning"])
+                    case = cases[task["query_id"]]
+                    sys_prompt, prompt_info = prompt_builders[combination](case)
+                    row = run_pair(executor, case, task["query_id"], task["model"], llms[task["model"]], sys_prompt,
+                                   prompt_info, memo, match_mode)
+                    kept = queue.complete(task["task_id"], worker_id, row)
+                    leased.remove(task)
+                    completed += kept
+                    print(f"  > {task['technique']}/{'r' if task['reasoning'] else 'nr'} | {task['query_id']} | "
+                          f"{task['model']}: {format_row_status(row)}{'' if kept else ' (lease lost, dropped)'}")
+                    if pause:
+                        time.sleep(pause)
+        except KeyboardInterrupt:
+            print("\nInterrupted; releasing unfinished tasks.")
+        finally:
+            queue.release([task["task_id"] for task in leased], worker_id)
+
+    ground_truth.close()
+    print(f"Worker '{worker_id}' finished: {completed} tasks completed.")
+    return completed
+
+
+# ==========================================
+# REPORT
+# ==========================================
+def write_reports(queue: WorkQueue, sweep_id: str):
+    """One report per (technique, reasoning), ordered and summarized like a single-process run."""
+    config = queue.sweep_config(sweep_id)
+    counts = queue.counts(sweep_id)
+    if counts[STATUS_DONE] != sum(counts.values()):
+        print(f"⚠️  Sweep '{sweep_id}' is incomplete: {counts}")
+
+    test_cases = [{"id": query_id} for query_id in config["query_ids"]]
+    models = dict.fromkeys(config["models"])
+    group = "+".join(config["groups"])
+    summaries = []
+    for technique in config["techniques"]:
+        for reasoning in config["reasoning"]:
+            rows = sorted(queue.results(sweep_id, technique, reasoning), key=report_order_key(test_cases, models))
+            model_stats = {name: new_model_stats() for name in models}
+            for row in rows:
+                record_row(row, model_stats)
+            print(f"\n=== {technique} | reasoning={reasoning} ===")
+            extra_metadata = {"run_name": combination_name(sweep_id, technique, reasoning), "reasoning": reasoning,
+                              "sweep": sweep_id}
+            summary = save_and_print_summary(rows, model_stats, group, technique, True, len(test_cases),
+                                             extra_metadata=extra_metadata)
+            store_run(summary, rows, config=config)
+            summaries.append(summary)
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share a benchmark sweep between worker processes and hosts.")
+    parser.add_argument("--queue", type=str, default=str(QUEUE_PATH), help="Path to the shared queue file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init = commands.add_parser("init", help="Expand a sweep into tasks.")
+    init.add_argument("--sweep", type=str, default=None, help="Sweep id (default: timestamped).")
+    init.add_argument("--groups", type=str, nargs="+", default=["all"])
+    init.add_argument("--techniques", type=str, nargs="+", default=["zero-shot"], choices=TECHNIQUES)
+    init.add_argument("--reasoning", type=str, default="on", choices=["on", "off", "both"])
+    init.add_argument("--match_mode", type=str, default="named", choices=MATCH_MODES)
+    init.add_argument("--sandbox", action="store_true")
+    init.add_argument("--schema_pruning", action="store_true")
+
+    work = commands.add_parser("work", help="Claim and run tasks.")
+    work.add_argument("--sweep", type=str, default=None, help="Sweep id (default: the latest).")
+    work.add_argument("--worker", type=str, default=f"{socket.gethostname()}-{os.getpid()}")
+    work.add_argument("--batch", type=int, default=1, help="Tasks leased per claim.")
+    work.add_argument("--pause", type=float, default=5.0, help="Seconds between two requests of this worker.")
+    work.add_argument("--skip_preflight", action="store_true")
+
+    for name, help_text in (("status", "Show task counts."), ("report", "Write one report per technique/reasoning.")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--sweep", type=str, default=None, help="Sweep id (default: the latest).")
+
+    args = parser.parse_args()
+    queue = WorkQueue(Path(args.queue))
+
+    if args.command == "init":
+        reasoning_values = {"on": [True], "off": [False], "both": [True, False]}[args.reasoning]
+        init_sweep(queue, args.groups, args.techniques, reasoning_values, args.sweep, args.match_mode, args.sandbox,
+                   args.schema_pruning)
+    else:
+        sweep_id = args.sweep or queue.latest_sweep()
+        if sweep_id is None:
+            parser.error("no sweep in the queue; run 'init' first")
+        if args.command == "work":
+            run_worker(queue, sweep_id, args.worker, args.batch, args.pause, skip_preflight=args.skip_preflight)
+        elif args.command == "status":
+            print(f"Sweep '{sweep_id}': {queue.counts(sweep_id)}")
+        else:
+            write_reports(queue, sweep_id)
+    queue.close()